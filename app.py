@@ -1,14 +1,33 @@
 # indexer/app.py
 
-from apps.homebase.abis import wrapperAbi, daoAbiGlobal, tokenAbiGlobal, wrapper_w_abi
 from apps.homebase.paper import Paper
+from apps.homebase.decoders import shared_registry
+from apps.homebase.members import member_index
+from apps.homebase.tally import vote_tally
+from apps.homebase.lifecycle import proposal_lifecycle
+from apps.generic.cursor import BlockCursor
+from apps.generic.local_store import FirestoreExporter, LocalStore
+from apps.generic.log_archive import LogArchive
+from apps.generic.dedup import LogDeduplicator
+from apps.generic.heads import HeadTracker
+from apps.generic.backfill import AdaptiveWindow, backfill, find_deployment_block, log_sort_key, logs_after
+from apps.generic.block_times import block_clock
+from apps.generic.reorg import BlockHashWindow, JournaledClient, MutationJournal
+from apps.generic.rpc_pool import RpcPool
+from apps.generic.shards import AddressShards
+from apps.generic.storage import emulator_client
+from apps.generic.topics import event_name_for, normalize_signatures, topic0_filter
+from apps.generic.write_buffer import BufferedClient, WriteBuffer
+from contextlib import nullcontext
 from datetime import datetime, timezone
+import atexit
 import time
 from firebase_admin import initialize_app, firestore, credentials
 from web3 import Web3
 import os
 import sys
 import re
+import logging
 import argparse # <<< ADDED: For handling command-line arguments
 
 # --- Argument Parsing to select network ---
@@ -18,46 +37,188 @@ parser.add_argument(
     choices=['mainnet', 'testnet'], 
     help="The network to run the indexer on ('mainnet' or 'testnet')."
 )
+parser.add_argument(
+    '--cursor-file',
+    default=None,
+    help="Where to persist the last processed block (default: state/<network>.cursor.json)."
+)
+parser.add_argument(
+    '--backfill-from',
+    default=None,
+    help="Re-index from this block (or 'deployment' for the wrappers' deployment block) up to the head before polling."
+)
+parser.add_argument(
+    '--backfill-concurrency',
+    type=int,
+    default=4,
+    help="Number of get_logs windows fetched concurrently during a backfill."
+)
+parser.add_argument(
+    '--shard-size',
+    type=int,
+    default=200,
+    help="Maximum number of contract addresses per get_logs request; shards are queried concurrently."
+)
+parser.add_argument(
+    '--finality-depth',
+    type=int,
+    default=64,
+    help="Blocks behind the cursor after which handled logs are final: forgotten by de-duplication and dropped from the re-org window."
+)
+parser.add_argument(
+    '--confirmations',
+    type=int,
+    default=2,
+    help="Only index blocks at least this many blocks below the chain head."
+)
+parser.add_argument(
+    '--no-reorg-journal',
+    action='store_true',
+    help="Do not journal Firestore pre-images per block (re-orgs are then detected but not rolled back)."
+)
+parser.add_argument(
+    '--flush-interval',
+    type=float,
+    default=1.0,
+    help="Seconds Firestore writes may be buffered and merged before they are committed in batches."
+)
+parser.add_argument(
+    '--no-write-buffer',
+    action='store_true',
+    help="Commit every Firestore write as the handler makes it."
+)
+parser.add_argument(
+    '--emulator',
+    default=None,
+    metavar='HOST:PORT',
+    help="Use the Firestore emulator at HOST:PORT instead of the project in homebase.json."
+)
+parser.add_argument(
+    '--store',
+    default=None,
+    help="SQLite file holding the indexed state: handlers read and write it and the changes are exported to Firestore."
+)
+parser.add_argument(
+    '--no-export',
+    action='store_true',
+    help="With --store, do not export to Firestore (offline re-indexing); the changes are exported on a later run."
+)
+parser.add_argument(
+    '--archive-dir',
+    default=None,
+    help="Where fetched logs are archived for offline replay (default: state/<network>.logs)."
+)
+parser.add_argument(
+    '--no-archive',
+    action='store_true',
+    help="Do not archive fetched logs."
+)
+parser.add_argument(
+    '--block-times-file',
+    default=None,
+    help="Where block timestamps used to stamp chain times are kept (default: state/<network>.blocks.db)."
+)
+parser.add_argument(
+    '--rpc',
+    action='append',
+    default=None,
+    metavar='URL',
+    help="JSON-RPC endpoint to use besides the network's own node; may be given several times. Reads go to the fastest healthy one."
+)
+parser.add_argument(
+    '--hedge-after',
+    type=float,
+    default=0.5,
+    help="Seconds after which a get_logs call still unanswered (and slower than the node's usual p99) is also sent to a second endpoint."
+)
+parser.add_argument(
+    '--ws',
+    default=None,
+    metavar='URL',
+    help="WebSocket JSON-RPC endpoint to follow new heads with (newHeads subscription) instead of polling eth_blockNumber."
+)
+parser.add_argument(
+    '--head-poll-interval',
+    type=float,
+    default=0.25,
+    help="Seconds between eth_blockNumber polls while following the chain head without --ws."
+)
+parser.add_argument(
+    '--linger',
+    type=float,
+    default=0.0,
+    help="Seconds to wait after a new block for --batch-blocks blocks to gather before fetching logs: 0 for the lowest latency, more for fewer, larger get_logs calls."
+)
+parser.add_argument(
+    '--batch-blocks',
+    type=int,
+    default=1,
+    help="Blocks a lingering wait gathers before fetching logs (see --linger)."
+)
+parser.add_argument(
+    '--max-chunk',
+    type=int,
+    default=500,
+    help="Maximum number of blocks fetched per get_logs call while catching up."
+)
 args = parser.parse_args()
+logging.basicConfig(level=logging.INFO, format="%(message)s")
 # --- End of Argument Parsing ---
 
 
 # --- Network-specific Configuration ---
 if args.network == 'mainnet':
     firestore_doc_name = "Etherlink"
-    rpc = "https://node.mainnet.etherlink.com"
+    rpcs = ["https://node.mainnet.etherlink.com"]
     dao_collection_name = "idaosEtherlink" # Standard mainnet collection name
     print("--- CONFIGURATION: MAINNET ---")
 elif args.network == 'testnet':
     firestore_doc_name = "Etherlink-Testnet"
-    rpc = "https://node.ghostnet.etherlink.com"
+    rpcs = ["https://node.ghostnet.etherlink.com"]
     dao_collection_name = "idaosEtherlink-Testnet" # Your existing testnet collection name
     print("--- CONFIGURATION: TESTNET ---")
 else:
     # This case is technically handled by argparse's `choices`, but it's good practice
     print(f"FATAL: Invalid network '{args.network}' specified.")
     sys.exit(1)
+rpcs = (args.rpc or []) + rpcs
 # --- End of Network Configuration ---
 
 
 # --- Firebase and Web3 Setup ---
-cred = credentials.Certificate('homebase.json')
-initialize_app(cred) # <<< MODIFIED: Give each app a unique name to avoid conflicts
-db = firestore.client()
+if args.emulator:
+    db = emulator_client(args.emulator)
+    print(f"Using the Firestore emulator at {args.emulator}.")
+else:
+    cred = credentials.Certificate('homebase.json')
+    initialize_app(cred) # <<< MODIFIED: Give each app a unique name to avoid conflicts
+    db = firestore.client()
 networks = db.collection("contracts")
 ceva = networks.document(firestore_doc_name).get() # <<< MODIFIED: Use variable for doc name
 wrapper_address = ceva.to_dict()['wrapper']
 wrapper_w_address = ceva.to_dict()['wrapper_w']
 
-print(f"RPC Endpoint: {rpc}")
+print(f"RPC Endpoints: {', '.join(rpcs)}")
 print("Original Wrapper address: " + str(wrapper_address))
 print("Wrapped Token Wrapper address: " + str(wrapper_w_address))
 
-web3 = Web3(Web3.HTTPProvider(rpc))
+# One keep-alive session per endpoint for the whole run; failed requests
+# fail over to the next endpoint instead of rebuilding the provider.
+rpc_pool = RpcPool(rpcs, hedge_after=args.hedge_after)
+atexit.register(rpc_pool.close)
+web3 = Web3(rpc_pool)
 if not web3.is_connected():
     print("FATAL: Node connection failed!")
     sys.exit()
 print("Node connected successfully.")
+# Once caught up, the main loop waits for the next sealed block instead of sleeping.
+head_tracker = HeadTracker(web3, poll_interval=args.head_poll_interval, ws_url=args.ws,
+                           linger=args.linger, batch_blocks=args.batch_blocks)
+atexit.register(head_tracker.close)
+# Handlers stamp documents with the time of the log's block; the headers of
+# each get_logs result are fetched in batches and kept across runs.
+block_clock.open(args.block_times_file or os.path.join("state", f"{args.network}.blocks.db"))
+atexit.register(block_clock.close)
 
 
 # --- Event Signature Generation ---
@@ -70,11 +231,63 @@ event_signatures = {
     web3.keccak(text="ProposalExecuted(uint256)").hex(): "ProposalExecuted",
     web3.keccak(text="VoteCast(address,uint256,uint8,uint256,string)").hex(): "VoteCast"
 }
+event_signatures = normalize_signatures(event_signatures)
+# Only logs whose topic0 is monitored are requested from the node.
+log_topics = topic0_filter(event_signatures)
 
 print("--- Initializing with Monitored Event Signatures ---")
 for hash_val, name in event_signatures.items():
     print(f"- {name}: {hash_val}")
 print("----------------------------------------------------")
+# Compile the shared topic0 -> decoder table once, before any Paper needs it.
+print(f"Compiled {len(shared_registry())} event decoders.")
+
+
+# --- Local State Store ---
+# With --store, Papers read and write a local SQLite file and an exporter
+# copies the changed documents to Firestore in the background. An empty
+# store is first seeded from the Firestore DAO collection.
+local_store = None
+exporter = None
+if args.store:
+    local_store = LocalStore(args.store)
+    if not local_store.count(dao_collection_name):
+        print(f"Seeding local store {args.store} from Firestore collection {dao_collection_name}...")
+        print(f"Copied {local_store.import_collection(db.collection(dao_collection_name))} documents.")
+    if not args.no_export:
+        exporter = FirestoreExporter(local_store, db, interval=args.flush_interval)
+        atexit.register(exporter.close)
+    db = local_store.client()
+
+
+# --- Write-behind Buffer ---
+# Paper writes are merged per document and committed in batches; the buffer
+# is flushed before the cursor moves so a saved cursor never runs ahead of
+# the writes it covers: writes that fail for a transient reason stay pending
+# and the flush raises, so the pass is retried instead. Local store writes
+# need no buffering.
+write_buffer = None
+if not args.no_write_buffer and local_store is None:
+    write_buffer = WriteBuffer(db, flush_interval=args.flush_interval)
+    db = BufferedClient(db, write_buffer)
+    atexit.register(write_buffer.close)
+# Registered after the buffer so it runs first at exit.
+atexit.register(vote_tally.close)
+
+
+# --- Re-org Protection ---
+# Block hashes of the last --finality-depth processed blocks are kept to detect
+# re-orgs; Papers write through a journal so orphaned blocks can be undone.
+block_hashes = BlockHashWindow(args.finality_depth)
+# Closed votes' tallies are kept as long as a re-org may replay their votes.
+proposal_lifecycle.reorg_depth = args.finality_depth
+journal = None
+if not args.no_reorg_journal:
+    journal = MutationJournal(db, args.finality_depth, buffer=write_buffer)
+    db = JournaledClient(db, journal)
+# Blocks below this are final by the time they are handled (e.g. during a
+# backfill), so their writes are not journaled.
+journal_from_block = 0
 
 
 # --- Initial DAO and Paper Object Hydration ---
@@ -101,6 +314,14 @@ for doc in docs:
     except Exception as e:
         print(f"A DAO contract ({doc.id}) could not be parsed correctly: {e}")
 
+# Member ids are loaded once so handlers can tell new members from known ones
+# without reading their documents.
+hydrated_daos = [paper.dao for paper in papers.values() if paper.kind == "dao"]
+loaded_members = member_index.load_all(daos_collection, hydrated_daos)
+print(f"Indexed {loaded_members} members of {len(hydrated_daos)} DAOs.")
+# Open proposals are loaded once; from then on their stages change on block deadlines.
+print(f"Scheduled {proposal_lifecycle.load_all(daos_collection, hydrated_daos)} open proposals.")
+
 papers.update({wrapper_address: Paper(address=wrapper_address, 
               kind="wrapper", daos_collection=daos_collection, db=db, web3=web3)})
 papers.update({wrapper_w_address: Paper(address=wrapper_w_address,
@@ -112,86 +333,239 @@ listening_to_addresses = [wrapper_address, wrapper_w_address]
 listening_to_addresses.extend(dao_addresses)
 known_token_addresses = [paper.address for addr, paper in papers.items() if paper.kind == "token" and paper.address]
 listening_to_addresses.extend(known_token_addresses)
-listening_to_addresses = list(set([addr for addr in listening_to_addresses if addr]))
+# Every get_logs result is archived so the logs can be replayed without the node.
+log_archive = None
+if not args.no_archive:
+    log_archive = LogArchive(args.archive_dir or os.path.join("state", f"{args.network}.logs"))
+    atexit.register(log_archive.close)
+listening_to_addresses = AddressShards(set([addr for addr in listening_to_addresses if addr]),
+                                       shard_size=args.shard_size, archive=log_archive)
 
 print(f"\nListening for {len(event_signatures)} events on {len(listening_to_addresses)} contracts.")
 
 
+# --- Per-log Processing ---
+# Keyed on (block, tx, logIndex) so every relevant log of a transaction is
+# handled; entries behind the finality depth are pruned as the cursor moves.
+processed_logs = LogDeduplicator()
+
+def process_log(log_entry):
+    """Dispatch one log to its Paper and register any DAO it creates.
+
+    Returns the addresses newly added to the listened set, if any.
+    """
+    tx_hash = log_entry["transactionHash"].hex()
+    # Marked once handled: a log whose handler raised is handled again when the range is retried.
+    if log_entry in processed_logs:
+        return
+
+    block_hashes.record(log_entry["blockNumber"], log_entry["blockHash"])
+    if journal:
+        if log_entry["blockNumber"] >= journal_from_block:
+            journal.begin_block(log_entry["blockNumber"])
+        else:
+            journal.end_block()
+    contract_address = Web3.to_checksum_address(log_entry["address"])
+
+    if not log_entry["topics"]:
+        print(f"Skipping log with no topics: {log_entry}")
+        return
+
+    event_name = event_name_for(log_entry, event_signatures)
+
+    if not event_name:
+        # The topics filter keeps these out of get_logs; kept as a guard for other log sources.
+        return
+
+    print(f"-> [{args.network.upper()}] Event: {event_name}, Contract: {contract_address}, Tx: {tx_hash}") # <<< MODIFIED: Added network context
+
+    if contract_address not in papers:
+        print(f"Paper object not found for contract address: {contract_address}. Skipping event.")
+        return
+
+    # Against the local store, all writes of one log are one transaction.
+    with local_store.atomic() if local_store else nullcontext():
+        new_contract_addresses = papers[contract_address].handle_event(log_entry, func=event_name)
+    processed_logs.add(log_entry)
+
+    added = []
+    if new_contract_addresses:
+        dao_address_new, token_address_new = new_contract_addresses
+        if dao_address_new and token_address_new:
+            print(f"Adding new DAO {dao_address_new} and Token {token_address_new} to listener.")
+            added = [address for address in (dao_address_new, token_address_new) if address not in listening_to_addresses]
+            for address in added:
+                listening_to_addresses.append(address)
+
+            if token_address_new not in papers:
+                p_new_token = Paper(address=token_address_new, kind="token", daos_collection=daos_collection, db=db, dao=dao_address_new, web3=web3)
+                papers.update({token_address_new: p_new_token})
+            else:
+                p_new_token = papers[token_address_new]
+
+            if dao_address_new not in papers:
+                papers.update({dao_address_new: Paper(token=p_new_token, address=dao_address_new, kind="dao", daos_collection=daos_collection, db=db, dao=dao_address_new, web3=web3)})
+            print(f"Now listening to {len(listening_to_addresses)} addresses in {len(listening_to_addresses.shards)} shards.")
+    return added
+
+
+# The cursor holds the last block whose logs were all handled. Each pass
+# fetches at most --max-chunk blocks past it, so an outage is caught up in
+# bounded steps and a poll at the tip only downloads the new blocks.
+cursor = BlockCursor(args.cursor_file or os.path.join("state", f"{args.network}.cursor.json"), args.network)
+if cursor.block is not None:
+    print(f"[{args.network.upper()}] Resuming from block cursor {cursor.block}.")
+
+
+def advance_cursor(block):
+    if journal:
+        journal.end_block()
+    # Tallies are absolute values recomputed after a rollback, so they are
+    # published outside any journaled block.
+    vote_tally.publish()
+    # Stage changes come after the tallies they are decided on, journaled
+    # with the block that made them due.
+    proposal_lifecycle.advance(block, block_clock.timestamp(web3, block))
+    if journal and block >= journal_from_block:
+        journal.begin_block(block)
+    proposal_lifecycle.flush(db)
+    if journal:
+        journal.end_block()
+    if write_buffer:
+        write_buffer.flush()
+    cursor.save(block)
+    processed_logs.prune(block - args.finality_depth)
+    if journal:
+        journal.prune(block - args.finality_depth)
+
+
+def rollback_to(fork_point):
+    """Undo everything handled above ``fork_point`` and rewind the cursor to it."""
+    print(f"[{args.network.upper()}] RE-ORG detected: rolling back to block {fork_point} (cursor was {cursor.block}).")
+    if journal:
+        restored = journal.rollback_from(fork_point + 1)
+        print(f"[{args.network.upper()}] Restored {restored} Firestore documents from the journal.")
+        journal.end_block()
+        vote_tally.reseed()
+        # Members created in orphaned blocks may have been deleted.
+        member_index.invalidate()
+        # Stages are re-read as restored, then applied again as blocks come back.
+        proposal_lifecycle.load_all(daos_collection, [paper.dao for paper in papers.values() if paper.kind == "dao"])
+    if write_buffer:
+        write_buffer.flush()
+    processed_logs.forget_from(fork_point + 1)
+    block_hashes.forget_from(fork_point + 1)
+    cursor.save(fork_point)
+
+
+# --- Optional Historical Backfill ---
+if args.backfill_from is not None:
+    backfill_end = web3.eth.block_number
+    if args.backfill_from == "deployment":
+        backfill_start = min(find_deployment_block(web3, address, backfill_end)
+                             for address in (wrapper_address, wrapper_w_address) if address)
+    else:
+        backfill_start = int(args.backfill_from)
+    print(f"[{args.network.upper()}] Backfilling blocks {backfill_start} to {backfill_end}.")
+    started = time.time()
+    journal_from_block = backfill_end - args.finality_depth
+    handled = backfill(web3, backfill_start, backfill_end,
+                       get_addresses=lambda: listening_to_addresses,
+                       handle_log=process_log,
+                       topics=log_topics,
+                       max_addresses=args.shard_size,
+                       on_window=advance_cursor,
+                       before_window=lambda logs: block_clock.prefetch(web3, {log["blockNumber"] for log in logs}),
+                       max_in_flight=args.backfill_concurrency,
+                       archive=log_archive)
+    print(f"[{args.network.upper()}] Backfill done: {handled} logs in {time.time() - started:.1f}s.")
+
+
 # --- Main Indexing Loop ---
-processed_transactions = set()
+# Sizes the fetches of contracts created mid-chunk; see logs_after.
+creation_window = AdaptiveWindow()
+
 heartbeat = 0
 while True:
     heartbeat += 1
+    caught_up = True
+    failed = False
     try:
-        latest = web3.eth.block_number
-        first = latest - 15 if latest > 15 else 0 
-        
-        logs = web3.eth.get_logs({
-            "fromBlock": first,
-            "toBlock": latest,
-            "address": listening_to_addresses,
-        })
-
-        if logs:
-            print(f"[{args.network.upper()}] Found {len(logs)} logs between blocks {first} and {latest}") # <<< MODIFIED: Added network context to log
-
-        for log_entry in logs:
-            tx_hash = log_entry["transactionHash"].hex()
-            if tx_hash in processed_transactions:
-                continue 
-            
-            processed_transactions.add(tx_hash)
-            contract_address = Web3.to_checksum_address(log_entry["address"])
-            
-            if not log_entry["topics"]:
-                print(f"Skipping log with no topics: {log_entry}")
-                continue
-            
-            event_signature_from_log = log_entry["topics"][0].hex()
-            event_name = event_signatures.get(event_signature_from_log)
-
-            if not event_name:
-                # This log is verbose, you can comment it out if it's too noisy
-                # print(f"Skipping unknown event with signature {event_signature_from_log} from contract {contract_address}")
-                continue
-
-            print(f"-> [{args.network.upper()}] Event: {event_name}, Contract: {contract_address}, Tx: {tx_hash}") # <<< MODIFIED: Added network context
-            
-            if contract_address not in papers:
-                print(f"Paper object not found for contract address: {contract_address}. Skipping event.")
-                continue
-
-            new_contract_addresses = papers[contract_address].handle_event(log_entry, func=event_name)
-            
-            if new_contract_addresses:
-                dao_address_new, token_address_new = new_contract_addresses
-                if dao_address_new and token_address_new:
-                    print(f"Adding new DAO {dao_address_new} and Token {token_address_new} to listener.")
-                    if dao_address_new not in listening_to_addresses: listening_to_addresses.append(dao_address_new)
-                    if token_address_new not in listening_to_addresses: listening_to_addresses.append(token_address_new)
-                    
-                    if token_address_new not in papers:
-                        p_new_token = Paper(address=token_address_new, kind="token", daos_collection=daos_collection, db=db, dao=dao_address_new, web3=web3)
-                        papers.update({token_address_new: p_new_token})
-                    else:
-                        p_new_token = papers[token_address_new]
-                    
-                    if dao_address_new not in papers:
-                        papers.update({dao_address_new: Paper(token=p_new_token, address=dao_address_new, kind="dao", daos_collection=daos_collection, db=db, dao=dao_address_new, web3=web3)})
-                    print(f"Now listening to {len(listening_to_addresses)} addresses.")
+        latest = head_tracker.block_number() - args.confirmations
+        journal_from_block = latest - args.finality_depth
+
+        fork_point = block_hashes.find_fork_point(web3)
+        if fork_point is not None:
+            rollback_to(fork_point)
+
+        block_range = cursor.next_range(latest, args.max_chunk)
+
+        if block_range:
+            first, last = block_range
+            # Taken before get_logs: a log from block `last` with another hash
+            # means the block was replaced mid-pass, so the pass is retried.
+            last_block = web3.eth.get_block(last)
+            last_hash = last_block["hash"]
+            block_clock.record(last, last_block["timestamp"])
+            logs = listening_to_addresses.get_logs(web3, first, last, topics=log_topics)
+            if any(log["blockNumber"] == last and log["blockHash"] != last_hash for log in logs):
+                raise RuntimeError(f"Block {last} changed while fetching its logs; retrying.")
+
+            if logs:
+                print(f"[{args.network.upper()}] Found {len(logs)} logs between blocks {first} and {last}") # <<< MODIFIED: Added network context to log
+
+            block_clock.prefetch(web3, {log["blockNumber"] for log in logs})
+            position = 0
+            refetched = False
+            while position < len(logs):
+                log_entry = logs[position]
+                position += 1
+                added = process_log(log_entry)
+                if added:
+                    # The chunk was fetched before these contracts were known: what they
+                    # emitted after their creating log is fetched and handled in order.
+                    extra = logs_after(web3, log_entry, last, added, creation_window, topics=log_topics,
+                                       max_addresses=args.shard_size)
+                    if extra:
+                        block_clock.prefetch(web3, {log["blockNumber"] for log in extra})
+                        logs = logs[:position] + sorted(logs[position:] + extra, key=log_sort_key)
+                        refetched = True
+            if refetched and log_archive:
+                # Supersedes the chunk's frame archived by get_logs.
+                log_archive.append(first, last, logs)
+
+            block_hashes.record(last, last_hash)
+            advance_cursor(last)
+            caught_up = last >= latest
+            if not caught_up:
+                print(f"[{args.network.upper()}] Catching up: processed up to block {last}, chain head is {latest}.")
 
     except Exception as e:
         import traceback
         print(f"MAIN LOOP ERROR [{args.network.upper()}]: {e}")
         print(traceback.format_exc())
-        try:
-            web3 = Web3(Web3.HTTPProvider(rpc))
-            if web3.is_connected(): print("Node reconnected successfully.")
-            else: print("Node reconnection failed!")
-        except Exception as recon_e:
-            print(f"Error during reconnection: {recon_e}")
-            
+        print(f"[{args.network.upper()}] RPC endpoints: {rpc_pool.stats()}")
+        failed = True
+
     if heartbeat % 50 == 0:
-        print(f"[{args.network.upper()}] Heartbeat: {heartbeat}. Listening to {len(listening_to_addresses)} addresses.")
+        print(f"[{args.network.upper()}] Heartbeat: {heartbeat}. Cursor at block {cursor.block}. Listening to {len(listening_to_addresses)} addresses.")
+        if write_buffer:
+            print(f"[{args.network.upper()}] Write buffer: {write_buffer.stats()}")
+        print(f"[{args.network.upper()}] RPC endpoints: {rpc_pool.stats()}")
+        print(f"[{args.network.upper()}] Chain head: {head_tracker.stats()}")
+        print(f"[{args.network.upper()}] Vote tallies: {vote_tally.stats()}")
+        print(f"[{args.network.upper()}] Member index: {member_index.stats()}")
+        print(f"[{args.network.upper()}] Block clock: {block_clock.stats()}")
+        print(f"[{args.network.upper()}] Proposal lifecycle: {proposal_lifecycle.stats()}")
+        if journal:
+            print(f"[{args.network.upper()}] Re-org journal: {journal.stats()}")
+        if exporter:
+            print(f"[{args.network.upper()}] Firestore export: {exporter.stats()}")
+        if log_archive:
+            print(f"[{args.network.upper()}] Log archive: {log_archive.stats()}")
 
-    time.sleep(5)
\ No newline at end of file
+    if failed:
+        time.sleep(5)
+    elif caught_up and cursor.block is not None:
+        # get_logs only runs once a block past the cursor is confirmed.
+        head_tracker.wait_for_head(cursor.block + args.confirmations + 1, timeout=60)
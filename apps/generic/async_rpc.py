@@ -0,0 +1,64 @@
+"""JSON-RPC on an asyncio event loop, for synchronous and asynchronous callers alike.
+
+The asyncio indexer reads logs with ``AsyncWeb3`` while the ``Paper``
+handlers stay synchronous and run in worker threads. ``LoopProvider`` gives
+those handlers a plain web3 provider whose requests are sent by the loop's
+async provider: one connection pool for the whole process, and an
+``asyncio.Semaphore`` that bounds the requests in flight from both sides.
+A handler thread only blocks on the future of its own request.
+
+A ``LoopProvider`` must not be used from the loop's own thread, which would
+wait on itself.
+"""
+
+import asyncio
+import heapq
+import logging
+
+from web3.providers.base import JSONBaseProvider
+
+from apps.generic.backfill import log_sort_key
+
+logger = logging.getLogger(__name__)
+
+
+class LoopProvider(JSONBaseProvider):
+    def __init__(self, async_provider, loop, semaphore):
+        super().__init__()
+        self.async_provider = async_provider
+        self.loop = loop
+        self.semaphore = semaphore
+        self.requests = 0
+
+    async def _request(self, method, params):
+        async with self.semaphore:
+            return await self.async_provider.make_request(method, params)
+
+    async def _batch_request(self, requests):
+        async with self.semaphore:
+            return await self.async_provider.make_batch_request(requests)
+
+    def make_request(self, method, params):
+        self.requests += 1
+        return asyncio.run_coroutine_threadsafe(self._request(method, params), self.loop).result()
+
+    def make_batch_request(self, requests):
+        self.requests += 1
+        return asyncio.run_coroutine_threadsafe(self._batch_request(requests), self.loop).result()
+
+
+async def get_logs(async_web3, shards, from_block, to_block, semaphore, topics=None):
+    """``AddressShards.get_logs`` as a coroutine: every shard queried at once, merged in chain order."""
+
+    async def fetch(shard):
+        log_filter = {"fromBlock": from_block, "toBlock": to_block, "address": shard}
+        if topics:
+            log_filter["topics"] = topics
+        async with semaphore:
+            return sorted(await async_web3.eth.get_logs(log_filter), key=log_sort_key)
+
+    results = await asyncio.gather(*(fetch(shard) for shard in shards.snapshot()))
+    logs = list(heapq.merge(*results, key=log_sort_key))
+    if shards.archive is not None:
+        shards.archive.append(from_block, to_block, logs)
+    return logs
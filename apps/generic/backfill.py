@@ -0,0 +1,199 @@
+"""Historical log backfill over large block ranges.
+
+``eth_getLogs`` over a wide range either trips the node's response-size limit
+or times out, so the range is walked in windows whose size adapts to what the
+node returns. Several windows are fetched concurrently, but logs are handed to
+the caller strictly in ``(blockNumber, logIndex)`` order.
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Substrings that nodes use when a get_logs range is too expensive to serve.
+RANGE_ERROR_MARKERS = (
+    "too many",
+    "limit exceeded",
+    "exceed",
+    "response size",
+    "query returned more than",
+    "block range",
+    "timeout",
+    "timed out",
+)
+
+
+def is_range_error(exc):
+    """True when ``exc`` means the window should shrink rather than be retried as is."""
+    if isinstance(exc, (requests.exceptions.Timeout, TimeoutError)):
+        return True
+    message = str(exc).lower()
+    return any(marker in message for marker in RANGE_ERROR_MARKERS)
+
+
+def log_sort_key(log_entry):
+    return (log_entry["blockNumber"], log_entry["logIndex"])
+
+
+class AdaptiveWindow:
+    """Block window size that shrinks on range errors and grows while responses stay small."""
+
+    def __init__(self, initial=2000, minimum=1, maximum=100000, target_logs=2000):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_logs = target_logs
+
+    def on_success(self, span, log_count):
+        if log_count > self.target_logs:
+            self.size = max(self.minimum, min(self.size, span // 2))
+        elif log_count < self.target_logs // 4 and span >= self.size:
+            self.size = min(self.maximum, self.size * 2)
+
+    def on_range_error(self, span):
+        self.size = max(self.minimum, min(self.size, span) // 2)
+
+
+def fetch_range(web3, from_block, to_block, addresses, window, topics=None, retries=3, max_addresses=None):
+    """Fetch logs for one range, splitting it in half on range errors.
+
+    Address lists longer than ``max_addresses`` are queried in chunks.
+    """
+    if not addresses:
+        return []
+    addresses = list(addresses)
+    if max_addresses and len(addresses) > max_addresses:
+        logs = []
+        for index in range(0, len(addresses), max_addresses):
+            logs.extend(fetch_range(web3, from_block, to_block, addresses[index:index + max_addresses],
+                                    window, topics, retries))
+        return logs
+    log_filter = {"fromBlock": from_block, "toBlock": to_block, "address": addresses}
+    if topics:
+        log_filter["topics"] = topics
+    attempt = 0
+    while True:
+        try:
+            logs = web3.eth.get_logs(log_filter)
+            window.on_success(to_block - from_block + 1, len(logs))
+            return list(logs)
+        except Exception as e:
+            if is_range_error(e) and to_block > from_block:
+                window.on_range_error(to_block - from_block + 1)
+                middle = (from_block + to_block) // 2
+                return (fetch_range(web3, from_block, middle, addresses, window, topics, retries)
+                        + fetch_range(web3, middle + 1, to_block, addresses, window, topics, retries))
+            attempt += 1
+            if attempt > retries:
+                raise
+            logger.warning("get_logs %d-%d failed (%s), retry %d/%d", from_block, to_block, e, attempt, retries)
+            time.sleep(min(2 ** attempt, 30))
+
+
+def logs_after(web3, log_entry, to_block, addresses, window, topics=None, max_addresses=None):
+    """Logs of ``addresses`` from ``log_entry`` on, up to ``to_block``, that come after it.
+
+    For contracts registered while handling ``log_entry``: what they emitted
+    later in a range fetched before they were known, including in the same
+    transaction (a token minting in the DAO's deployment).
+    """
+    current = log_sort_key(log_entry)
+    return [entry for entry in fetch_range(web3, log_entry["blockNumber"], to_block, addresses, window, topics,
+                                           max_addresses=max_addresses)
+            if log_sort_key(entry) > current]
+
+
+def find_deployment_block(web3, address, high=None):
+    """Binary search the first block at which ``address`` has code.
+
+    Needs a node that serves historical ``eth_getCode``.
+    """
+    low = 0
+    high = web3.eth.block_number if high is None else high
+    if not web3.eth.get_code(address, high):
+        raise ValueError(f"No contract code at {address} by block {high}")
+    while low < high:
+        middle = (low + high) // 2
+        if web3.eth.get_code(address, middle):
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+def backfill(web3, start_block, end_block, get_addresses, handle_log,
+             topics=None, max_in_flight=4, window=None, progress_every=50000, max_addresses=None,
+             on_window=None, archive=None, before_window=None):
+    """Feed every log in ``[start_block, end_block]`` to ``handle_log`` in chain order.
+
+    ``get_addresses`` is called again after each handled log, so contracts
+    registered by a handler (a freshly created DAO and its token) are fetched
+    from that block onwards, including for windows already in flight.
+    ``before_window(logs)`` is given each window's logs before they are
+    handled (e.g. to fetch their block timestamps in one batch), and
+    ``on_window(to_block)`` runs once every log up to ``to_block`` is handled.
+    Each window's logs, including those of contracts added during it, are
+    appended to ``archive`` (a ``LogArchive``) if one is given.
+
+    Returns the number of logs handled.
+    """
+    window = window or AdaptiveWindow()
+    handled = 0
+    next_start = start_block
+    last_progress = start_block
+    in_flight = []  # (from_block, to_block, address snapshot, future), in block order
+
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+        while in_flight or next_start <= end_block:
+            while len(in_flight) < max_in_flight and next_start <= end_block:
+                to_block = min(end_block, next_start + window.size - 1)
+                snapshot = frozenset(get_addresses())
+                future = pool.submit(fetch_range, web3, next_start, to_block, snapshot, window, topics,
+                                     max_addresses=max_addresses)
+                in_flight.append((next_start, to_block, snapshot, future))
+                next_start = to_block + 1
+
+            from_block, to_block, snapshot, future = in_flight.pop(0)
+            logs = future.result()
+            known = set(snapshot)
+            missing = set(get_addresses()) - known
+            if missing:
+                logs.extend(fetch_range(web3, from_block, to_block, missing, window, topics,
+                                        max_addresses=max_addresses))
+                known |= missing
+            logs.sort(key=log_sort_key)
+            if before_window:
+                before_window(logs)
+
+            position = 0
+            while position < len(logs):
+                log_entry = logs[position]
+                position += 1
+                handle_log(log_entry)
+                handled += 1
+                current_addresses = get_addresses()
+                if len(current_addresses) == len(known):
+                    continue
+                added = set(current_addresses) - known
+                if added:
+                    # Logs of contracts created in this window that come after
+                    # the creating log still belong to this window.
+                    extra = logs_after(web3, log_entry, to_block, added, window, topics, max_addresses)
+                    known |= added
+                    if extra:
+                        logs = logs[:position] + sorted(logs[position:] + extra, key=log_sort_key)
+
+            if archive is not None:
+                archive.append(from_block, to_block, logs)
+            if on_window:
+                on_window(to_block)
+            if to_block - last_progress >= progress_every or to_block == end_block:
+                logger.info("Backfill reached block %d of %d (%d logs handled, window %d blocks)",
+                            to_block, end_block, handled, window.size)
+                last_progress = to_block
+
+    return handled
@@ -0,0 +1,193 @@
+"""Block number to chain time, without a ``getBlock`` per event.
+
+Handlers stamp documents with the time of the block their log is from
+(``createdAt``, ``statusHistory``, a vote's ``castAt``), not with the time it
+happens to be processed at, which during a backfill or a replay can be
+months later. ``BlockClock`` keeps the timestamps of the blocks seen so far:
+the poll loops ``prefetch`` the blocks of each ``get_logs`` result in
+JSON-RPC batches of ``eth_getBlockByNumber`` (headers only), so by the time
+a handler asks, the answer is in memory. Given a path, timestamps are also
+kept in a SQLite file and reloaded on start.
+
+Blocks not produced yet (a proposal's voting start and end) are estimated:
+between two known blocks by linear interpolation, past the last known one
+by extrapolating the block time observed over the last ``window`` blocks.
+
+    block_clock.open("state/testnet.blocks.db")
+    block_clock.prefetch(web3, {log["blockNumber"] for log in logs})
+    block_clock.datetime(web3, log["blockNumber"])
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+
+def _header_timestamp(response):
+    """``(number, timestamp)`` of an ``eth_getBlockByNumber`` response; ``None`` for a block not produced yet."""
+    if not isinstance(response, dict) or response.get("error"):
+        raise ValueError(f"eth_getBlockByNumber failed: {response}")
+    header = response.get("result")
+    if not header:
+        return None
+    return int(header["number"], 16), int(header["timestamp"], 16)
+
+
+class BlockClock:
+    def __init__(self, batch_size=100, default_block_time=1.0, window=10000):
+        self.batch_size = batch_size
+        self.default_block_time = default_block_time
+        self.window = window
+        self._timestamps = {}
+        self._blocks = []  # sorted keys of _timestamps
+        self._lock = threading.Lock()
+        self._conn = None
+        self._batch_unsupported = False
+        self.path = None
+        self.hits = 0
+        self.fetched = 0
+        self.round_trips = 0
+        self.estimates = 0
+        self.failures = 0
+
+    def open(self, path):
+        """Persist timestamps in the SQLite file ``path`` and load those already there."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("CREATE TABLE IF NOT EXISTS blocks (number INTEGER PRIMARY KEY, timestamp INTEGER NOT NULL)")
+        conn.commit()
+        rows = conn.execute("SELECT number, timestamp FROM blocks").fetchall()
+        with self._lock:
+            self._conn = conn
+            self.path = path
+            self._timestamps.update(rows)
+            self._blocks = sorted(self._timestamps)
+        logger.info("Block clock: %d block timestamps loaded from %s", len(rows), path)
+        return self
+
+    def record(self, block, timestamp):
+        """Remember the timestamp of ``block``, e.g. from a header read for another purpose."""
+        self._store([(block, int(timestamp))])
+
+    def _store(self, rows):
+        with self._lock:
+            new = [(block, timestamp) for block, timestamp in rows if block not in self._timestamps]
+            for block, timestamp in new:
+                self._timestamps[block] = timestamp
+                insort(self._blocks, block)
+            if new and self._conn is not None:
+                self._conn.executemany("INSERT OR IGNORE INTO blocks (number, timestamp) VALUES (?, ?)", new)
+                self._conn.commit()
+
+    def _fetch(self, web3, blocks):
+        requests = [("eth_getBlockByNumber", [hex(block), False]) for block in blocks]
+        if len(requests) > 1 and not self._batch_unsupported:
+            self.round_trips += 1
+            responses = web3.provider.make_batch_request(requests)
+            if isinstance(responses, list):
+                return [_header_timestamp(response) for response in responses]
+            # The node rejected the batch as a whole.
+            self._batch_unsupported = True
+            logger.warning("JSON-RPC batches refused (%s); fetching block headers one by one", responses)
+        headers = []
+        for method, params in requests:
+            self.round_trips += 1
+            headers.append(_header_timestamp(web3.provider.make_request(method, params)))
+        return headers
+
+    def prefetch(self, web3, blocks):
+        """Fetch the timestamps of the ``blocks`` not known yet, ``batch_size`` headers per request.
+
+        Returns how many were fetched; blocks that could not be read are left
+        to be estimated.
+        """
+        with self._lock:
+            missing = sorted({block for block in blocks if block not in self._timestamps})
+        fetched = 0
+        for index in range(0, len(missing), self.batch_size):
+            try:
+                headers = [header for header in self._fetch(web3, missing[index:index + self.batch_size]) if header]
+            except Exception as e:
+                self.failures += 1
+                logger.debug("Could not fetch block headers %d-%d: %s", missing[index],
+                             missing[min(len(missing), index + self.batch_size) - 1], e)
+                continue
+            self._store(headers)
+            fetched += len(headers)
+        self.fetched += fetched
+        return fetched
+
+    def block_time(self):
+        """Average seconds per block over the last ``window`` known blocks."""
+        with self._lock:
+            return self._block_time()
+
+    def _block_time(self):
+        if len(self._blocks) < 2:
+            return self.default_block_time
+        last = self._blocks[-1]
+        first = self._blocks[max(0, min(bisect_left(self._blocks, last - self.window), len(self._blocks) - 2))]
+        return (self._timestamps[last] - self._timestamps[first]) / (last - first)
+
+    def estimate(self, block):
+        """Unix time of ``block``: exact if known, else interpolated or extrapolated; ``None`` if nothing is known."""
+        with self._lock:
+            timestamp = self._timestamps.get(block)
+            if timestamp is not None:
+                return timestamp
+            if not self._blocks:
+                return None
+            self.estimates += 1
+            position = bisect_left(self._blocks, block)
+            if 0 < position < len(self._blocks):
+                low, high = self._blocks[position - 1], self._blocks[position]
+                low_time, high_time = self._timestamps[low], self._timestamps[high]
+                return round(low_time + (block - low) * (high_time - low_time) / (high - low))
+            anchor = self._blocks[-1] if position else self._blocks[0]
+            return round(self._timestamps[anchor] + (block - anchor) * self._block_time())
+
+    def timestamp(self, web3, block):
+        """Unix time of ``block``, read from the node if it is not known; estimated for a future block."""
+        with self._lock:
+            timestamp = self._timestamps.get(block)
+        if timestamp is not None:
+            self.hits += 1
+            return timestamp
+        self.prefetch(web3, [block])
+        return self.estimate(block)
+
+    def datetime(self, web3, block):
+        """``timestamp`` as an aware UTC datetime, or ``None`` if it can be neither read nor estimated."""
+        timestamp = self.timestamp(web3, block)
+        return None if timestamp is None else datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+    def estimated_datetime(self, block):
+        """``estimate`` as an aware UTC datetime; never contacts the node."""
+        timestamp = self.estimate(block)
+        return None if timestamp is None else datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self):
+        return {
+            "blocks": len(self._timestamps),
+            "hits": self.hits,
+            "fetched": self.fetched,
+            "round_trips": self.round_trips,
+            "estimates": self.estimates,
+            "failures": self.failures,
+            "block_time": round(self.block_time(), 3),
+        }
+
+
+block_clock = BlockClock()
@@ -0,0 +1,62 @@
+"""Durable block cursor used by the indexer poll loops."""
+
+import json
+import os
+import tempfile
+
+
+class BlockCursor:
+    """Last fully processed block for one network, persisted to a JSON file.
+
+    The file is rewritten atomically (temp file + ``os.replace``) so a crash
+    in the middle of a save leaves the previous value intact.
+    """
+
+    def __init__(self, path, network):
+        self.path = path
+        self.network = network
+        self.block = None
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Warning: could not read block cursor {self.path}: {e}")
+            return None
+        if data.get("network") == self.network and data.get("block") is not None:
+            self.block = int(data["block"])
+        return self.block
+
+    def save(self, block):
+        self.block = int(block)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".cursor-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"network": self.network, "block": self.block}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def next_range(self, latest, max_chunk, initial_lookback=15):
+        """Return the next ``(from_block, to_block)`` to fetch, or ``None``.
+
+        Without a stored cursor the indexer starts ``initial_lookback`` blocks
+        behind the tip, which matches the old fixed-window behaviour.
+        """
+        if self.block is None:
+            start = latest - initial_lookback if latest > initial_lookback else 0
+        else:
+            start = self.block + 1
+        if start > latest:
+            return None
+        return start, min(latest, start + max_chunk - 1)
@@ -0,0 +1,70 @@
+"""Bounded de-duplication of logs that may be fetched more than once."""
+
+import threading
+
+
+def log_key(log_entry):
+    return (log_entry["blockNumber"], bytes(log_entry["transactionHash"]), log_entry["logIndex"])
+
+
+class LogDeduplicator:
+    """Remembers handled logs by ``(blockNumber, txHash, logIndex)``.
+
+    Entries are grouped by block so everything at or below a finalized block
+    can be dropped at once; memory is then bounded by the number of logs in
+    the un-finalized window rather than by uptime. A transaction that emits
+    several relevant logs keeps each of them, since the log index is part of
+    the key.
+    """
+
+    def __init__(self):
+        self._blocks = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def add(self, log_entry):
+        """Mark ``log_entry`` as seen; return ``False`` if it already was."""
+        block, tx_hash, log_index = log_key(log_entry)
+        with self._lock:
+            seen = self._blocks.setdefault(block, set())
+            if (tx_hash, log_index) in seen:
+                return False
+            seen.add((tx_hash, log_index))
+            self._size += 1
+            return True
+
+    def discard(self, log_entry):
+        block, tx_hash, log_index = log_key(log_entry)
+        with self._lock:
+            seen = self._blocks.get(block)
+            if seen and (tx_hash, log_index) in seen:
+                seen.remove((tx_hash, log_index))
+                self._size -= 1
+                if not seen:
+                    # first_block() must not report a block whose entries are all gone.
+                    del self._blocks[block]
+
+    def __contains__(self, log_entry):
+        block, tx_hash, log_index = log_key(log_entry)
+        with self._lock:
+            return (tx_hash, log_index) in self._blocks.get(block, ())
+
+    def __len__(self):
+        return self._size
+
+    def first_block(self):
+        """Lowest block with a remembered entry, or ``None``."""
+        with self._lock:
+            return min(self._blocks, default=None)
+
+    def prune(self, finalized_block):
+        """Forget every entry at or below ``finalized_block``; it cannot be fetched again."""
+        with self._lock:
+            for block in [block for block in self._blocks if block <= finalized_block]:
+                self._size -= len(self._blocks.pop(block))
+
+    def forget_from(self, block):
+        """Forget entries at or above ``block`` so a re-org can re-apply them."""
+        with self._lock:
+            for number in [number for number in self._blocks if number >= block]:
+                self._size -= len(self._blocks.pop(number))
@@ -0,0 +1,130 @@
+"""Chain head tracking, so the poll loops fetch logs when a block is sealed rather than on a timer.
+
+``HeadTracker`` follows the head from a background thread, by polling
+``eth_blockNumber`` every ``poll_interval`` seconds (one tiny request) or,
+given a WebSocket URL, from a ``newHeads`` subscription, falling back to
+polling while the socket is down. Loops then call ``wait_for_head(block)``
+instead of sleeping: it returns as soon as the head reaches ``block``.
+
+``linger`` trades latency for throughput: after the first new block the
+wait goes on for up to ``linger`` seconds, or until ``batch_blocks`` blocks
+have arrived, so one ``get_logs`` covers several blocks. ``0`` fetches every
+block as soon as it is seen.
+"""
+
+import json
+import logging
+import threading
+import time
+
+from websockets.sync.client import connect
+
+logger = logging.getLogger(__name__)
+
+
+class HeadTracker:
+    def __init__(self, web3, poll_interval=0.25, ws_url=None, linger=0.0, batch_blocks=1, reconnect_delay=5.0):
+        self.web3 = web3
+        self.poll_interval = poll_interval
+        self.ws_url = ws_url
+        self.linger = linger
+        self.batch_blocks = max(1, batch_blocks)
+        self.reconnect_delay = reconnect_delay
+        self.head = None
+        self.updated = 0.0
+        self.polls = 0
+        self.notifications = 0
+        self.errors = 0
+        self._changed = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="head-tracker", daemon=True)
+        self._thread.start()
+
+    def _observe(self, block):
+        with self._changed:
+            self.updated = time.monotonic()
+            if self.head is None or block > self.head:
+                self.head = block
+                self._changed.notify_all()
+
+    def _poll_once(self):
+        try:
+            block = self.web3.eth.block_number
+        except Exception as exc:
+            self.errors += 1
+            logger.warning("Head tracker: eth_blockNumber failed: %s", exc)
+            return
+        self.polls += 1
+        self._observe(block)
+
+    def _poll_until(self, deadline=None):
+        while not self._stop.is_set() and (deadline is None or time.monotonic() < deadline):
+            self._poll_once()
+            self._stop.wait(self.poll_interval)
+
+    def _subscribe(self):
+        with connect(self.ws_url, open_timeout=10) as socket:
+            socket.send(json.dumps({"jsonrpc": "2.0", "id": 1, "method": "eth_subscribe", "params": ["newHeads"]}))
+            logger.info("Head tracker: subscribed to newHeads at %s", self.ws_url)
+            # Heads sealed while the socket was down are seen by this first poll.
+            self._poll_once()
+            while not self._stop.is_set():
+                try:
+                    message = json.loads(socket.recv(timeout=1))
+                except TimeoutError:
+                    continue
+                if message.get("error"):
+                    raise RuntimeError(message["error"])
+                header = (message.get("params") or {}).get("result")
+                if isinstance(header, dict) and header.get("number"):
+                    self.notifications += 1
+                    self._observe(int(header["number"], 16))
+
+    def _run(self):
+        if not self.ws_url:
+            self._poll_until()
+            return
+        while not self._stop.is_set():
+            try:
+                self._subscribe()
+            except Exception as exc:
+                self.errors += 1
+                logger.warning("Head tracker: newHeads subscription lost (%s); polling for %.0fs",
+                               exc, self.reconnect_delay)
+                self._poll_until(time.monotonic() + self.reconnect_delay)
+
+    def block_number(self, max_age=None):
+        """The latest head seen; read from the node if none is known or it is older than ``max_age`` seconds."""
+        max_age = max(1.0, 4 * self.poll_interval) if max_age is None else max_age
+        if self.head is None or time.monotonic() - self.updated > max_age:
+            self._observe(self.web3.eth.block_number)
+        return self.head
+
+    def wait_for_head(self, block, timeout=None):
+        """Wait until the head is at least ``block``, lingering for a batch as configured.
+
+        ``timeout`` bounds the wait for ``block`` only, not the lingering
+        after it. Returns the head, which is below ``block`` if ``timeout``
+        passed first.
+        """
+        with self._changed:
+            if not self._changed.wait_for(lambda: self.head is not None and self.head >= block, timeout):
+                return self.head
+            if self.linger > 0 and self.head - block + 1 < self.batch_blocks:
+                self._changed.wait_for(lambda: self.head - block + 1 >= self.batch_blocks, self.linger)
+            return self.head
+
+    def close(self):
+        self._stop.set()
+        with self._changed:
+            self._changed.notify_all()
+        self._thread.join(timeout=5)
+
+    def stats(self):
+        return {
+            "head": self.head,
+            "mode": "newHeads" if self.ws_url else "polling",
+            "polls": self.polls,
+            "notifications": self.notifications,
+            "errors": self.errors,
+        }
@@ -0,0 +1,294 @@
+"""SQLite store holding the indexed state, exported to Firestore.
+
+``LocalStore`` is the SQLite backend of ``apps.generic.storage``: its
+``client()`` answers the Firestore calls ``Paper`` and the indexers make from
+a local file, so handlers read and write at local-disk speed. Documents are kept in one table per entity of
+``apps/homebase/entities.py``, keyed by their Firestore path::
+
+    <daos>/<dao>                                    orgs
+    <daos>/<dao>/members/<address>                  members
+    <daos>/<dao>/proposals/<id>                     proposals
+    <daos>/<dao>/proposals/<id>/votes/<voter>       votes
+
+with the document fields as JSON in ``data``; any other path goes to
+``documents``. A batch, or everything inside ``LocalStore.atomic()``, is one
+SQLite transaction.
+
+Every write also appends the document path to ``changes``.
+``FirestoreExporter`` reads that outbox, writes the current state of each
+changed document to Firestore in batches and deletes the entries it has
+exported. The outbox is in the same file, so nothing is lost when the
+process stops before an export; running without an exporter re-indexes
+offline and the changes go out the next time one runs.
+"""
+
+import base64
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from apps.generic.storage import DocumentStore
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_OPS = 500
+
+
+class _Table:
+    def __init__(self, name, keys):
+        self.name = name
+        self.keys = keys
+        columns = ", ".join(keys)
+        self.create = (f"CREATE TABLE IF NOT EXISTS {name} ({columns}, data TEXT NOT NULL, "
+                       f"PRIMARY KEY ({columns})) WITHOUT ROWID")
+        match = " AND ".join(f"{key} = ?" for key in keys)
+        self.select = f"SELECT data FROM {name} WHERE {match}"
+        self.upsert = f"INSERT OR REPLACE INTO {name} ({columns}, data) VALUES ({', '.join('?' * (len(keys) + 1))})"
+        self.delete = f"DELETE FROM {name} WHERE {match}"
+        parent = " AND ".join(f"{key} = ?" for key in keys[:-1])
+        self.children = f"SELECT {keys[-1]}, data FROM {name} WHERE {parent} ORDER BY {keys[-1]}"
+        self.count = f"SELECT COUNT(*) FROM {name} WHERE {parent}"
+
+
+ORGS = _Table("orgs", ("collection", "dao"))
+MEMBERS = _Table("members", ("collection", "dao", "address"))
+PROPOSALS = _Table("proposals", ("collection", "dao", "proposal_id"))
+VOTES = _Table("votes", ("collection", "dao", "proposal_id", "voter"))
+DOCUMENTS = _Table("documents", ("parent", "id"))
+TABLES = (ORGS, MEMBERS, PROPOSALS, VOTES, DOCUMENTS)
+
+
+def _locate(path):
+    """The table holding the document at ``path`` and its key in that table."""
+    parts = path.split("/")
+    if len(parts) == 2:
+        return ORGS, tuple(parts)
+    if len(parts) == 4 and parts[2] == "members":
+        return MEMBERS, (parts[0], parts[1], parts[3])
+    if len(parts) == 4 and parts[2] == "proposals":
+        return PROPOSALS, (parts[0], parts[1], parts[3])
+    if len(parts) == 6 and parts[2] == "proposals" and parts[4] == "votes":
+        return VOTES, (parts[0], parts[1], parts[3], parts[5])
+    return DOCUMENTS, ("/".join(parts[:-1]), parts[-1])
+
+
+def _locate_children(collection_path):
+    """The table holding the documents of ``collection_path`` and the key they share."""
+    table, key = _locate(collection_path + "/_")
+    return table, key[:-1]
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, (bytes, bytearray)):
+        return {"$bytes": base64.b64encode(bytes(value)).decode("ascii")}
+    raise TypeError(f"Cannot store {type(value).__name__} values")
+
+
+def _decode(value):
+    if "$datetime" in value and len(value) == 1:
+        return datetime.fromisoformat(value["$datetime"])
+    if "$bytes" in value and len(value) == 1:
+        return base64.b64decode(value["$bytes"])
+    return value
+
+
+def _dumps(data):
+    return json.dumps(data, default=_encode, separators=(",", ":"))
+
+
+def _loads(text):
+    return json.loads(text, object_hook=_decode)
+
+
+class LocalStore(DocumentStore):
+    """The SQLite file and its connection, shared by every client of the store.
+
+    One connection is used from all threads; ``atomic()`` holds it for the
+    duration of a transaction, so a transaction of one thread never sees
+    half of another's.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.RLock()
+        self._local = threading.local()
+        self.reads = 0
+        self.writes = 0
+        with self.atomic():
+            for table in TABLES:
+                self._conn.execute(table.create)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+                               "path TEXT NOT NULL)")
+
+    @contextmanager
+    def atomic(self):
+        """Run the enclosed reads and writes as one transaction; nested calls are savepoints."""
+        with self._lock:
+            depth = getattr(self._local, "depth", 0)
+            savepoint = f"sp{depth}"
+            self._conn.execute(f"SAVEPOINT {savepoint}")
+            self._local.depth = depth + 1
+            try:
+                yield self
+            except BaseException:
+                self._conn.execute(f"ROLLBACK TO {savepoint}")
+                self._conn.execute(f"RELEASE {savepoint}")
+                raise
+            else:
+                self._conn.execute(f"RELEASE {savepoint}")
+            finally:
+                self._local.depth = depth
+
+    def read(self, path):
+        table, key = _locate(path)
+        with self._lock:
+            row = self._conn.execute(table.select, key).fetchone()
+        self.reads += 1
+        return _loads(row[0]) if row else None
+
+    def children(self, collection_path):
+        table, key = _locate_children(collection_path)
+        with self._lock:
+            rows = self._conn.execute(table.children, key).fetchall()
+        self.reads += len(rows)
+        return [(document_id, _loads(data)) for document_id, data in rows]
+
+    def write(self, path, data, track=True):
+        """Store ``data`` at ``path`` (``None`` deletes it) and queue it for export unless ``track`` is false."""
+        table, key = _locate(path)
+        with self.atomic():
+            if data is None:
+                self._conn.execute(table.delete, key)
+            else:
+                self._conn.execute(table.upsert, key + (_dumps(data),))
+            if track:
+                self._conn.execute("INSERT INTO changes (path) VALUES (?)", (path,))
+        self.writes += 1
+
+    def count(self, collection_path):
+        table, key = _locate_children(collection_path)
+        with self._lock:
+            return self._conn.execute(table.count, key).fetchone()[0]
+
+    def pending_changes(self, limit=MAX_BATCH_OPS):
+        """``(last_seq, paths)`` of the oldest changes not yet exported; paths are de-duplicated."""
+        with self._lock:
+            rows = self._conn.execute("SELECT seq, path FROM changes ORDER BY seq LIMIT ?", (limit,)).fetchall()
+        if not rows:
+            return None, []
+        return rows[-1][0], list(dict.fromkeys(path for _, path in rows))
+
+    def acknowledge(self, last_seq):
+        with self.atomic():
+            self._conn.execute("DELETE FROM changes WHERE seq <= ?", (last_seq,))
+
+    def backlog(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM changes").fetchone()[0]
+
+    def import_collection(self, collection):
+        """Copy a Firestore DAO collection (orgs, members, proposals, votes) into the store; return the count."""
+        copied = 0
+        with self.atomic():
+            for dao in collection.stream():
+                self.write(dao.reference.path, dao.to_dict(), track=False)
+                copied += 1
+                for name in ("members", "proposals"):
+                    for snapshot in dao.reference.collection(name).stream():
+                        self.write(snapshot.reference.path, snapshot.to_dict(), track=False)
+                        copied += 1
+                        if name != "proposals":
+                            continue
+                        for vote in snapshot.reference.collection("votes").stream():
+                            self.write(vote.reference.path, vote.to_dict(), track=False)
+                            copied += 1
+        return copied
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class FirestoreExporter:
+    """Copies the documents changed in a ``LocalStore`` to Firestore.
+
+    Every ``interval`` seconds the oldest outbox entries (at most one batch)
+    are exported until the outbox is empty. A document is written with its
+    state at export time, so several changes to it make one write, and a
+    failed batch is retried whole on the next pass.
+    """
+
+    def __init__(self, store, db, interval=1.0, batch_size=MAX_BATCH_OPS):
+        self.store = store
+        self.db = db
+        self.interval = interval
+        self.batch_size = min(batch_size, MAX_BATCH_OPS)
+        self._export_lock = threading.Lock()
+        self._stop = threading.Event()
+        self.exported = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self._thread = None
+        if interval and interval > 0:
+            self._thread = threading.Thread(target=self._run, name="firestore-export", daemon=True)
+            self._thread.start()
+
+    def export_batch(self):
+        """Export one batch of changed documents; return how many were written (0 when up to date)."""
+        with self._export_lock:
+            last_seq, paths = self.store.pending_changes(self.batch_size)
+            if not paths:
+                return 0
+            batch = self.db.batch()
+            for path in paths:
+                data = self.store.read(path)
+                reference = self.db.document(path)
+                if data is None:
+                    batch.delete(reference)
+                else:
+                    batch.set(reference, data)
+            batch.commit()
+            self.store.acknowledge(last_seq)
+            self.batches += 1
+            self.exported += len(paths)
+            return len(paths)
+
+    def export(self):
+        """Export until the outbox is empty; return how many documents were written."""
+        exported = 0
+        while True:
+            written = self.export_batch()
+            if not written:
+                return exported
+            exported += written
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.export()
+            except Exception as e:
+                self.failed_batches += 1
+                logger.warning("Firestore export failed, retrying in %.1fs: %s", self.interval, e)
+
+    def close(self):
+        """Stop the export thread and export everything still in the outbox."""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        started = time.perf_counter()
+        exported = self.export()
+        if exported:
+            logger.info("Exported %d documents to Firestore in %.1fs", exported, time.perf_counter() - started)
+
+    def stats(self):
+        return {"exported": self.exported, "batches": self.batches, "failed_batches": self.failed_batches,
+                "backlog": self.store.backlog()}
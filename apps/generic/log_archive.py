@@ -0,0 +1,299 @@
+"""Append-only archive of the logs returned by ``eth_getLogs``.
+
+Each ``append(from_block, to_block, logs)`` writes one frame: the logs of
+that block range, zlib-compressed, at the end of the current segment file
+(``segment-000001.bin``, a new one every ``segment_bytes``). A fixed-size
+record per frame goes to ``index.bin``::
+
+    from_block, to_block, segment, offset, length, log count, address bloom
+
+Records are in block order and never overlap, so readers ``mmap`` the index
+and binary search it for a block range; the 256-bit bloom of the frame's
+contract addresses lets them skip frames without a wanted address without
+decompressing them. Empty ranges get a record too, which makes the index
+a map of the blocks covered.
+
+A frame starting at or below the last archived block (a re-org, or a pass
+retried after its logs were archived) supersedes what was archived from its
+``from_block`` on: the index is cut back to that block and the old frames
+stay in the segments as dead bytes. Segments are never rewritten.
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from hexbytes import HexBytes
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILE = "index.bin"
+# from_block, to_block, segment, offset, length, log count, address bloom
+ENTRY = struct.Struct("<QQIQII32s")
+BLOOM_BITS = 256
+
+
+def _hex(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value.lower()
+    return "0x" + bytes(value).hex()
+
+
+def _bloom_bits(address):
+    digest = hashlib.blake2b(bytes.fromhex(address[2:].lower()), digest_size=6).digest()
+    return [int.from_bytes(digest[index:index + 2], "little") % BLOOM_BITS for index in (0, 2, 4)]
+
+
+def address_bloom(addresses):
+    bloom = 0
+    for address in addresses:
+        for bit in _bloom_bits(address):
+            bloom |= 1 << bit
+    return bloom.to_bytes(BLOOM_BITS // 8, "little")
+
+
+def bloom_may_contain(bloom, address):
+    value = int.from_bytes(bloom, "little")
+    return all(value >> bit & 1 for bit in _bloom_bits(address))
+
+
+def encode_log(log_entry):
+    """A log as a compact JSON-able list."""
+    return [
+        log_entry["blockNumber"],
+        log_entry["logIndex"],
+        log_entry.get("transactionIndex"),
+        _hex(log_entry["address"]),
+        [_hex(topic) for topic in log_entry["topics"]],
+        _hex(log_entry["data"]),
+        _hex(log_entry.get("blockHash")),
+        _hex(log_entry.get("transactionHash")),
+    ]
+
+
+def decode_log_entry(row):
+    """The log dict ``encode_log`` was given, with ``HexBytes`` values as web3 returns them."""
+    block_number, log_index, transaction_index, address, topics, data, block_hash, transaction_hash = row
+    return {
+        "address": address,
+        "blockNumber": block_number,
+        "logIndex": log_index,
+        "transactionIndex": transaction_index,
+        "topics": [HexBytes(topic) for topic in topics],
+        "data": HexBytes(data),
+        "blockHash": HexBytes(block_hash) if block_hash else None,
+        "transactionHash": HexBytes(transaction_hash) if transaction_hash else None,
+        "removed": False,
+    }
+
+
+class Frame:
+    __slots__ = ("position", "from_block", "to_block", "segment", "offset", "length", "count", "bloom")
+
+    def __init__(self, position, from_block, to_block, segment, offset, length, count, bloom):
+        self.position = position
+        self.from_block = from_block
+        self.to_block = to_block
+        self.segment = segment
+        self.offset = offset
+        self.length = length
+        self.count = count
+        self.bloom = bloom
+
+
+class LogArchive:
+    """Segment files and block-range index under ``directory``.
+
+    Writing is serialized by a lock; other processes can open the archive
+    ``readonly`` while one writes, as an index record is only written once
+    its frame is in the segment.
+    """
+
+    def __init__(self, directory, segment_bytes=64 << 20, compression=6, readonly=False):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.compression = compression
+        self.readonly = readonly
+        self._lock = threading.Lock()
+        self._index_path = os.path.join(directory, INDEX_FILE)
+        if not readonly:
+            os.makedirs(directory, exist_ok=True)
+            open(self._index_path, "ab").close()
+        self._index = open(self._index_path, "rb" if readonly else "r+b")
+        self._map = None
+        self._mapped_size = 0
+        self._readers = {}
+        self._segment = None
+        self._segment_id = 0
+        self.frames_written = 0
+        self.logs_written = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        if readonly:
+            return
+        # A crash in the middle of a record write leaves a partial record; drop it.
+        size = os.path.getsize(self._index_path)
+        if size % ENTRY.size:
+            self._index.truncate(size - size % ENTRY.size)
+        last = self.frame(len(self) - 1) if len(self) else None
+        self._open_segment(last.segment if last else 1)
+
+    def _segment_path(self, segment):
+        return os.path.join(self.directory, f"segment-{segment:06d}.bin")
+
+    def _open_segment(self, segment):
+        if self._segment:
+            self._segment.close()
+        self._segment_id = segment
+        self._segment = open(self._segment_path(segment), "ab")
+
+    def __len__(self):
+        return os.path.getsize(self._index_path) // ENTRY.size
+
+    def _entries(self):
+        """The index as a buffer (an ``mmap`` of ``index.bin``), remapped when the file has grown or shrunk."""
+        size = len(self) * ENTRY.size
+        if size != self._mapped_size:
+            # Older maps are closed when the last reader drops them.
+            self._map = mmap.mmap(self._index.fileno(), size, access=mmap.ACCESS_READ) if size else None
+            self._mapped_size = size
+        return self._map
+
+    def frame(self, position):
+        entries = self._entries()
+        return Frame(position, *ENTRY.unpack_from(entries, position * ENTRY.size))
+
+    def _bisect_to_block(self, block):
+        """Position of the first frame whose range ends at or after ``block``."""
+        entries = self._entries()
+        low, high = 0, len(entries) // ENTRY.size if entries else 0
+        while low < high:
+            middle = (low + high) // 2
+            if ENTRY.unpack_from(entries, middle * ENTRY.size)[1] < block:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def last_block(self):
+        """The last archived block, or ``None`` for an empty archive."""
+        return self.frame(len(self) - 1).to_block if len(self) else None
+
+    def first_block(self):
+        return self.frame(0).from_block if len(self) else None
+
+    def _supersede(self, from_block):
+        position = self._bisect_to_block(from_block)
+        if position == len(self):
+            return
+        frame = self.frame(position)
+        if frame.from_block < from_block:
+            # Keep the head of the straddling frame; readers clip its logs to the record's range.
+            self._index.seek(position * ENTRY.size)
+            self._index.write(ENTRY.pack(frame.from_block, from_block - 1, frame.segment, frame.offset,
+                                         frame.length, frame.count, frame.bloom))
+            position += 1
+        self._index.flush()
+        self._map, self._mapped_size = None, 0
+        self._index.truncate(position * ENTRY.size)
+        logger.info("Log archive: superseded blocks from %d", from_block)
+
+    def append(self, from_block, to_block, logs):
+        """Archive the logs ``eth_getLogs`` returned for ``[from_block, to_block]``."""
+        if self.readonly:
+            raise PermissionError(f"Log archive {self.directory} is open read-only")
+        rows = sorted((encode_log(log_entry) for log_entry in logs), key=lambda row: (row[0], row[1]))
+        raw = json.dumps(rows, separators=(",", ":")).encode()
+        payload = zlib.compress(raw, self.compression) if rows else b""
+        bloom = address_bloom({row[3] for row in rows})
+        with self._lock:
+            last = self.last_block()
+            if last is not None and from_block <= last:
+                self._supersede(from_block)
+            if self._segment.tell() + len(payload) > self.segment_bytes and self._segment.tell():
+                self._open_segment(self._segment_id + 1)
+            offset = self._segment.tell()
+            self._segment.write(payload)
+            self._segment.flush()
+            self._index.seek(0, os.SEEK_END)
+            self._index.write(ENTRY.pack(from_block, to_block, self._segment_id, offset, len(payload), len(rows), bloom))
+            self._index.flush()
+            self.frames_written += 1
+            self.logs_written += len(rows)
+            self.raw_bytes += len(raw)
+            self.compressed_bytes += len(payload)
+
+    def _read_frame(self, frame):
+        if not frame.length:
+            return []
+        reader = self._readers.get(frame.segment)
+        if reader is None:
+            reader = self._readers[frame.segment] = open(self._segment_path(frame.segment), "rb")
+        with self._lock:
+            reader.seek(frame.offset)
+            payload = reader.read(frame.length)
+        return json.loads(zlib.decompress(payload))
+
+    def frames(self, from_block=0, to_block=None):
+        """Index records overlapping ``[from_block, to_block]``, in block order."""
+        position = self._bisect_to_block(from_block)
+        total = len(self)
+        while position < total:
+            frame = self.frame(position)
+            if to_block is not None and frame.from_block > to_block:
+                return
+            yield frame
+            position += 1
+
+    def read(self, from_block=0, to_block=None, addresses=None):
+        """Archived logs in ``[from_block, to_block]`` in chain order, optionally only from ``addresses``."""
+        wanted = {address.lower() for address in addresses} if addresses else None
+        for frame in self.frames(from_block, to_block):
+            if wanted and not any(bloom_may_contain(frame.bloom, address) for address in wanted):
+                continue
+            low = max(from_block, frame.from_block)
+            high = frame.to_block if to_block is None else min(to_block, frame.to_block)
+            for row in self._read_frame(frame):
+                if low <= row[0] <= high and (wanted is None or row[3] in wanted):
+                    yield decode_log_entry(row)
+
+    def gaps(self, from_block, to_block):
+        """Block ranges in ``[from_block, to_block]`` that no frame covers."""
+        missing = []
+        expected = from_block
+        for frame in self.frames(from_block, to_block):
+            if frame.from_block > expected:
+                missing.append((expected, frame.from_block - 1))
+            expected = max(expected, frame.to_block + 1)
+        if expected <= to_block:
+            missing.append((expected, to_block))
+        return missing
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            for reader in self._readers.values():
+                reader.close()
+            self._readers = {}
+            if self._segment:
+                self._segment.close()
+            self._index.close()
+
+    def stats(self):
+        return {
+            "frames": len(self),
+            "first_block": self.first_block(),
+            "last_block": self.last_block(),
+            "frames_written": self.frames_written,
+            "logs_written": self.logs_written,
+            "compression_ratio": round(self.raw_bytes / self.compressed_bytes, 2) if self.compressed_bytes else None,
+        }
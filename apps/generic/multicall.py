@@ -0,0 +1,209 @@
+"""Batched contract reads.
+
+Hydrating a DAO used to make one ``eth_call`` round trip per getter. A
+``BatchCalls`` collects bound contract functions and sends them together:
+as a single Multicall3 ``aggregate3`` call when the contract is deployed on
+the chain, otherwise as one JSON-RPC batch, and call by call only if the node
+rejects batches. Reads that depend on an earlier result (``timelock()`` then
+``getMinDelay()``) go in a second ``BatchCalls``.
+
+Requests are sent through the provider directly: web3's validation
+middleware would otherwise fetch ``eth_chainId`` before every ``eth_call``,
+doubling the round trips of a plain ``.call()``.
+
+    reads = BatchCalls(web3)
+    decimals = reads.add(token.functions.decimals())
+    timelock = reads.add(dao.functions.timelock())
+    reads.execute()
+    decimals.result()  # the value, or raises the call's error
+"""
+
+import logging
+import threading
+import weakref
+
+from eth_utils.abi import get_abi_output_types
+from web3 import Web3
+from web3._utils.abi import map_abi_data
+from web3._utils.normalizers import BASE_RETURN_NORMALIZERS
+
+logger = logging.getLogger(__name__)
+
+# Same address on every chain it is deployed to (https://www.multicall3.com).
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+AGGREGATE3_SELECTOR = "0x82ad56cb"  # aggregate3((address,bool,bytes)[])
+
+# Per provider: whether Multicall3 is deployed (by address) and whether the node takes batches.
+_multicall_deployed = weakref.WeakKeyDictionary()
+_batch_unsupported = weakref.WeakSet()
+_lock = threading.Lock()
+
+
+class CallFailed(Exception):
+    """A call inside a batch reverted or returned an error."""
+
+
+class BatchRejected(CallFailed):
+    """The node refused a JSON-RPC batch as a whole."""
+
+
+def _block_param(block_identifier):
+    return block_identifier if isinstance(block_identifier, str) else hex(block_identifier)
+
+
+def _call_params(function, block_identifier):
+    return [{"to": function.address, "data": function._encode_transaction_data()}, _block_param(block_identifier)]
+
+
+def _rpc_result(response):
+    if not isinstance(response, dict):
+        raise CallFailed(f"unexpected response: {response}")
+    if response.get("error"):
+        raise CallFailed(str(response["error"]))
+    return response.get("result")
+
+
+class PendingCall:
+    """The eventual result of one call added to a ``BatchCalls``."""
+
+    def __init__(self, function):
+        self.function = function
+        self.value = None
+        self.error = None
+        self.done = False
+
+    def result(self):
+        if not self.done:
+            raise RuntimeError(f"{self.function} has not been executed")
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+def _decode(web3, function, data):
+    output_types = get_abi_output_types(function.abi)
+    values = map_abi_data(BASE_RETURN_NORMALIZERS, output_types, web3.codec.decode(output_types, _as_bytes(data)))
+    return values[0] if len(values) == 1 else values
+
+
+def _as_bytes(value):
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value)
+
+
+def multicall_deployed(web3, address=MULTICALL3_ADDRESS):
+    with _lock:
+        deployed = _multicall_deployed.get(web3.provider, {}).get(address)
+    if deployed is None:
+        try:
+            deployed = len(web3.eth.get_code(address)) > 0
+        except Exception as e:
+            logger.warning("Could not check for Multicall3 at %s: %s", address, e)
+            return False
+        with _lock:
+            _multicall_deployed.setdefault(web3.provider, {})[address] = deployed
+        logger.info("Multicall3 %s at %s", "found" if deployed else "not deployed", address)
+    return deployed
+
+
+class BatchCalls:
+    """One wave of independent ``eth_call``s executed together.
+
+    ``multicall`` is the Multicall3 address to try first; pass ``None`` to go
+    straight to JSON-RPC batching. Every call is made at ``block_identifier``.
+    """
+
+    def __init__(self, web3, block_identifier="latest", multicall=MULTICALL3_ADDRESS):
+        self.web3 = web3
+        self.block_identifier = block_identifier
+        self.multicall = multicall
+        self.calls = []
+        self.round_trips = 0
+
+    def add(self, function):
+        call = PendingCall(function)
+        self.calls.append(call)
+        return call
+
+    def __len__(self):
+        return len(self.calls)
+
+    def read(self, function):
+        """Execute ``function`` on its own (e.g. a dependent second wave) and return its value."""
+        call = self.add(function)
+        self.execute()
+        return call.result()
+
+    def execute(self):
+        pending = [call for call in self.calls if not call.done]
+        if not pending:
+            return self
+        if len(pending) > 1 and self.multicall and multicall_deployed(self.web3, self.multicall):
+            try:
+                self._via_multicall(pending)
+                return self
+            except Exception as e:
+                logger.warning("Multicall3 aggregate failed, falling back to a JSON-RPC batch: %s", e)
+        if len(pending) > 1 and self.web3.provider not in _batch_unsupported:
+            try:
+                self._via_batch(pending)
+                return self
+            except BatchRejected as e:
+                with _lock:
+                    _batch_unsupported.add(self.web3.provider)
+                logger.warning("JSON-RPC batches refused, making calls one by one from now on: %s", e)
+            except Exception as e:
+                logger.warning("JSON-RPC batch failed, making these calls one by one: %s", e)
+        for call in pending:
+            self._single(call)
+        return self
+
+    def _finish(self, call, data=None, error=None):
+        if error is None:
+            try:
+                call.value = _decode(self.web3, call.function, data)
+            except Exception as e:
+                error = e
+        call.error = error
+        call.done = True
+
+    def _via_multicall(self, pending):
+        calls = [(call.function.address, True, _as_bytes(call.function._encode_transaction_data()))
+                 for call in pending]
+        payload = AGGREGATE3_SELECTOR + self.web3.codec.encode(["(address,bool,bytes)[]"], [calls]).hex()
+        self.round_trips += 1
+        params = [{"to": Web3.to_checksum_address(self.multicall), "data": payload}, _block_param(self.block_identifier)]
+        raw = _rpc_result(self.web3.provider.make_request("eth_call", params))
+        (results,) = self.web3.codec.decode(["(bool,bytes)[]"], _as_bytes(raw))
+        for call, (success, data) in zip(pending, results):
+            if success:
+                self._finish(call, data)
+            else:
+                self._finish(call, error=CallFailed(f"{call.function} reverted"))
+
+    def _via_batch(self, pending):
+        requests = [("eth_call", _call_params(call.function, self.block_identifier)) for call in pending]
+        self.round_trips += 1
+        responses = self.web3.provider.make_batch_request(requests)
+        if not isinstance(responses, list):
+            # A single error response: the node does not take batches.
+            raise BatchRejected(f"batch refused: {responses}")
+        if len(responses) != len(pending):
+            raise CallFailed(f"unexpected batch response: {responses}")
+        for call, response in zip(pending, responses):
+            try:
+                data = _rpc_result(response)
+            except CallFailed as e:
+                self._finish(call, error=CallFailed(f"{call.function}: {e}"))
+                continue
+            self._finish(call, data)
+
+    def _single(self, call):
+        self.round_trips += 1
+        try:
+            data = _rpc_result(self.web3.provider.make_request("eth_call", _call_params(call.function, self.block_identifier)))
+        except Exception as e:
+            self._finish(call, error=e)
+            return
+        self._finish(call, data)
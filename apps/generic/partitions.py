@@ -0,0 +1,100 @@
+"""Work queues partitioned by key, so items with the same key are handled in order.
+
+``PartitionedQueue`` holds one FIFO per worker and routes each item to a
+partition by consistent hashing of its key (a DAO address): every item of a
+DAO lands in the same queue and is taken by the same worker, in the order it
+was put, while different DAOs spread over all workers. Each partition owns
+``replicas`` points on a hash ring, which keeps the spread even with few
+partitions and moves only about ``1/n`` of the keys if the partition count
+changes between runs.
+
+With a ``maxsize`` each partition is bounded: ``put`` blocks while the
+item's partition is full, which holds the producer back to the pace of the
+slowest worker instead of letting the backlog grow in memory.
+"""
+
+import bisect
+import hashlib
+import queue
+
+
+def _ring_hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    def __init__(self, partitions, replicas=64):
+        points = sorted((_ring_hash(f"{partition}:{replica}"), partition)
+                        for partition in range(partitions) for replica in range(replicas))
+        self._hashes = [point for point, _ in points]
+        self._partitions = [partition for _, partition in points]
+
+    def partition_for(self, key):
+        position = bisect.bisect(self._hashes, _ring_hash(key)) % len(self._hashes)
+        return self._partitions[position]
+
+
+class PartitionedQueue:
+    """``partitions`` queues behind one ``put(key, item)``.
+
+    Keys are case-insensitive, as contract addresses may arrive checksummed
+    or lower case. Workers call ``get(partition)`` and ``task_done(partition)``
+    on their own partition only. ``maxsize`` bounds each partition (``0``:
+    unbounded).
+    """
+
+    def __init__(self, partitions, maxsize=0, replicas=64):
+        self.partitions = max(1, partitions)
+        self.maxsize = maxsize
+        self._ring = HashRing(self.partitions, replicas)
+        self._queues = [queue.Queue(maxsize) for _ in range(self.partitions)]
+        self._routes = {}
+        self.put_counts = [0] * self.partitions
+
+    def partition_for(self, key):
+        key = (key or "").lower()
+        partition = self._routes.get(key)
+        if partition is None:
+            partition = self._routes[key] = self._ring.partition_for(key)
+        return partition
+
+    def put(self, key, item, block=True, timeout=None):
+        """Queue ``item`` on the partition of ``key``; raises ``queue.Full`` as ``queue.Queue.put`` does."""
+        partition = self.partition_for(key)
+        self._queues[partition].put(item, block=block, timeout=timeout)
+        self.put_counts[partition] += 1
+        return partition
+
+    def get(self, partition, timeout=None):
+        return self._queues[partition].get(timeout=timeout)
+
+    def task_done(self, partition):
+        self._queues[partition].task_done()
+
+    def depths(self):
+        """Items waiting in each partition."""
+        return [partition_queue.qsize() for partition_queue in self._queues]
+
+    def qsize(self):
+        return sum(self.depths())
+
+    def fill(self):
+        """How full the fullest partition is, from ``0.0`` to ``1.0``; always ``0.0`` when unbounded."""
+        if not self.maxsize:
+            return 0.0
+        return min(1.0, max(self.depths()) / self.maxsize)
+
+    def join(self):
+        for partition_queue in self._queues:
+            partition_queue.join()
+
+    def stats(self):
+        depths = self.depths()
+        return {
+            "depths": depths,
+            "max_depth": max(depths),
+            "fill": round(self.fill(), 2),
+            "queued": sum(depths),
+            "routed": list(self.put_counts),
+            "keys": len(self._routes),
+        }
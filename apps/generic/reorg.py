@@ -0,0 +1,345 @@
+"""Re-org detection and rollback for the indexer poll loop.
+
+The loop records the hash of every block it processed inside a rolling
+window. Before each pass it re-checks the newest recorded block; if the node
+now reports a different hash it walks back to the fork point. Firestore
+writes made while handling each block are journaled (the pre-image of every
+document a block touched), so only the orphaned blocks are rolled back and
+then re-applied from the new canonical chain.
+"""
+
+import copy
+import logging
+import threading
+from collections import OrderedDict
+
+from apps.generic.write_buffer import apply_write
+
+logger = logging.getLogger(__name__)
+
+
+class BlockHashWindow:
+    """Hashes of the most recent ``size`` processed blocks."""
+
+    def __init__(self, size):
+        self.size = size
+        self._hashes = OrderedDict()
+
+    def record(self, number, block_hash):
+        self._hashes[number] = bytes(block_hash)
+        self._hashes.move_to_end(number)
+        while len(self._hashes) > self.size:
+            self._hashes.popitem(last=False)
+
+    def newest(self):
+        if not self._hashes:
+            return None
+        return max(self._hashes)
+
+    def forget_from(self, block):
+        for number in [number for number in self._hashes if number >= block]:
+            del self._hashes[number]
+
+    def find_fork_point(self, web3):
+        """Return ``None`` if the newest recorded block is still canonical.
+
+        Otherwise return the highest recorded block that is, i.e. the last
+        block whose effects can be kept. When no recorded block survived the
+        re-org, one below the oldest recorded block is returned.
+        """
+        newest = self.newest()
+        if newest is None:
+            return None
+        if bytes(web3.eth.get_block(newest)["hash"]) == self._hashes[newest]:
+            return None
+        for number in sorted(self._hashes, reverse=True)[1:]:
+            if bytes(web3.eth.get_block(number)["hash"]) == self._hashes[number]:
+                return number
+        oldest = min(self._hashes)
+        logger.error("Re-org deeper than the %d-block hash window; rolling back to %d", self.size, oldest - 1)
+        return oldest - 1
+
+
+def _unwrap(reference):
+    return reference._ref if isinstance(reference, JournaledDocument) else reference
+
+
+class MutationJournal:
+    """Pre-images of the Firestore documents written while handling each block.
+
+    Only the first write to a document within a block is captured, which is
+    the state a rollback of that block has to restore. Call ``begin_block``
+    before handling a block's logs; writes outside a block are not journaled.
+
+    Without a ``buffer`` the pre-image is read when it is captured. With a
+    ``WriteBuffer`` below the journal, reading it then would commit the
+    document's buffered writes and cost a read per document; instead every
+    write is recorded in order, and when the buffer commits documents their
+    committed state is read in one request and the recorded writes replayed
+    on it (``apply_write``), which gives the state at each capture.
+    """
+
+    def __init__(self, db, window, buffer=None):
+        self.db = db
+        self.window = window
+        self.buffer = buffer
+        self._blocks = OrderedDict()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Per path, since its last commit: ("capture", block) and ("write", kind, payload, merge).
+        self._history = {}
+        # Histories taken by the commit in progress, put back if its writes are re-queued.
+        self._committing = {}
+        self._history_lock = threading.Lock()
+        self.reads = 0
+        self.unresolved = 0
+        if buffer is not None:
+            buffer.commit_hook = self._taken
+            buffer.requeue_hook = self._requeued
+
+    def begin_block(self, number):
+        self._local.block = number
+
+    def end_block(self):
+        self._local.block = None
+
+    def _reserve(self, path):
+        """Claim the capture of ``path`` in the current block; ``None`` if it is not to be captured."""
+        block = getattr(self._local, "block", None)
+        if block is None or self.window <= 0:
+            return None
+        with self._lock:
+            entries = self._blocks.setdefault(block, OrderedDict())
+            if path in entries:
+                return None
+            entries[path] = None  # reserve before the read so concurrent writers skip it
+        return block
+
+    def capture(self, reference):
+        """Read and keep the pre-image of ``reference`` now (writes that bypass the buffer)."""
+        block = self._reserve(reference.path)
+        if block is None:
+            return
+        snapshot = reference.get()
+        self.reads += 1
+        with self._lock:
+            self._blocks[block][reference.path] = (reference, snapshot.to_dict() if snapshot.exists else None)
+
+    def write(self, writes, perform):
+        """Journal ``writes`` (``(reference, kind, payload, merge)``, in order) and run ``perform``, which makes them."""
+        if self.buffer is None:
+            for reference, _, _, _ in writes:
+                self.capture(reference)
+            return perform()
+        with self.buffer.sequence_lock:
+            for reference, kind, payload, merge in writes:
+                block = self._reserve(reference.path)
+                with self._history_lock:
+                    history = self._history.setdefault(reference.path, [reference])
+                    if block is not None:
+                        history.append(("capture", block))
+                    history.append(("write", kind, copy.deepcopy(payload), merge))
+            return perform()
+
+    def _taken(self, references):
+        """``WriteBuffer.commit_hook``: the writes recorded for ``references`` are about to be committed."""
+        histories = []
+        with self._history_lock:
+            self._committing = {reference.path: self._history.pop(reference.path, None) for reference in references}
+        for reference in references:
+            history = self._committing[reference.path]
+            if history and any(entry[0] == "capture" for entry in history[1:]):
+                # The buffer's reference reads the committed document, not the buffered one.
+                histories.append([reference] + history[1:])
+        if not histories:
+            return None
+        return lambda: self._resolve(histories)
+
+    def _requeued(self, items):
+        """``WriteBuffer.requeue_hook``: the writes to these documents were not committed after all.
+
+        Their recorded writes go back ahead of those made since, so the next
+        commit replays them on the committed state again. Of a document
+        whose writes were partly committed it is not known which were, and
+        its next pre-images are not derived.
+        """
+        with self._history_lock:
+            for reference, whole in items:
+                taken = self._committing.get(reference.path)
+                if not taken:
+                    continue
+                entries = [entry for entry in taken[1:] if entry[0] == "write"] if whole else [("lost",)]
+                history = self._history.get(reference.path)
+                self._history[reference.path] = [taken[0]] + entries + (history[1:] if history else [])
+
+    def _read(self, references):
+        self.reads += len(references)
+        get_all = getattr(self.buffer.db, "get_all", None)
+        if get_all is not None:
+            return {snapshot.reference.path: snapshot.to_dict() if snapshot.exists else None
+                    for snapshot in get_all(references)}
+        return {reference.path: reference.get().to_dict() for reference in references}
+
+    def _resolve(self, histories):
+        """Turn recorded captures into pre-images from the documents' committed state."""
+        try:
+            committed = self._read([history[0] for history in histories])
+        except Exception as e:
+            logger.error("Could not read the pre-images of %d documents; they cannot be rolled back: %s",
+                         len(histories), e)
+            self.unresolved += len(histories)
+            return
+        for history in histories:
+            reference = history[0]
+            image = committed.get(reference.path)
+            known = True
+            for entry in history[1:]:
+                if entry[0] == "capture":
+                    with self._lock:
+                        entries = self._blocks.get(entry[1])
+                        if entries is not None and known:
+                            entries[reference.path] = (reference, copy.deepcopy(image))
+                    if not known:
+                        self.unresolved += 1
+                    continue
+                if entry[0] == "lost":
+                    if known:
+                        logger.warning("Pre-image of %s cannot be derived after a partly failed commit; "
+                                       "it will not be rolled back", reference.path)
+                    known = False
+                elif known:
+                    try:
+                        image = apply_write(image, entry[1], entry[2], entry[3])
+                    except ValueError as e:
+                        logger.warning("Pre-image of %s cannot be derived; it will not be rolled back: %s",
+                                       reference.path, e)
+                        known = False
+
+    def prune(self, below_block):
+        with self._lock:
+            for number in [number for number in self._blocks if number < below_block]:
+                del self._blocks[number]
+
+    def rollback_from(self, block):
+        """Restore every document touched at or above ``block``; return how many writes that took."""
+        if self.buffer is not None:
+            # Resolves the pre-images of the writes still buffered.
+            self.buffer.flush()
+        with self._lock:
+            orphaned = sorted((number for number in self._blocks if number >= block), reverse=True)
+            restores = []
+            for number in orphaned:
+                restores.extend(reversed(list(self._blocks.pop(number).values())))
+        writes = 0
+        batch = self.db.batch()
+        for entry in restores:
+            if entry is None:
+                continue
+            reference, pre_image = entry
+            if pre_image is None:
+                batch.delete(reference)
+            else:
+                batch.set(reference, pre_image)
+            writes += 1
+            if writes % 500 == 0:
+                batch.commit()
+                batch = self.db.batch()
+        if writes % 500:
+            batch.commit()
+        return writes
+
+    def stats(self):
+        return {"blocks": len(self._blocks), "reads": self.reads, "unresolved": self.unresolved}
+
+
+class JournaledDocument:
+    """``DocumentReference`` proxy that journals pre-images before writes."""
+
+    def __init__(self, ref, journal):
+        self._ref = ref
+        self._journal = journal
+
+    def __getattr__(self, name):
+        return getattr(self._ref, name)
+
+    def collection(self, name):
+        return JournaledCollection(self._ref.collection(name), self._journal)
+
+    def get(self, *args, transaction=None, **kwargs):
+        if transaction is not None:
+            # Read-modify-write inside a transaction: the update that follows
+            # goes straight to the transaction, so capture here.
+            self._journal.capture(self._ref)
+            return self._ref.get(*args, transaction=transaction, **kwargs)
+        return self._ref.get(*args, **kwargs)
+
+    def set(self, document_data, merge=False):
+        return self._journal.write([(self._ref, "set", document_data, merge)],
+                                   lambda: self._ref.set(document_data, merge=merge))
+
+    def update(self, field_updates):
+        return self._journal.write([(self._ref, "update", field_updates, False)],
+                                   lambda: self._ref.update(field_updates))
+
+    def delete(self):
+        return self._journal.write([(self._ref, "delete", None, False)], self._ref.delete)
+
+
+class JournaledCollection:
+    def __init__(self, collection, journal):
+        self._collection = collection
+        self._journal = journal
+
+    def __getattr__(self, name):
+        return getattr(self._collection, name)
+
+    def document(self, *args, **kwargs):
+        return JournaledDocument(self._collection.document(*args, **kwargs), self._journal)
+
+
+class JournaledBatch:
+    """Journals its writes when committed, which is when they are made."""
+
+    def __init__(self, batch, journal):
+        self._batch = batch
+        self._journal = journal
+        self._writes = []
+
+    def __getattr__(self, name):
+        return getattr(self._batch, name)
+
+    def set(self, reference, document_data, merge=False):
+        reference = _unwrap(reference)
+        self._writes.append((reference, "set", document_data, merge))
+        return self._batch.set(reference, document_data, merge=merge)
+
+    def update(self, reference, field_updates):
+        reference = _unwrap(reference)
+        self._writes.append((reference, "update", field_updates, False))
+        return self._batch.update(reference, field_updates)
+
+    def delete(self, reference):
+        reference = _unwrap(reference)
+        self._writes.append((reference, "delete", None, False))
+        return self._batch.delete(reference)
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        return self._journal.write(writes, self._batch.commit)
+
+
+class JournaledClient:
+    """Firestore client proxy handed to ``Paper`` so its writes are journaled."""
+
+    def __init__(self, db, journal):
+        self._db = db
+        self._journal = journal
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    def collection(self, *args, **kwargs):
+        return JournaledCollection(self._db.collection(*args, **kwargs), self._journal)
+
+    def batch(self):
+        return JournaledBatch(self._db.batch(), self._journal)
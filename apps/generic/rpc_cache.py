@@ -0,0 +1,119 @@
+"""Persistent cache of JSON-RPC responses for replaying handlers offline.
+
+``CachingProvider`` is a web3 provider that answers the read-only methods the
+handlers use (``eth_call``, ``eth_getCode``, ``eth_chainId`` and block
+lookups) from a SQLite file keyed by method and parameters, and forwards
+misses to an upstream provider, storing the answer. Without an upstream a
+miss is answered with a JSON-RPC error, which the handlers already treat as
+a failed read.
+
+Responses are cached as first seen, including those of calls made at
+``latest``; a replay served from the cache is therefore deterministic, and
+repeats the contract state of the replay that filled it.
+"""
+
+import json
+import logging
+import sqlite3
+import threading
+
+from web3.providers.base import JSONBaseProvider
+
+logger = logging.getLogger(__name__)
+
+CACHEABLE_METHODS = frozenset(("eth_call", "eth_getCode", "eth_chainId", "net_version",
+                               "eth_getBlockByNumber", "eth_getBlockByHash"))
+
+
+def _jsonable(value):
+    return "0x" + bytes(value).hex()
+
+
+def cache_key(method, params):
+    return json.dumps([method, params], sort_keys=True, separators=(",", ":"), default=_jsonable)
+
+
+class CachingProvider(JSONBaseProvider):
+    def __init__(self, path, upstream=None):
+        super().__init__()
+        self.path = path
+        self.upstream = upstream
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, result TEXT NOT NULL)")
+        self._conn.commit()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0
+
+    def _lookup(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT result FROM responses WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _store(self, key, response):
+        if "result" not in response or response.get("error"):
+            return
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO responses (key, result) VALUES (?, ?)",
+                               (key, json.dumps(response["result"], default=_jsonable)))
+            self._conn.commit()
+
+    def _missing(self, method, request_id=1):
+        return {"jsonrpc": "2.0", "id": request_id,
+                "error": {"code": -32000, "message": f"{method} response not cached and no upstream node"}}
+
+    def make_request(self, method, params):
+        if method not in CACHEABLE_METHODS:
+            self.uncached += 1
+            return self.upstream.make_request(method, params) if self.upstream else self._missing(method)
+        key = cache_key(method, params)
+        result = self._lookup(key)
+        if result is not None:
+            self.hits += 1
+            return {"jsonrpc": "2.0", "id": 1, "result": result}
+        self.misses += 1
+        if self.upstream is None:
+            return self._missing(method)
+        response = self.upstream.make_request(method, params)
+        self._store(key, response)
+        return response
+
+    def make_batch_request(self, requests):
+        responses = [None] * len(requests)
+        forward = []
+        for index, (method, params) in enumerate(requests):
+            result = self._lookup(cache_key(method, params)) if method in CACHEABLE_METHODS else None
+            if result is not None:
+                self.hits += 1
+                responses[index] = {"jsonrpc": "2.0", "id": index, "result": result}
+            else:
+                self.misses += 1
+                forward.append(index)
+        if forward and self.upstream is None:
+            for index in forward:
+                responses[index] = self._missing(requests[index][0], index)
+        elif forward:
+            upstream = self.upstream.make_batch_request([requests[index] for index in forward])
+            if isinstance(upstream, dict):
+                # The node rejected the batch as a whole; let the caller fall back.
+                return upstream
+            for index, response in zip(forward, sorted(upstream, key=lambda response: response.get("id", 0))):
+                response = dict(response, id=index)
+                responses[index] = response
+                method, params = requests[index]
+                if method in CACHEABLE_METHODS:
+                    self._store(cache_key(method, params), response)
+        return responses
+
+    def is_connected(self, show_traceback=False):
+        return True
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "uncached": self.uncached,
+                "hit_ratio": round(self.hits / requests, 3) if requests else None}
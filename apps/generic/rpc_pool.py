@@ -0,0 +1,209 @@
+"""A web3 provider spread over several JSON-RPC endpoints.
+
+``RpcPool`` keeps one ``HTTPProvider`` per endpoint for the life of the
+process, each on its own keep-alive ``requests.Session``, and sends every
+request to the endpoint that currently looks best: the lowest median
+latency among the healthy ones, with recent errors counted against it. A
+request that fails on one endpoint (connection error, timeout, HTTP error)
+is retried on the next, and an endpoint failing ``max_failures`` times in a
+row is left out for ``cooldown`` seconds.
+
+``eth_getLogs`` is hedged: if the first endpoint has not answered within
+its usual time (its p99 for ``get_logs``, at least ``hedge_after``
+seconds), the same request goes to the second best one and whichever
+answers first is used. Answers that are JSON-RPC errors are returned as
+they are; they come from a working node.
+
+    web3 = Web3(RpcPool(["https://node.ghostnet.etherlink.com", "https://..."]))
+    web3.provider.stats()
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import HTTPProvider
+from web3.providers.base import JSONBaseProvider
+
+logger = logging.getLogger(__name__)
+
+HEDGED_METHODS = frozenset(("eth_getLogs",))
+
+
+def _percentile(samples, fraction):
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Endpoint:
+    """One node of the pool and what was observed of it."""
+
+    def __init__(self, url, timeout=30, connections=16, window=256):
+        self.url = url
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=connections)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        # Failover replaces the provider's own retries.
+        self.provider = HTTPProvider(url, request_kwargs={"timeout": timeout}, session=session,
+                                     exception_retry_configuration=None)
+        self._latencies = deque(maxlen=window)
+        self._logs_latencies = deque(maxlen=window)
+        self._outcomes = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.consecutive_failures = 0
+        self.down_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def record(self, method, elapsed=None, error=None):
+        with self._lock:
+            self.requests += 1
+            self._outcomes.append(error is None)
+            if error is None:
+                self.consecutive_failures = 0
+                self._latencies.append(elapsed)
+                if method in HEDGED_METHODS:
+                    self._logs_latencies.append(elapsed)
+            else:
+                self.errors += 1
+                self.consecutive_failures += 1
+
+    def latency(self, fraction):
+        with self._lock:
+            return _percentile(self._latencies, fraction)
+
+    def logs_latency(self, fraction):
+        with self._lock:
+            return _percentile(self._logs_latencies, fraction)
+
+    def error_rate(self):
+        with self._lock:
+            return self._outcomes.count(False) / len(self._outcomes) if self._outcomes else 0.0
+
+    def healthy(self, now):
+        return now >= self.down_until
+
+    def score(self):
+        """Lower is better: median latency, inflated by the recent error rate."""
+        median = self.latency(0.5)
+        error_rate = self.error_rate()
+        if median is None:
+            # Endpoints never tried go first so that they get measured; those that
+            # only ever failed go after every endpoint with a measured latency.
+            return math.inf if error_rate > 0 else 0.0
+        return median * (1 + 10 * error_rate)
+
+    def stats(self):
+        p50, p99 = self.latency(0.5), self.latency(0.99)
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate(), 3),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+            "healthy": self.healthy(time.monotonic()),
+        }
+
+
+class RpcPool(JSONBaseProvider):
+    def __init__(self, urls, timeout=30, max_failures=3, cooldown=30.0, hedge_after=0.5, hedge_workers=8):
+        super().__init__()
+        if not urls:
+            raise ValueError("RpcPool needs at least one endpoint")
+        self.endpoints = [Endpoint(url, timeout=timeout) for url in dict.fromkeys(urls)]
+        self.max_failures = max_failures
+        self.cooldown = cooldown
+        self.hedge_after = hedge_after
+        self._hedge_pool = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix="rpc-hedge")
+        self.failovers = 0
+        self.hedges = 0
+        self.hedges_won = 0
+
+    def ranked(self):
+        """Healthy endpoints best first, then the resting ones (soonest back first) as a last resort."""
+        now = time.monotonic()
+        healthy = sorted((endpoint for endpoint in self.endpoints if endpoint.healthy(now)), key=Endpoint.score)
+        resting = sorted((endpoint for endpoint in self.endpoints if not endpoint.healthy(now)),
+                         key=lambda endpoint: endpoint.down_until)
+        return healthy + resting
+
+    def _send(self, endpoint, method, call):
+        started = time.perf_counter()
+        try:
+            response = call(endpoint.provider)
+        except Exception as exc:
+            endpoint.record(method, error=exc)
+            if endpoint.consecutive_failures >= self.max_failures and endpoint.healthy(time.monotonic()):
+                endpoint.down_until = time.monotonic() + self.cooldown
+                logger.warning("RPC endpoint %s failed %d times in a row, resting it for %.0fs: %s",
+                               endpoint.url, endpoint.consecutive_failures, self.cooldown, exc)
+            raise
+        endpoint.record(method, time.perf_counter() - started)
+        return response
+
+    def _with_failover(self, method, call, endpoints):
+        error = None
+        for attempt, endpoint in enumerate(endpoints):
+            if attempt:
+                self.failovers += 1
+            try:
+                return self._send(endpoint, method, call)
+            except Exception as exc:
+                error = exc
+        raise error
+
+    def _hedged(self, method, call, endpoints):
+        first, second = endpoints[0], endpoints[1]
+        delay = max(self.hedge_after, first.logs_latency(0.99) or 0.0)
+        primary = self._hedge_pool.submit(self._send, first, method, call)
+        done, _ = wait([primary], timeout=delay)
+        if done and primary.exception() is None:
+            return primary.result()
+        if done:
+            # Failed outright: no race, plain failover over the rest.
+            self.failovers += 1
+            return self._with_failover(method, call, endpoints[1:])
+        self.hedges += 1
+        backup = self._hedge_pool.submit(self._send, second, method, call)
+        pending = {primary, backup}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self.hedges_won += 1
+                    return future.result()
+        self.failovers += 1
+        return self._with_failover(method, call, endpoints[2:]) if len(endpoints) > 2 else primary.result()
+
+    def make_request(self, method, params):
+        endpoints = self.ranked()
+        call = lambda provider: provider.make_request(method, params)
+        if method in HEDGED_METHODS and len(endpoints) > 1:
+            return self._hedged(method, call, endpoints)
+        return self._with_failover(method, call, endpoints)
+
+    def make_batch_request(self, requests):
+        return self._with_failover("batch", lambda provider: provider.make_batch_request(requests), self.ranked())
+
+    def is_connected(self, show_traceback=False):
+        return any(endpoint.provider.is_connected(show_traceback) for endpoint in self.ranked())
+
+    def close(self):
+        self._hedge_pool.shutdown(wait=False)
+
+    def stats(self):
+        return {
+            "endpoints": {endpoint.url: endpoint.stats() for endpoint in self.endpoints},
+            "failovers": self.failovers,
+            "hedges": self.hedges,
+            "hedges_won": self.hedges_won,
+        }
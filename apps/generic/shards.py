@@ -0,0 +1,97 @@
+"""Sharded address set for ``eth_getLogs`` fan-out."""
+
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from apps.generic.backfill import log_sort_key
+
+
+class AddressShards:
+    """The set of listened addresses, split into shards of at most ``shard_size``.
+
+    Behaves like the plain list the loops used before (``append``, ``in``,
+    ``len``, iteration), so handlers can keep registering new DAOs the same
+    way; each new address goes to the smallest shard, and a new shard is
+    opened once all of them are full. With an ``archive`` (a ``LogArchive``)
+    the merged result of every ``get_logs`` is archived.
+
+    An address appended with the block it was registered at is also kept
+    until ``take_registered``, for a poller that may already have fetched
+    past that block to fetch what the address emitted since.
+    """
+
+    def __init__(self, addresses=(), shard_size=200, max_workers=4, archive=None):
+        self.shard_size = max(1, shard_size)
+        self.max_workers = max_workers
+        self.archive = archive
+        self.shards = []
+        self._members = set()
+        self._registered = {}
+        self._lock = threading.Lock()
+        self._pool = None
+        for address in addresses:
+            self.append(address)
+
+    def append(self, address, block=None):
+        if not address:
+            return
+        with self._lock:
+            if address in self._members:
+                return
+            self._members.add(address)
+            if block is not None:
+                self._registered[address] = block
+            open_shards = [shard for shard in self.shards if len(shard) < self.shard_size]
+            if open_shards:
+                min(open_shards, key=len).append(address)
+            else:
+                self.shards.append([address])
+
+    def __contains__(self, address):
+        return address in self._members
+
+    def __len__(self):
+        return len(self._members)
+
+    def __iter__(self):
+        with self._lock:
+            return iter([address for shard in self.shards for address in shard])
+
+    def take_registered(self):
+        """``{address: block}`` of the addresses appended with a block since the last call."""
+        with self._lock:
+            registered, self._registered = self._registered, {}
+        return registered
+
+    def snapshot(self):
+        with self._lock:
+            return [list(shard) for shard in self.shards]
+
+    def get_logs(self, web3, from_block, to_block, topics=None):
+        """Query every shard concurrently and merge into one ``(block, logIndex)`` ordered list."""
+        shards = self.snapshot()
+        if not shards:
+            return []
+
+        def fetch(shard):
+            log_filter = {"fromBlock": from_block, "toBlock": to_block, "address": shard}
+            if topics:
+                log_filter["topics"] = topics
+            return sorted(web3.eth.get_logs(log_filter), key=log_sort_key)
+
+        if len(shards) == 1:
+            logs = fetch(shards[0])
+        else:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="get-logs")
+            results = list(self._pool.map(fetch, shards))
+            logs = list(heapq.merge(*results, key=log_sort_key))
+        if self.archive is not None:
+            self.archive.append(from_block, to_block, logs)
+        return logs
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
@@ -0,0 +1,337 @@
+"""Storage backends for ``Paper`` and the indexers.
+
+``Paper`` only needs the following subset of the Firestore client API, and
+every backend provides it:
+
+* client: ``collection(path)``, ``document(path)``, ``batch()``
+* collection: ``document(id)``, ``stream()``, ``select(fields)``,
+  ``list_documents()``, ``id``, ``path``
+* document: ``get()``, ``set(data, merge=False)``, ``update(fields)``,
+  ``delete()``, ``collection(name)``, ``id``, ``path``, ``parent``
+* snapshot: ``exists``, ``id``, ``reference``, ``to_dict()``
+* batch: ``set``, ``update``, ``delete``, ``commit()``
+* field transforms: ``ArrayUnion``, ``ArrayRemove``, ``Increment``,
+  ``DELETE_FIELD`` and ``SERVER_TIMESTAMP``, re-exported here so handlers do
+  not import them from Firestore
+
+Transactions are not part of it; ``update`` of a missing document raises
+``NotFound`` as Firestore does. The backends are:
+
+* ``firestore_client()``: the Firestore project in ``homebase.json``;
+* ``emulator_client()``: a Firestore emulator, no credentials needed;
+* ``MemoryStore().client()``: documents in a dict, for benchmarks and load
+  tests that must not touch the network;
+* ``LocalStore(path).client()`` in ``apps.generic.local_store``: SQLite.
+
+``open_client(backend)`` picks one by name.
+"""
+
+import copy
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from google.api_core.exceptions import NotFound
+from google.cloud.firestore_v1.transforms import DELETE_FIELD, SERVER_TIMESTAMP, ArrayRemove, ArrayUnion, Increment
+
+BACKENDS = ("firestore", "emulator", "memory", "sqlite")
+
+
+def _transform(old, value):
+    """The stored value of a field holding ``old`` after it is written ``value``."""
+    if value is SERVER_TIMESTAMP:
+        return datetime.now(timezone.utc)
+    if isinstance(value, ArrayUnion):
+        old = list(old) if isinstance(old, list) else []
+        return old + [item for index, item in enumerate(value.values)
+                      if item not in old and item not in value.values[:index]]
+    if isinstance(value, ArrayRemove):
+        return [item for item in old if item not in value.values] if isinstance(old, list) else []
+    if isinstance(value, Increment):
+        return old + value.value if isinstance(old, (int, float)) and not isinstance(old, bool) else value.value
+    if isinstance(value, dict):
+        return {key: _transform(None, item) for key, item in value.items() if item is not DELETE_FIELD}
+    return value
+
+
+def _merge(data, fields):
+    """``set(fields, merge=True)`` applied to ``data``: nested maps are merged."""
+    for key, value in fields.items():
+        if value is DELETE_FIELD:
+            data.pop(key, None)
+        elif isinstance(value, dict) and isinstance(data.get(key), dict):
+            _merge(data[key], value)
+        else:
+            data[key] = _transform(data.get(key), value)
+    return data
+
+
+def _update(data, fields):
+    """``update(fields)`` applied to ``data``; keys are dotted field paths."""
+    for field_path, value in fields.items():
+        parts = [part.strip("`") for part in field_path.split(".")]
+        node = data
+        for part in parts[:-1]:
+            if not isinstance(node.get(part), dict):
+                node[part] = {}
+            node = node[part]
+        if value is DELETE_FIELD:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = _transform(node.get(parts[-1]), value)
+    return data
+
+
+class DocumentStore:
+    """Documents keyed by path, behind the Firestore-shaped ``StoreClient``.
+
+    Subclasses implement ``read``, ``children``, ``write``, ``count`` and
+    ``atomic``; the write semantics of ``set``/``update``/``delete`` are
+    implemented once, in ``apply``.
+    """
+
+    def read(self, path):
+        """The document at ``path`` as a dict, or ``None``."""
+        raise NotImplementedError
+
+    def children(self, collection_path):
+        """``(id, data)`` of every document directly in ``collection_path``, ordered by id."""
+        raise NotImplementedError
+
+    def write(self, path, data):
+        """Store ``data`` at ``path``; ``None`` deletes the document."""
+        raise NotImplementedError
+
+    def count(self, collection_path):
+        """Number of documents directly in ``collection_path``."""
+        raise NotImplementedError
+
+    def atomic(self):
+        """Context manager making the enclosed writes one transaction; nested calls are savepoints."""
+        raise NotImplementedError
+
+    def apply(self, path, kind, payload=None, merge=False):
+        """Apply a Firestore-style ``set``/``update``/``delete`` to the document at ``path``."""
+        with self.atomic():
+            if kind == "delete":
+                self.write(path, None)
+                return
+            current = self.read(path)
+            if kind == "set":
+                data = _merge(current or {}, payload) if merge else _transform(None, payload)
+            elif current is None:
+                raise NotFound(f"No document to update: {path}")
+            else:
+                data = _update(current, payload)
+            self.write(path, data)
+
+    def client(self):
+        return StoreClient(self)
+
+
+class MemoryStore(DocumentStore):
+    """Documents in a dict; ``atomic()`` undoes its writes if the block raises."""
+
+    def __init__(self):
+        self._documents = {}
+        self._children = {}
+        self._lock = threading.RLock()
+        self._undo = []
+        self._depth = 0
+        self.reads = 0
+        self.writes = 0
+
+    @contextmanager
+    def atomic(self):
+        with self._lock:
+            mark = len(self._undo)
+            self._depth += 1
+            try:
+                yield self
+            except BaseException:
+                while len(self._undo) > mark:
+                    self._put(*self._undo.pop())
+                raise
+            finally:
+                self._depth -= 1
+                if not self._depth:
+                    self._undo.clear()
+
+    def _put(self, path, data):
+        parent, document_id = path.rsplit("/", 1)
+        if data is None:
+            self._documents.pop(path, None)
+            self._children.get(parent, {}).pop(document_id, None)
+        else:
+            self._documents[path] = data
+            self._children.setdefault(parent, {})[document_id] = None
+
+    def read(self, path):
+        with self._lock:
+            data = self._documents.get(path)
+            self.reads += 1
+            return copy.deepcopy(data)
+
+    def children(self, collection_path):
+        with self._lock:
+            ids = sorted(self._children.get(collection_path, ()))
+            self.reads += len(ids)
+            return [(document_id, copy.deepcopy(self._documents[f"{collection_path}/{document_id}"]))
+                    for document_id in ids]
+
+    def write(self, path, data):
+        with self._lock:
+            if self._depth:
+                self._undo.append((path, self._documents.get(path)))
+            self._put(path, copy.deepcopy(data))
+            self.writes += 1
+
+    def count(self, collection_path):
+        with self._lock:
+            return len(self._children.get(collection_path, ()))
+
+
+class StoreSnapshot:
+    def __init__(self, reference, data):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return self._data
+
+    def get(self, field_path):
+        value = self._data
+        for part in field_path.split("."):
+            value = value[part]
+        return value
+
+
+class StoreDocument:
+    """``DocumentReference`` stand-in backed by a ``DocumentStore``."""
+
+    def __init__(self, store, path):
+        self._store = store
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    @property
+    def parent(self):
+        return StoreCollection(self._store, self.path.rsplit("/", 1)[0])
+
+    def collection(self, name):
+        return StoreCollection(self._store, f"{self.path}/{name}")
+
+    def get(self, *args, **kwargs):
+        return StoreSnapshot(self, self._store.read(self.path))
+
+    def set(self, document_data, merge=False):
+        self._store.apply(self.path, "set", document_data, merge=merge)
+
+    def update(self, field_updates):
+        self._store.apply(self.path, "update", field_updates)
+
+    def delete(self):
+        self._store.apply(self.path, "delete")
+
+
+class StoreCollection:
+    """``CollectionReference`` stand-in; queries other than a full listing are not supported."""
+
+    def __init__(self, store, path):
+        self._store = store
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+
+    def document(self, document_id=None):
+        return StoreDocument(self._store, f"{self.path}/{document_id or os.urandom(10).hex()}")
+
+    def stream(self, *args, **kwargs):
+        for document_id, data in self._store.children(self.path):
+            yield StoreSnapshot(self.document(document_id), data)
+
+    get = stream
+
+    def select(self, field_paths):
+        return self
+
+    def list_documents(self, *args, **kwargs):
+        return [self.document(document_id) for document_id, _ in self._store.children(self.path)]
+
+
+class StoreBatch:
+    """``WriteBatch`` stand-in; ``commit()`` applies its writes in one transaction."""
+
+    def __init__(self, store):
+        self._store = store
+        self._writes = []
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append((reference.path, "set", document_data, merge))
+
+    def update(self, reference, field_updates):
+        self._writes.append((reference.path, "update", field_updates, False))
+
+    def delete(self, reference):
+        self._writes.append((reference.path, "delete", None, False))
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        with self._store.atomic():
+            for path, kind, payload, merge in writes:
+                self._store.apply(path, kind, payload, merge=merge)
+        return []
+
+
+class StoreClient:
+    """Firestore client stand-in over a ``DocumentStore``."""
+
+    def __init__(self, store):
+        self.store = store
+
+    def collection(self, *path):
+        return StoreCollection(self.store, "/".join(path))
+
+    def document(self, *path):
+        return StoreDocument(self.store, "/".join(path))
+
+    def batch(self):
+        return StoreBatch(self.store)
+
+
+def firestore_client(credentials_path="homebase.json"):
+    """The Firestore client of the project whose service account is in ``credentials_path``."""
+    from firebase_admin import credentials, firestore, initialize_app
+
+    initialize_app(credentials.Certificate(credentials_path))
+    return firestore.client()
+
+
+def emulator_client(host=None, project="homebase-local"):
+    """A client of the Firestore emulator at ``host`` (default ``$FIRESTORE_EMULATOR_HOST`` or localhost:8080)."""
+    from google.auth.credentials import AnonymousCredentials
+    from google.cloud import firestore
+
+    os.environ["FIRESTORE_EMULATOR_HOST"] = host or os.environ.get("FIRESTORE_EMULATOR_HOST", "localhost:8080")
+    return firestore.Client(project=project, credentials=AnonymousCredentials())
+
+
+def open_client(backend="firestore", **options):
+    """A client of ``backend`` (one of ``BACKENDS``).
+
+    ``options`` go to the backend: ``credentials_path`` for ``firestore``,
+    ``host``/``project`` for ``emulator`` and ``path`` for ``sqlite``.
+    """
+    if backend == "firestore":
+        return firestore_client(**options)
+    if backend == "emulator":
+        return emulator_client(**options)
+    if backend == "memory":
+        return MemoryStore().client()
+    if backend == "sqlite":
+        from apps.generic.local_store import LocalStore
+
+        return LocalStore(**options).client()
+    raise ValueError(f"Unknown storage backend {backend!r}; expected one of {', '.join(BACKENDS)}")
@@ -0,0 +1,217 @@
+"""Logs pushed over a WebSocket ``eth_subscribe("logs")``, with HTTP gap-fill.
+
+``LogSubscription`` subscribes to the logs of the listened addresses and
+hands each one to ``on_log`` as soon as the node announces it, formatted as
+``web3.eth.get_logs`` would return it. The address set is re-read every
+second: addresses added since (a DAO and token registered by ``add_dao`` or
+``add_dao_wrapped``) get a subscription of their own, and their logs of the
+last ``new_address_lookback`` blocks are fetched over HTTP, so whatever
+they emitted between their creation and the subscription is not missed.
+
+A ``newHeads`` subscription on the same socket tells how far the stream is
+known to be complete. When the connection drops, the listener reconnects,
+subscribes again and first fetches everything from that block to the head
+with ``get_logs`` (over HTTP, in windows of ``max_window`` blocks); logs
+seen twice are for ``on_log``'s de-duplication to drop.
+
+Notified logs are not confirmed: a log the node later withdraws (a re-org)
+comes again with ``removed`` set and is passed to ``on_removed``.
+"""
+
+import json
+import logging
+import threading
+import time
+
+from web3 import Web3
+from web3._utils.method_formatters import log_entry_formatter
+from websockets.sync.client import connect
+
+logger = logging.getLogger(__name__)
+
+
+def format_log(raw):
+    """A log of a ``logs`` notification, typed as ``get_logs`` returns it."""
+    log_entry = dict(log_entry_formatter(raw))
+    log_entry["address"] = Web3.to_checksum_address(log_entry["address"])
+    return log_entry
+
+
+class LogSubscription:
+    def __init__(self, ws_url, web3, addresses, on_log, topics=None, from_block=None, on_removed=None,
+                 get_logs=None, max_window=1000, reconnect_delay=2.0, chunk_size=500, new_address_lookback=1000):
+        """
+        Parameters
+        ----------
+        ws_url : str
+            WebSocket JSON-RPC endpoint.
+        web3 : Web3
+            HTTP instance used to gap-fill and to read the head.
+        addresses : iterable
+            Listened contract addresses; re-read as it grows.
+        on_log : callable
+            Called with each log, in the listener thread.
+        topics : list, optional
+            ``topics`` filter of the subscriptions and the gap-fill queries.
+        from_block : int, optional
+            First block to gap-fill on the first connection; ``None`` starts
+            at the head.
+        get_logs : callable, optional
+            ``get_logs(from_block, to_block)`` for a full gap-fill (e.g. an
+            ``AddressShards.get_logs``); by default one ``eth_getLogs`` per
+            ``chunk_size`` addresses.
+        new_address_lookback : int
+            Blocks before the synced block fetched for a newly added
+            address; covers the time its creating log spent queued before
+            being handled.
+        """
+        self.ws_url = ws_url
+        self.web3 = web3
+        self.addresses = addresses
+        self.on_log = on_log
+        self.on_removed = on_removed
+        self.topics = topics
+        self.get_logs = get_logs
+        self.max_window = max_window
+        self.reconnect_delay = reconnect_delay
+        self.chunk_size = chunk_size
+        self.new_address_lookback = new_address_lookback
+        # Every log up to this block has been passed to on_log.
+        self.synced_block = None if from_block is None else from_block - 1
+        self._subscribed = set()
+        # Addresses whose logs before their subscription were fetched (or need not be).
+        self._known = None
+        self._requests = {}
+        self._next_id = 1
+        self._stop = threading.Event()
+        self.connects = 0
+        self.notified = 0
+        self.filled = 0
+        self.removed = 0
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.run, name="log-subscription", daemon=True)
+        self._thread.start()
+        return self
+
+    def _fetch(self, from_block, to_block, addresses=None):
+        """Logs of ``[from_block, to_block]``, of ``addresses`` or of every listened address."""
+        if addresses is None and self.get_logs is not None:
+            return self.get_logs(from_block, to_block)
+        addresses = sorted(addresses if addresses is not None else self._subscribed)
+        logs = []
+        for index in range(0, len(addresses), self.chunk_size):
+            log_filter = {"fromBlock": from_block, "toBlock": to_block,
+                          "address": addresses[index:index + self.chunk_size]}
+            if self.topics:
+                log_filter["topics"] = self.topics
+            logs.extend(self.web3.eth.get_logs(log_filter))
+        logs.sort(key=lambda log_entry: (log_entry["blockNumber"], log_entry["logIndex"]))
+        return logs
+
+    def _fill(self, from_block, to_block, addresses=None):
+        for first in range(from_block, to_block + 1, self.max_window):
+            for log_entry in self._fetch(first, min(to_block, first + self.max_window - 1), addresses):
+                self.filled += 1
+                self.on_log(log_entry)
+
+    def _send(self, socket, method, params, purpose):
+        request_id = self._next_id
+        self._next_id += 1
+        self._requests[request_id] = purpose
+        socket.send(json.dumps({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}))
+
+    def _subscribe_logs(self, socket, addresses):
+        log_filter = {"address": sorted(addresses)}
+        if self.topics:
+            log_filter["topics"] = self.topics
+        self._send(socket, "eth_subscribe", ["logs", log_filter], "logs")
+
+    def _add_new_addresses(self, socket):
+        new = {address for address in list(self.addresses) if address} - self._subscribed
+        if new:
+            self._subscribed |= new
+            self._subscribe_logs(socket, new)
+            logger.info("Log subscription: %d new addresses, %d in total", len(new), len(self._subscribed))
+        # What they emitted before the subscription took effect comes over HTTP; an address
+        # counts as known once that is done, so a fill cut short by a reconnection is redone.
+        unfilled = self._subscribed - self._known
+        if unfilled:
+            self._fill(max(0, self.synced_block - self.new_address_lookback), self.web3.eth.block_number, unfilled)
+            self._known |= unfilled
+
+    def _handle(self, message):
+        if "id" in message:
+            purpose = self._requests.pop(message["id"], None)
+            if message.get("error"):
+                raise RuntimeError(f"{purpose} subscription refused: {message['error']}")
+            return
+        params = message.get("params") or {}
+        result = params.get("result")
+        if not isinstance(result, dict):
+            return
+        if "logIndex" in result:
+            log_entry = format_log(result)
+            if log_entry.get("removed"):
+                self.removed += 1
+                if self.on_removed:
+                    self.on_removed(log_entry)
+                return
+            self.notified += 1
+            self.on_log(log_entry)
+        elif result.get("number"):
+            # Logs of the announced head may still be on their way; the block before it is taken as complete.
+            block = int(result["number"], 16) - 1
+            self.synced_block = block if self.synced_block is None else max(self.synced_block, block)
+
+    def _session(self):
+        with connect(self.ws_url, open_timeout=10) as socket:
+            self.connects += 1
+            self._requests = {}
+            self._subscribed = {address for address in list(self.addresses) if address}
+            if self._known is None:
+                # The first fill starts at from_block for every address listened to from the start.
+                self._known = set(self._subscribed)
+            self._subscribe_logs(socket, self._subscribed)
+            self._send(socket, "eth_subscribe", ["newHeads"], "newHeads")
+            head = self.web3.eth.block_number
+            if self.synced_block is not None and self.synced_block < head:
+                logger.info("Log subscription: filling blocks %d to %d over HTTP", self.synced_block + 1, head)
+                self._fill(self.synced_block + 1, head)
+            self.synced_block = head if self.synced_block is None else max(self.synced_block, head)
+            last_check = time.monotonic()
+            while not self._stop.is_set():
+                try:
+                    self._handle(json.loads(socket.recv(timeout=1)))
+                except TimeoutError:
+                    pass
+                if time.monotonic() - last_check >= 1:
+                    self._add_new_addresses(socket)
+                    last_check = time.monotonic()
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                self._session()
+            except Exception as exc:
+                if self._stop.is_set():
+                    break
+                logger.warning("Log subscription to %s lost (%s); reconnecting in %.0fs",
+                               self.ws_url, exc, self.reconnect_delay)
+                self._stop.wait(self.reconnect_delay)
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def stats(self):
+        return {
+            "addresses": len(self._subscribed),
+            "synced_block": self.synced_block,
+            "connects": self.connects,
+            "notified": self.notified,
+            "filled": self.filled,
+            "removed": self.removed,
+        }
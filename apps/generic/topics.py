@@ -0,0 +1,36 @@
+"""Helpers for matching log topics against the monitored event signatures."""
+
+from web3 import Web3
+
+
+def normalize_topic(topic):
+    """Return ``topic`` as a lowercase ``0x``-prefixed hex string.
+
+    ``HexBytes.hex()`` dropped the ``0x`` prefix in hexbytes 1.0, so keys
+    built with it and keys written out by hand do not compare equal unless
+    both go through here.
+    """
+    if isinstance(topic, str):
+        topic = topic.lower()
+        return topic if topic.startswith("0x") else "0x" + topic
+    return Web3.to_hex(topic).lower()
+
+
+def normalize_signatures(event_signatures):
+    return {normalize_topic(topic): name for topic, name in event_signatures.items()}
+
+
+def topic0_filter(event_signatures):
+    """``topics`` value for ``eth_getLogs`` matching any of the monitored events.
+
+    A list in the first position is an OR over topic0, so the node drops
+    ``Transfer``/``Approval`` and other unmonitored logs before sending them.
+    """
+    return [sorted(normalize_topic(topic) for topic in event_signatures)]
+
+
+def event_name_for(log_entry, event_signatures):
+    """Name of the monitored event ``log_entry`` carries, or ``None``."""
+    if not log_entry["topics"]:
+        return None
+    return event_signatures.get(normalize_topic(log_entry["topics"][0]))
@@ -0,0 +1,518 @@
+"""Write-behind buffer for the Firestore writes made by ``Paper`` handlers.
+
+Handlers used to commit every ``set``/``update``/batch as it happened. Wrapped
+in a ``BufferedClient``, the same calls are queued per document path instead
+and merged with what is already pending for that path: a ``set`` or
+``delete`` replaces earlier writes, an ``update`` is folded into a pending
+``set`` or ``update`` (``ArrayUnion``/``ArrayRemove`` values are combined,
+``Increment``s are summed). Pending writes go out in batches of at most 500
+operations when ``max_pending`` is reached, every ``flush_interval``
+seconds, on ``flush()`` and on ``close()``.
+
+Reads see buffered writes: ``get()`` on a document commits that document's
+pending writes first, and collection queries flush everything. A batch the
+handler commits is no longer atomic with respect to other documents; it is
+queued like individual writes. Write errors surface when the batch holding
+them is committed. A batch refused for a permanent reason (``NotFound``,
+``FailedPrecondition``: an update of a missing document) is retried one
+write at a time and the writes refused again are logged and dropped, as
+they would have failed unbuffered. Writes that fail for any other reason
+(``Unavailable``, ``DeadlineExceeded``) stay pending, ahead of any written
+since, and ``flush()`` raises ``WriteBufferError``: a caller about to save
+a cursor must not, and the next flush tries them again.
+"""
+
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from google.api_core.exceptions import AlreadyExists, FailedPrecondition, InvalidArgument, NotFound
+from google.cloud.firestore_v1.transforms import DELETE_FIELD, ArrayRemove, ArrayUnion, Increment
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCH_OPS = 500
+
+# Errors a write fails with whenever it is retried; anything else may be transient.
+PERMANENT_ERRORS = (NotFound, FailedPrecondition, InvalidArgument, AlreadyExists, ValueError, TypeError)
+
+
+class WriteBufferError(Exception):
+    """Some writes could not be committed; they are still pending."""
+
+_CONFLICT = object()
+_MISSING = object()
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _merge_value(old, new):
+    """The value of a field written ``old`` then ``new``, or ``_CONFLICT`` if one write cannot express it."""
+    if isinstance(new, ArrayUnion):
+        if old is _MISSING:
+            old = []
+        if isinstance(old, list):
+            return old + [value for value in new.values if value not in old]
+        if isinstance(old, ArrayUnion):
+            return ArrayUnion(old.values + [value for value in new.values if value not in old.values])
+        return _CONFLICT
+    if isinstance(new, ArrayRemove):
+        if old is _MISSING:
+            old = []
+        if isinstance(old, list):
+            return [value for value in old if value not in new.values]
+        if isinstance(old, ArrayRemove):
+            return ArrayRemove(old.values + [value for value in new.values if value not in old.values])
+        return _CONFLICT
+    if isinstance(new, Increment):
+        if old is _MISSING:
+            return new.value
+        if _is_number(old):
+            return old + new.value
+        if isinstance(old, Increment):
+            return Increment(old.value + new.value)
+        return _CONFLICT
+    return new
+
+
+def _apply_update(data, fields):
+    """Fold ``update(fields)`` into the document ``data`` of a pending ``set``; ``False`` if it cannot be."""
+    merged = copy.deepcopy(data)
+    for field_path, value in fields.items():
+        if "`" in field_path:
+            return False
+        parts = field_path.split(".")
+        node = merged
+        for part in parts[:-1]:
+            if not isinstance(node.get(part), dict):
+                node[part] = {}
+            node = node[part]
+        if value is DELETE_FIELD:
+            node.pop(parts[-1], None)
+            continue
+        value = _merge_value(node.get(parts[-1], _MISSING), value)
+        if value is _CONFLICT:
+            return False
+        node[parts[-1]] = value
+    data.clear()
+    data.update(merged)
+    return True
+
+
+def _resolve_set(data, payload):
+    """Write the ``set(payload, merge=True)`` fields into ``data``, resolving transforms against it."""
+    for key, value in payload.items():
+        if value is DELETE_FIELD:
+            data.pop(key, None)
+        elif isinstance(value, dict):
+            node = data.get(key)
+            if not isinstance(node, dict):
+                node = data[key] = {}
+            _resolve_set(node, value)
+        else:
+            value = _merge_value(data.get(key, _MISSING), value)
+            if value is _CONFLICT:
+                raise ValueError(f"cannot apply {value!r} to field {key}")
+            data[key] = value
+
+
+def apply_write(data, kind, payload=None, merge=False):
+    """The document ``data`` (``None``: missing) once ``kind`` (set/update/delete) of ``payload`` is applied.
+
+    Raises ``ValueError`` when the result cannot be told without Firestore
+    (a transform applied to a field of another type).
+    """
+    if kind == "delete":
+        return None
+    if kind == "update":
+        if data is None:
+            # Firestore refuses to update a missing document.
+            return None
+        data = copy.deepcopy(data)
+        if not _apply_update(data, payload):
+            raise ValueError(f"cannot apply update {payload!r}")
+        return data
+    data = copy.deepcopy(data) if merge and data is not None else {}
+    _resolve_set(data, payload)
+    return data
+
+
+def _merge_updates(old, new):
+    """Fold ``update(new)`` into a pending ``update(old)``; ``False`` if it cannot be."""
+    merged = dict(old)
+    for field_path, value in new.items():
+        if field_path in merged:
+            value = _merge_value(merged[field_path], value)
+            if value is _CONFLICT:
+                return False
+        elif any(other.startswith(field_path + ".") or field_path.startswith(other + ".") for other in merged):
+            return False
+        merged[field_path] = value
+    old.clear()
+    old.update(merged)
+    return True
+
+
+class _PendingDocument:
+    """The writes still to be made to one document, oldest first."""
+
+    def __init__(self, reference):
+        self.reference = reference
+        self.ops = []
+
+    def add(self, kind, payload, kwargs):
+        if kind == "delete" or (kind == "set" and not kwargs):
+            self.ops = [(kind, payload, kwargs)]
+            return
+        if kind == "update" and self.ops:
+            last_kind, last_payload, last_kwargs = self.ops[-1]
+            if last_kind == "set" and not last_kwargs and _apply_update(last_payload, payload):
+                return
+            if last_kind == "update" and _merge_updates(last_payload, payload):
+                return
+        self.ops.append((kind, payload, kwargs))
+
+
+class WriteBuffer:
+    """Coalesces document writes by path and commits them in batches.
+
+    ``flush_interval`` is the longest a write waits before being committed;
+    ``max_pending`` queued operations trigger a flush from the writing
+    thread.
+
+    ``commit_hook(references)``, if set, is called with the references of
+    the documents taken for a commit while ``sequence_lock`` is held, which
+    writers that keep their own record of the queued writes (the re-org
+    journal) hold as well; it may return a callable that is run before
+    anything is written. ``requeue_hook(items)``, if set, is called with
+    ``(reference, whole)`` for the documents whose writes went back to the
+    pending ones after a transient failure, ``whole`` being ``False`` if
+    some of them had been committed.
+    """
+
+    def __init__(self, db, flush_interval=1.0, max_pending=MAX_BATCH_OPS, batch_size=MAX_BATCH_OPS):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.batch_size = min(batch_size, MAX_BATCH_OPS)
+        self._pending = OrderedDict()
+        self._pending_ops = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.RLock()
+        self.sequence_lock = threading.RLock()
+        self.commit_hook = None
+        self.requeue_hook = None
+        self._stop = threading.Event()
+        self.mutations = 0
+        self.writes = 0
+        self.batches = 0
+        self.flushes = 0
+        self.failed_writes = 0
+        self.requeued_writes = 0
+        self.flush_seconds_total = 0.0
+        self.flush_seconds_max = 0.0
+        self.last_flush_seconds = 0.0
+        self._thread = None
+        if flush_interval and flush_interval > 0:
+            self._thread = threading.Thread(target=self._run, name="write-buffer", daemon=True)
+            self._thread.start()
+
+    def add(self, reference, kind, payload=None, **kwargs):
+        """Queue ``set``/``update``/``delete`` of ``reference`` (a plain ``DocumentReference``)."""
+        if payload is not None:
+            payload = copy.deepcopy(payload)
+        path = reference.path
+        with self._lock:
+            self.mutations += 1
+            document = self._pending.get(path)
+            if document is None:
+                document = self._pending[path] = _PendingDocument(reference)
+            before = len(document.ops)
+            document.add(kind, payload, kwargs)
+            self._pending_ops += len(document.ops) - before
+            full = self._pending_ops >= self.max_pending
+        if full:
+            try:
+                self.flush()
+            except WriteBufferError as e:
+                # The writes stay pending; the writer has nothing to undo.
+                logger.warning("%s", e)
+
+    def pending(self):
+        return self._pending_ops
+
+    def _take(self, path=None):
+        with self._lock:
+            if path is None:
+                documents = list(self._pending.values())
+                self._pending = OrderedDict()
+                self._pending_ops = 0
+            else:
+                document = self._pending.pop(path, None)
+                documents = [document] if document else []
+                self._pending_ops -= sum(len(document.ops) for document in documents)
+        return documents
+
+    def _batches(self, documents):
+        """Group ``(reference, ops)`` into batches of at most ``batch_size`` operations.
+
+        A document's writes stay in one batch unless there are more of them
+        than fit in a batch.
+        """
+        batch, size = [], 0
+        for document in documents:
+            for start in range(0, len(document.ops), self.batch_size):
+                ops = document.ops[start:start + self.batch_size]
+                if size + len(ops) > self.batch_size:
+                    yield batch
+                    batch, size = [], 0
+                batch.append((document.reference, ops))
+                size += len(ops)
+        if batch:
+            yield batch
+
+    def _write(self, groups):
+        batch = self.db.batch()
+        for reference, ops in groups:
+            for kind, payload, kwargs in ops:
+                if kind == "delete":
+                    batch.delete(reference)
+                else:
+                    getattr(batch, kind)(reference, payload, **kwargs)
+        batch.commit()
+        self.batches += 1
+
+    def _commit(self, groups, requeue):
+        """Commit one batch; writes to try again later go to ``requeue`` as ``(reference, ops, whole)``.
+
+        Raises the error of a batch that failed for a transient reason (and
+        wrote nothing).
+        """
+        operations = sum(len(ops) for _, ops in groups)
+        try:
+            self._write(groups)
+            self.writes += operations
+            return operations
+        except PERMANENT_ERRORS as e:
+            logger.warning("Batch of %d writes failed (%s); retrying them one by one", operations, e)
+        # A failed batch wrote nothing, so its writes can be retried on their
+        # own; only the ones refused again for good are dropped.
+        written = 0
+        for reference, ops in groups:
+            for index, op in enumerate(ops):
+                try:
+                    self._write([(reference, [op])])
+                    written += 1
+                except PERMANENT_ERRORS as e:
+                    self.failed_writes += 1
+                    logger.error("Dropping %s of %s: %s", op[0], reference.path, e)
+                except Exception as e:
+                    # The document's later writes must not overtake this one.
+                    logger.warning("Write to %s failed (%s); keeping it pending", reference.path, e)
+                    requeue.append((reference, ops[index:], index == 0))
+                    break
+        self.writes += written
+        return written
+
+    def _requeue(self, items):
+        """Put ``(reference, ops, whole)`` back ahead of the writes queued for the same documents since."""
+        with self._lock:
+            for reference, ops, _ in items:
+                document = _PendingDocument(reference)
+                queued = self._pending.pop(reference.path, None)
+                document.ops = list(ops) + (queued.ops if queued else [])
+                self._pending[reference.path] = document
+                self._pending_ops += len(ops)
+                self.requeued_writes += len(ops)
+        if self.requeue_hook is not None:
+            self.requeue_hook([(reference, whole) for reference, _, whole in items])
+
+    def flush(self, path=None):
+        """Commit pending writes (only those to ``path`` if given); return how many writes were made.
+
+        Raises ``WriteBufferError`` if writes failed for a transient reason;
+        they stay pending.
+        """
+        prepare = None
+        # sequence_lock is always taken before _flush_lock (a writer holding it may
+        # fill the buffer and flush), and released before the commit.
+        with self.sequence_lock:
+            self._flush_lock.acquire()
+            try:
+                documents = self._take(path)
+                if documents and self.commit_hook is not None:
+                    prepare = self.commit_hook([document.reference for document in documents])
+            except BaseException:
+                self._flush_lock.release()
+                raise
+        try:
+            if not documents:
+                return 0
+            started = time.perf_counter()
+            if prepare is not None:
+                prepare()
+            written = 0
+            requeue = []
+            error = None
+            for groups in self._batches(documents):
+                if error is not None:
+                    requeue.extend((reference, ops, True) for reference, ops in groups)
+                    continue
+                try:
+                    written += self._commit(groups, requeue)
+                except Exception as e:
+                    # Later batches wait too, or their writes could overtake this one's.
+                    error = e
+                    requeue.extend((reference, ops, True) for reference, ops in groups)
+            elapsed = time.perf_counter() - started
+            self.flushes += 1
+            self.last_flush_seconds = elapsed
+            self.flush_seconds_total += elapsed
+            self.flush_seconds_max = max(self.flush_seconds_max, elapsed)
+            if requeue:
+                self._requeue(requeue)
+                raise WriteBufferError(f"{sum(len(ops) for _, ops, _ in requeue)} writes to {len(requeue)} "
+                                       f"documents kept pending after a failed commit ({error or 'see above'})")
+            return written
+        finally:
+            self._flush_lock.release()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except WriteBufferError as e:
+                logger.warning("%s", e)
+            except Exception:
+                logger.exception("Write buffer flush failed")
+
+    def close(self, attempts=5):
+        """Stop the flush thread and commit everything still pending, trying ``attempts`` times."""
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        for attempt in range(1, attempts + 1):
+            try:
+                self.flush()
+                return
+            except WriteBufferError as e:
+                if attempt == attempts:
+                    raise
+                logger.warning("%s; retrying", e)
+                time.sleep(min(2 ** attempt, 30))
+
+    def coalescing_ratio(self):
+        """Writes requested per write committed (1.0 means nothing was merged)."""
+        return self.mutations / self.writes if self.writes else 1.0
+
+    def stats(self):
+        return {
+            "mutations": self.mutations,
+            "writes": self.writes,
+            "pending": self._pending_ops,
+            "batches": self.batches,
+            "flushes": self.flushes,
+            "failed_writes": self.failed_writes,
+            "requeued_writes": self.requeued_writes,
+            "coalescing_ratio": round(self.coalescing_ratio(), 2),
+            "flush_ms_avg": round(1000 * self.flush_seconds_total / self.flushes, 1) if self.flushes else 0.0,
+            "flush_ms_max": round(1000 * self.flush_seconds_max, 1),
+            "flush_ms_last": round(1000 * self.last_flush_seconds, 1),
+        }
+
+
+def _unwrap(reference):
+    return reference._ref if isinstance(reference, BufferedDocument) else reference
+
+
+class BufferedDocument:
+    """``DocumentReference`` proxy whose writes go through the buffer."""
+
+    def __init__(self, ref, buffer):
+        self._ref = ref
+        self._buffer = buffer
+
+    def __getattr__(self, name):
+        return getattr(self._ref, name)
+
+    def collection(self, name):
+        return BufferedCollection(self._ref.collection(name), self._buffer)
+
+    def get(self, *args, **kwargs):
+        self._buffer.flush(self._ref.path)
+        return self._ref.get(*args, **kwargs)
+
+    def set(self, document_data, merge=False):
+        if merge:
+            self._buffer.add(self._ref, "set", document_data, merge=merge)
+        else:
+            self._buffer.add(self._ref, "set", document_data)
+
+    def update(self, field_updates):
+        self._buffer.add(self._ref, "update", field_updates)
+
+    def delete(self):
+        self._buffer.add(self._ref, "delete")
+
+
+class BufferedCollection:
+    # Queries read whatever is committed, so pending writes are flushed first.
+    _READS = frozenset(("stream", "get", "where", "order_by", "limit", "limit_to_last",
+                        "start_at", "start_after", "end_at", "end_before", "list_documents", "count",
+                        "select"))
+
+    def __init__(self, collection, buffer):
+        self._collection = collection
+        self._buffer = buffer
+
+    def __getattr__(self, name):
+        if name in self._READS:
+            self._buffer.flush()
+        return getattr(self._collection, name)
+
+    def document(self, *args, **kwargs):
+        return BufferedDocument(self._collection.document(*args, **kwargs), self._buffer)
+
+
+class BufferedBatch:
+    """``WriteBatch`` stand-in; ``commit()`` hands its writes to the buffer in order."""
+
+    def __init__(self, buffer):
+        self._buffer = buffer
+        self._writes = []
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append((_unwrap(reference), "set", document_data, {"merge": merge} if merge else {}))
+
+    def update(self, reference, field_updates):
+        self._writes.append((_unwrap(reference), "update", field_updates, {}))
+
+    def delete(self, reference):
+        self._writes.append((_unwrap(reference), "delete", None, {}))
+
+    def commit(self):
+        writes, self._writes = self._writes, []
+        for reference, kind, payload, kwargs in writes:
+            self._buffer.add(reference, kind, payload, **kwargs)
+        return []
+
+
+class BufferedClient:
+    """Firestore client proxy handed to ``Paper`` so its writes are buffered."""
+
+    def __init__(self, db, buffer):
+        self._db = db
+        self.buffer = buffer
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    def collection(self, *args, **kwargs):
+        return BufferedCollection(self._db.collection(*args, **kwargs), self.buffer)
+
+    def batch(self):
+        return BufferedBatch(self.buffer)
@@ -0,0 +1,139 @@
+"""Lazily loaded, pre-parsed Homebase ABIs.
+
+``apps/homebase/abis.py`` keeps the ABIs as JSON inside Python string
+literals. The build step below parses every ABI in it once and writes a
+compact gzip'd JSON artifact next to it, together with the 4-byte selector of
+every function and the topic hash of every event::
+
+    python -m apps.homebase.abi_store
+
+At runtime nothing is loaded until the first ABI is asked for. The artifact
+records the SHA-256 of the ``abis.py`` it was built from; if the source has
+changed since (or the artifact is missing) the ABIs are parsed from
+``abis.py`` instead and a warning asks for a rebuild. Setting
+``HOMEBASE_ABI_SOURCE=1`` forces that path.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SOURCE_PATH = os.path.join(HERE, "abis.py")
+ARTIFACT_PATH = os.path.join(HERE, "abi_artifacts.json.gz")
+
+_artifact = None
+_lock = threading.Lock()
+
+
+def _source_digest():
+    with open(SOURCE_PATH, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _signature(entry):
+    def canonical(item):
+        if item["type"].startswith("tuple"):
+            inner = ",".join(canonical(component) for component in item["components"])
+            return f"({inner}){item['type'][len('tuple'):]}"
+        return item["type"]
+    return f"{entry['name']}({','.join(canonical(item) for item in entry.get('inputs', []))})"
+
+
+def _entries(abi):
+    return abi if isinstance(abi, list) else [abi]
+
+
+def build_artifact():
+    """Parse every ABI in ``abis.py`` into the artifact dictionary."""
+    from eth_utils import keccak
+
+    from apps.homebase import abis
+
+    parsed = {}
+    for name in dir(abis):
+        if name.startswith("_"):
+            continue
+        value = getattr(abis, name)
+        if isinstance(value, str):
+            parsed[name] = json.loads(value)
+        elif isinstance(value, (dict, list)):
+            parsed[name] = value
+
+    selectors, topics = {}, {}
+    for name, abi in parsed.items():
+        selectors[name] = {}
+        topics[name] = {}
+        for entry in _entries(abi):
+            if "name" not in entry or "inputs" not in entry:
+                continue
+            signature = _signature(entry)
+            if entry.get("type") == "event":
+                topics[name][signature] = "0x" + keccak(text=signature).hex()
+            elif entry.get("type", "function") == "function":
+                selectors[name][signature] = "0x" + keccak(text=signature)[:4].hex()
+
+    return {"source_sha256": _source_digest(), "abis": parsed, "selectors": selectors, "topics": topics}
+
+
+def write_artifact(path=ARTIFACT_PATH):
+    artifact = build_artifact()
+    payload = json.dumps(artifact, separators=(",", ":"), sort_keys=True).encode()
+    # mtime=0 keeps the artifact byte-identical across rebuilds of the same source.
+    with open(path, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=9, mtime=0) as f:
+        f.write(payload)
+    return artifact, len(payload)
+
+
+def _load():
+    if not os.environ.get("HOMEBASE_ABI_SOURCE"):
+        try:
+            with gzip.open(ARTIFACT_PATH, "rb") as f:
+                artifact = json.loads(f.read())
+            if artifact.get("source_sha256") == _source_digest():
+                return artifact
+            logger.warning("%s is stale; parsing abis.py. Rebuild with: python -m apps.homebase.abi_store",
+                           ARTIFACT_PATH)
+        except FileNotFoundError:
+            logger.warning("%s not found; parsing abis.py. Build with: python -m apps.homebase.abi_store",
+                           ARTIFACT_PATH)
+    return build_artifact()
+
+
+def artifact():
+    global _artifact
+    if _artifact is None:
+        with _lock:
+            if _artifact is None:
+                _artifact = _load()
+    return _artifact
+
+
+def abi(name):
+    """Parsed ABI ``name`` from ``abis.py`` (a list, or a dict for single-entry fragments)."""
+    return artifact()["abis"][name]
+
+
+def selectors(name):
+    """``{"fn(types)": "0x12345678"}`` for every function in ABI ``name``."""
+    return artifact()["selectors"][name]
+
+
+def event_topics(name):
+    """``{"Event(types)": "0x..."}`` for every event in ABI ``name``."""
+    return artifact()["topics"][name]
+
+
+def names():
+    return list(artifact()["abis"])
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    built, size = write_artifact()
+    print(f"Wrote {ARTIFACT_PATH}: {len(built['abis'])} ABIs, {size} bytes of JSON before compression.")
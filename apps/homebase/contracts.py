@@ -0,0 +1,102 @@
+"""Process-wide cache of parsed ABIs and web3 contract objects.
+
+Every ``Paper`` used to clean and parse its multi-thousand-line ABI string at
+construction, and ``get_specific_contract`` re-parsed one and built a fresh
+contract object for each ``decimals()``/``balanceOf()`` lookup. ABIs are now
+referred to by their name in ``abis.py`` and loaded pre-parsed from
+``abi_store``; contract objects are shared per ``(web3, address, abi)`` with
+LRU eviction.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+
+from web3 import Web3
+
+from apps.homebase import abi_store
+
+# ABI used by each Paper kind; anything else is a DAO governor.
+KIND_ABIS = {
+    "wrapper": "wrapperAbi",
+    "wrapper_w": "wrapper_w_abi",
+    "token": "tokenAbiGlobal",
+    "dao": "daoAbiGlobal",
+}
+
+_parsed = {}
+_parsed_lock = threading.Lock()
+
+
+def _is_abi_name(abi):
+    return isinstance(abi, str) and abi.lstrip()[:1] not in ("[", "{")
+
+
+def _abi_key(abi):
+    if _is_abi_name(abi):
+        return ("name", abi)
+    # Raw ABI JSON strings are module constants, so their identity is a stable
+    # key and avoids hashing hundreds of kilobytes; dict fragments are small.
+    if isinstance(abi, str):
+        return ("str", id(abi))
+    return ("json", json.dumps(abi, sort_keys=True))
+
+
+def parsed_abi(abi):
+    """Parsed ABI list for an ``abis.py`` name, an ABI JSON string, a single entry dict, or a list."""
+    key = _abi_key(abi)
+    cached = _parsed.get(key)
+    if cached is None:
+        if _is_abi_name(abi):
+            value = abi_store.abi(abi)
+            value = value if isinstance(value, list) else [value]
+        elif isinstance(abi, str):
+            value = json.loads(abi)
+        elif isinstance(abi, dict):
+            value = [abi]
+        else:
+            value = list(abi)
+        with _parsed_lock:
+            # The source is stored alongside so its id() cannot be reused.
+            cached = _parsed.setdefault(key, (abi, value))
+    return cached[1]
+
+
+def kind_abi(kind):
+    return KIND_ABIS.get(kind, "daoAbiGlobal")
+
+
+class ContractCache:
+    """LRU of web3 contract objects keyed by ``(web3, address, abi)``."""
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._contracts = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, web3, address, abi):
+        address = Web3.to_checksum_address(address)
+        # The instance itself, not its id(): an id can be reused once the instance is gone.
+        key = (web3, address, _abi_key(abi))
+        with self._lock:
+            contract = self._contracts.get(key)
+            if contract is not None:
+                self._contracts.move_to_end(key)
+                self.hits += 1
+                return contract
+        contract = web3.eth.contract(address=address, abi=parsed_abi(abi))
+        with self._lock:
+            self.misses += 1
+            self._contracts[key] = contract
+            self._contracts.move_to_end(key)
+            while len(self._contracts) > self.maxsize:
+                self._contracts.popitem(last=False)
+        return contract
+
+    def __len__(self):
+        return len(self._contracts)
+
+
+contract_cache = ContractCache()
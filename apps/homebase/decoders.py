@@ -0,0 +1,175 @@
+"""Shared topic0 -> event decoder table for the Homebase contracts.
+
+``contract.events.X().process_log(log)`` rebuilds the event object and walks
+the ABI on every call. The decoders here are compiled once from the event
+entries of the wrapper, DAO and token ABIs, using the topic hashes that
+``abi_store`` precomputed: each one holds the eth_abi tuple decoder for the
+log data, a decoder per indexed topic and the output normalizers, so decoding
+a log is a dict lookup plus the ABI decode itself.
+"""
+
+import threading
+from functools import lru_cache
+
+from eth_abi.decoding import ContextFramesBytesIO
+from eth_abi.registry import registry as abi_registry
+from eth_utils import keccak
+
+from apps.homebase import abi_store
+
+
+def _is_dynamic(abi_type):
+    return abi_type in ("string", "bytes") or abi_type.endswith("]") or abi_type.startswith("(")
+
+
+@lru_cache(maxsize=65536)
+def checksum_address(address):
+    """EIP-55 checksum of a ``0x`` hex address; cached since voters and delegates repeat."""
+    lower = address[2:].lower()
+    digest = keccak(text=lower).hex()
+    return "0x" + "".join(char.upper() if int(digest[index], 16) >= 8 else char
+                          for index, char in enumerate(lower))
+
+
+def _normalizer(abi_type):
+    """Match web3's output: checksummed addresses and arrays as lists."""
+    if abi_type == "address":
+        return checksum_address
+    if abi_type.startswith("address["):
+        return lambda values: [checksum_address(value) for value in values]
+    if abi_type.endswith("]"):
+        return list
+    return None
+
+
+def _topic_decoder(abi_type):
+    """Decoder for one indexed topic; ``None`` for hashed (dynamic) values."""
+    if _is_dynamic(abi_type):
+        return None
+    if abi_type == "address":
+        return lambda topic: checksum_address("0x" + topic[12:].hex())
+    if abi_type.startswith("uint"):
+        return lambda topic: int.from_bytes(topic, "big")
+    decoder = abi_registry.get_tuple_decoder(abi_type, strict=False)
+    return lambda topic: decoder(ContextFramesBytesIO(topic))[0]
+
+
+def _canonical_type(item):
+    if item["type"].startswith("tuple"):
+        inner = ",".join(_canonical_type(component) for component in item["components"])
+        return f"({inner}){item['type'][len('tuple'):]}"
+    return item["type"]
+
+
+def _as_bytes(value):
+    if isinstance(value, str):
+        return bytes.fromhex(value[2:] if value.startswith("0x") else value)
+    return bytes(value)
+
+
+class EventDecoder:
+    """Precompiled decoder for one event ABI entry."""
+
+    def __init__(self, event_abi, topics=None):
+        self.name = event_abi["name"]
+        types = [_canonical_type(item) for item in event_abi["inputs"]]
+        self.signature = f"{self.name}({','.join(types)})"
+        if topics and self.signature in topics:
+            self.topic0 = _as_bytes(topics[self.signature])
+        else:
+            self.topic0 = keccak(text=self.signature)
+
+        self.indexed = []
+        data_names, data_types = [], []
+        for item, abi_type in zip(event_abi["inputs"], types):
+            if item.get("indexed"):
+                # Indexed dynamic values are only present as their keccak hash.
+                self.indexed.append((item["name"], _topic_decoder(abi_type)))
+            else:
+                data_names.append(item["name"])
+                data_types.append(abi_type)
+        self.topic_count = len(self.indexed) + 1
+        self.data_names = data_names
+        self.data_normalizers = [_normalizer(abi_type) for abi_type in data_types]
+        self.data_decoder = abi_registry.get_tuple_decoder(*data_types, strict=False)
+
+    def decode(self, log):
+        """Decode ``log`` into the shape ``process_log`` returns (``args``, ``event`` and log fields)."""
+        args = {}
+        for (name, decoder), topic in zip(self.indexed, log["topics"][1:]):
+            topic = _as_bytes(topic)
+            args[name] = decoder(topic) if decoder else topic
+
+        values = self.data_decoder(ContextFramesBytesIO(_as_bytes(log["data"])))
+        for name, normalize, value in zip(self.data_names, self.data_normalizers, values):
+            args[name] = normalize(value) if normalize else value
+
+        return {
+            "args": args,
+            "event": self.name,
+            "address": log["address"],
+            "blockHash": log.get("blockHash"),
+            "blockNumber": log.get("blockNumber"),
+            "logIndex": log.get("logIndex"),
+            "transactionHash": log.get("transactionHash"),
+            "transactionIndex": log.get("transactionIndex"),
+        }
+
+
+class DecoderRegistry:
+    """Maps ``(topic0, topic count)`` to an ``EventDecoder``.
+
+    The topic count is part of the key because the same signature can be
+    indexed differently across contracts (e.g. ERC20 vs ERC721 ``Transfer``).
+    """
+
+    def __init__(self):
+        self._decoders = {}
+
+    def add_abi(self, abi, topics=None):
+        """Add every event of ``abi``; ``topics`` maps signatures to precomputed topic hashes."""
+        for entry in abi:
+            if entry.get("type") != "event" or entry.get("anonymous"):
+                continue
+            decoder = EventDecoder(entry, topics)
+            self._decoders.setdefault((decoder.topic0, decoder.topic_count), decoder)
+        return self
+
+    def get(self, log):
+        topics = log["topics"]
+        if not topics:
+            return None
+        return self._decoders.get((_as_bytes(topics[0]), len(topics)))
+
+    def decode(self, log, expected=None):
+        """Decode ``log``; raise ``ValueError`` if it is unknown or not the ``expected`` event."""
+        decoder = self.get(log)
+        if decoder is None:
+            raise ValueError(f"No decoder for log topics {log['topics'][:1]}")
+        if expected and decoder.name != expected:
+            raise ValueError(f"Log is a {decoder.name} event, expected {expected}")
+        return decoder.decode(log)
+
+    def __len__(self):
+        return len(self._decoders)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_registry():
+    """The process-wide registry built from the Homebase ABIs, compiled on first use."""
+    global _shared
+    if _shared is None:
+        with _shared_lock:
+            if _shared is None:
+                registry = DecoderRegistry()
+                for name in ("wrapperAbi", "wrapper_w_abi", "daoAbiGlobal", "tokenAbiGlobal"):
+                    registry.add_abi(abi_store.abi(name), abi_store.event_topics(name))
+                _shared = registry
+    return _shared
+
+
+def decode_log(log, expected=None):
+    return shared_registry().decode(log, expected)
@@ -174,6 +174,8 @@ class Proposal:
         self.against: str = "0"
         self.votesFor: int = 0
         self.votesAgainst: int = 0
+        self.abstain: str = "0"
+        self.votesAbstain: int = 0
         self.externalResource: Optional[str] = "(no link provided)"
         self.transactions: List[Txaction] = []
         self.votes: List['Vote'] = []
@@ -187,6 +189,10 @@ class Proposal:
             'author': self.author,
             'calldata': self.callData,
             'createdAt': self.createdAt,
+            'votingStarts': self.votingStarts,
+            'votingEnds': self.votingEnds,
+            'votingStartsBlock': self.votingStartsBlock,
+            'votingEndsBlock': self.votingEndsBlock,
             'callDatas': self.callDatas,
             'targets': self.targets,
             'totalSupply': self.totalSupply,
@@ -199,6 +205,8 @@ class Proposal:
             'votesFor': self.votesFor,
             'latestStage': self.latestStage,
             'votesAgainst': self.votesAgainst,
+            'abstain': self.abstain,
+            'votesAbstain': self.votesAbstain,
             'externalResource': self.externalResource,
             'transactions': [tx.toJson() for tx in self.transactions],
         }
@@ -243,6 +251,8 @@ class Proposal:
         self.against = firestore_data.get('against', "0")
         self.votesFor = firestore_data.get('votesFor', 0)
         self.votesAgainst = firestore_data.get('votesAgainst', 0)
+        self.abstain = firestore_data.get('abstain', "0")
+        self.votesAbstain = firestore_data.get('votesAbstain', 0)
         self.externalResource = firestore_data.get(
             'externalResource', "(no link provided)")
 
@@ -0,0 +1,321 @@
+"""Proposal stages that follow from the chain's progress rather than from an event.
+
+Only ``ProposalQueued`` and ``ProposalExecuted`` used to move a proposal's
+``latestStage``; nothing made it active once voting opened, told passed from
+rejected or short of quorum once voting closed, or marked a queued proposal
+executable once its timelock ETA came. ``LifecycleScheduler`` keeps every
+open proposal's next deadline in one of two heaps, by block (voting start
+and end) and by chain time (the ETA, then the end of the execution window),
+so that ``advance(block, timestamp)`` only touches the proposals that are
+due, however many are open:
+
+* ``pending`` -> ``active`` once ``votingStartsBlock`` is past;
+* ``active`` -> ``noQuorum``, ``rejected`` or ``passed`` once
+  ``votingEndsBlock`` is past, from the vote tally: For and Abstain count
+  towards the quorum, ``quorum`` percent of the proposal's ``totalSupply``
+  snapshot, and For must outweigh Against;
+* ``passed`` has no deadline (it waits for ``ProposalQueued``, which may
+  never come), so the proposal is no longer followed; ``queued`` follows it
+  again;
+* ``queued`` (set by the handler) -> ``executable`` at the ETA;
+* ``executable`` -> ``expired`` if not executed within the execution window,
+  the DAO's ``executionDelay`` seconds after the ETA.
+
+Once a vote has closed, the proposal's tally is retired; ``advance`` evicts
+it when the close is ``reorg_depth`` blocks behind. Changes are merged per
+proposal and written by ``flush(db)`` in write batches. Deadlines are superseded rather than removed: an entry carries a
+generation number and heap items of an older generation are skipped.
+"""
+
+import heapq
+import itertools
+import logging
+import threading
+from datetime import datetime, timezone
+
+from apps.generic.block_times import block_clock
+from apps.homebase.entities import ProposalStatus
+from apps.homebase.tally import vote_tally
+
+logger = logging.getLogger(__name__)
+
+# Firestore accepts at most 500 writes per batch.
+MAX_BATCH_WRITES = 500
+
+# Stages with a deadline; stage names are the lowercase ProposalStatus values the handlers write too.
+OPEN_STAGES = frozenset((ProposalStatus.pending.value, ProposalStatus.active.value, ProposalStatus.queued.value,
+                         ProposalStatus.executable.value))
+
+
+class ScheduledProposal:
+    """What the scheduler knows of one open proposal."""
+
+    def __init__(self, reference, dao, stage, vote_start, vote_end, total_supply, quorum, execution_delay, eta=None):
+        self.reference = reference
+        self.dao = dao
+        self.stage = stage
+        self.vote_start = vote_start
+        self.vote_end = vote_end
+        self.total_supply = total_supply
+        self.quorum = quorum
+        self.execution_delay = execution_delay
+        self.eta = eta
+        self.generation = 0
+
+    def quorum_votes(self):
+        return self.total_supply * self.quorum // 100
+
+    def outcome(self, totals):
+        """Stage a closed vote ends in, from the ``ProposalTally.fields()`` of the proposal."""
+        in_favor = int(totals.get("inFavor") or 0) if totals else 0
+        against = int(totals.get("against") or 0) if totals else 0
+        abstain = int(totals.get("abstain") or 0) if totals else 0
+        if in_favor + abstain < self.quorum_votes():
+            return ProposalStatus.noQuorum.value
+        if in_favor <= against:
+            return ProposalStatus.rejected.value
+        return ProposalStatus.passed.value
+
+
+def _as_int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _as_datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc)
+
+
+class LifecycleScheduler:
+    def __init__(self, tally=vote_tally, clock=block_clock, reorg_depth=64):
+        self.tally = tally
+        self.clock = clock
+        self.reorg_depth = reorg_depth
+        self._entries = {}
+        self._by_block = []  # (block, sequence, path, generation)
+        self._by_time = []  # (timestamp, sequence, path, generation)
+        self._sequence = itertools.count()
+        self._settings = {}
+        self._updates = {}
+        self._lock = threading.Lock()
+        self.block = None
+        self.transitions = 0
+        self.written = 0
+        self.unscheduled = 0
+
+    def dao_settings(self, daos_collection, dao):
+        """``(quorum, executionDelay)`` of ``dao``, read from its document once."""
+        key = (daos_collection.id, dao)
+        settings = self._settings.get(key)
+        if settings is None:
+            data = daos_collection.document(dao).get().to_dict() or {}
+            settings = self._settings[key] = (_as_int(data.get("quorum")), _as_int(data.get("executionDelay")))
+        return settings
+
+    def settings_changed(self, daos_collection, dao):
+        """Forget the cached settings of ``dao`` (an executed proposal changed them)."""
+        self._settings.pop((daos_collection.id, dao), None)
+
+    def _schedule(self, entry):
+        """Push the deadline of ``entry``'s current stage; older deadlines become stale."""
+        entry.generation += 1
+        path = entry.reference.path
+        if entry.stage == ProposalStatus.pending.value:
+            heapq.heappush(self._by_block, (entry.vote_start + 1, next(self._sequence), path, entry.generation))
+        elif entry.stage == ProposalStatus.active.value:
+            heapq.heappush(self._by_block, (entry.vote_end + 1, next(self._sequence), path, entry.generation))
+        elif entry.stage == ProposalStatus.queued.value and entry.eta is not None:
+            heapq.heappush(self._by_time, (entry.eta, next(self._sequence), path, entry.generation))
+        elif entry.stage == ProposalStatus.executable.value and entry.eta is not None:
+            heapq.heappush(self._by_time, (entry.eta + entry.execution_delay, next(self._sequence), path,
+                                           entry.generation))
+
+    def track(self, reference, dao, vote_start, vote_end, total_supply, quorum, execution_delay,
+              stage=ProposalStatus.pending.value, eta=None):
+        """Follow the proposal document ``reference`` from ``stage`` on."""
+        entry = ScheduledProposal(reference, dao, stage, int(vote_start), int(vote_end), _as_int(total_supply),
+                                  _as_int(quorum), _as_int(execution_delay), eta)
+        with self._lock:
+            self._entries[reference.path] = entry
+            self._schedule(entry)
+        return entry
+
+    def _handled(self, entry):
+        """The handler has just set the proposal's ``latestStage``; a pending change must not overwrite it."""
+        pending = self._updates.get(entry.reference.path)
+        if pending is not None:
+            pending[1].pop("latestStage", None)
+        if entry.stage in (ProposalStatus.pending.value, ProposalStatus.active.value):
+            # Queued or executed in the window whose end has not been advanced to yet: the vote passed.
+            self._update(entry, {f"statusHistory.{ProposalStatus.passed.value}":
+                                 self._block_time(entry.vote_end + 1)})
+            self.tally.retire(entry.reference, entry.vote_end)
+
+    def queued(self, reference, eta, daos_collection=None, dao=None):
+        """The proposal was queued in the timelock; it becomes executable at the Unix time ``eta``.
+
+        A proposal no longer followed (it had passed) is followed again if
+        its DAO is given, for the execution window it takes from it.
+        """
+        if reference.path not in self._entries and daos_collection is not None and dao is not None:
+            quorum, execution_delay = self.dao_settings(daos_collection, dao)
+            self.track(reference, dao, 0, 0, 0, quorum, execution_delay, stage=ProposalStatus.passed.value)
+        with self._lock:
+            entry = self._entries.get(reference.path)
+            if entry is None:
+                return False
+            self._handled(entry)
+            entry.stage = ProposalStatus.queued.value
+            entry.eta = int(eta)
+            self._schedule(entry)
+            self._update(entry, {"executionEnds": _as_datetime(entry.eta + entry.execution_delay)})
+        return True
+
+    def executed(self, reference):
+        """The proposal was executed: it has no further deadline."""
+        with self._lock:
+            entry = self._entries.pop(reference.path, None)
+            if entry is not None:
+                self._handled(entry)
+                entry.generation += 1
+
+    def _update(self, entry, fields):
+        path = entry.reference.path
+        pending = self._updates.get(path)
+        if pending is None:
+            self._updates[path] = (entry.reference, dict(fields))
+        else:
+            pending[1].update(fields)
+
+    def _move(self, entry, stage, at):
+        entry.stage = stage
+        self.transitions += 1
+        self._update(entry, {"latestStage": stage, f"statusHistory.{stage}": at})
+        if stage in OPEN_STAGES:
+            self._schedule(entry)
+        else:
+            del self._entries[entry.reference.path]
+
+    def _pop_due(self, heap, now):
+        due = []
+        while heap and heap[0][0] <= now:
+            deadline, _, path, generation = heapq.heappop(heap)
+            entry = self._entries.get(path)
+            if entry is not None and entry.generation == generation:
+                due.append((deadline, entry))
+        return due
+
+    def _block_time(self, block):
+        return self.clock.estimated_datetime(block) or datetime.now(tz=timezone.utc)
+
+    def advance(self, block, timestamp):
+        """Apply every transition due once ``block``, of Unix time ``timestamp``, is handled.
+
+        Time deadlines wait while ``timestamp`` is ``None``. Returns the
+        number of transitions; their writes wait for ``flush``.
+        """
+        moved = self.transitions
+        self.block = block
+        while True:
+            with self._lock:
+                due = self._pop_due(self._by_block, block)
+            if not due:
+                break
+            for deadline, entry in due:
+                with self._lock:
+                    if entry.stage == ProposalStatus.pending.value:
+                        self._move(entry, ProposalStatus.active.value, self._block_time(deadline))
+                        continue
+                # Read outside the lock: the first look at a tally may load its votes.
+                totals = self.tally.current(entry.reference)
+                with self._lock:
+                    if self._entries.get(entry.reference.path) is entry and entry.stage == ProposalStatus.active.value:
+                        self._move(entry, entry.outcome(totals), self._block_time(deadline))
+                        self.tally.retire(entry.reference, entry.vote_end)
+        with self._lock:
+            while timestamp is not None:
+                due = self._pop_due(self._by_time, timestamp)
+                if not due:
+                    break
+                for deadline, entry in due:
+                    stage = (ProposalStatus.executable.value if entry.stage == ProposalStatus.queued.value
+                             else ProposalStatus.expired.value)
+                    self._move(entry, stage, _as_datetime(deadline))
+        self.tally.evict(block - self.reorg_depth)
+        return self.transitions - moved
+
+    def flush(self, db):
+        """Write the pending changes, ``MAX_BATCH_WRITES`` per batch; return how many documents were written."""
+        with self._lock:
+            updates, self._updates = self._updates, {}
+        items = list(updates.items())
+        written = 0
+        for index in range(0, len(items), MAX_BATCH_WRITES):
+            chunk = items[index:index + MAX_BATCH_WRITES]
+            batch = db.batch()
+            for path, (reference, fields) in chunk:
+                batch.update(reference, fields)
+            try:
+                batch.commit()
+                written += len(chunk)
+            except Exception as e:
+                logger.error("Could not write %d proposal stage changes: %s", len(chunk), e)
+                with self._lock:
+                    for path, (reference, fields) in chunk:
+                        # Newer changes of the same proposal win.
+                        newer = self._updates.get(path)
+                        self._updates[path] = (reference, dict(fields, **newer[1]) if newer else fields)
+        self.written += written
+        return written
+
+    def load(self, daos_collection, dao):
+        """Schedule the open proposals stored for ``dao``; return how many were scheduled."""
+        quorum, execution_delay = self.dao_settings(daos_collection, dao)
+        scheduled = 0
+        for snapshot in daos_collection.document(dao).collection("proposals").stream():
+            data = snapshot.to_dict() or {}
+            stage = str(data.get("latestStage") or ProposalStatus.pending.value).lower()
+            if stage not in OPEN_STAGES:
+                continue
+            vote_start = _as_int(data.get("votingStartsBlock"), None)
+            vote_end = _as_int(data.get("votingEndsBlock"), None)
+            if vote_start is None or vote_end is None:
+                # Written before the blocks were stored; nothing to schedule on.
+                self.unscheduled += 1
+                continue
+            execution_starts = data.get("executionStarts")
+            eta = int(execution_starts.timestamp()) if isinstance(execution_starts, datetime) else None
+            self.track(snapshot.reference, dao, vote_start, vote_end, data.get("totalSupply"), quorum,
+                       execution_delay, stage=stage, eta=eta)
+            scheduled += 1
+        return scheduled
+
+    def load_all(self, daos_collection, daos):
+        """Forget every entry and schedule the open proposals of ``daos`` (at start, or after a re-org)."""
+        with self._lock:
+            self._entries = {}
+            self._by_block = []
+            self._by_time = []
+            self._updates = {}
+        self._settings = {}
+        scheduled = 0
+        for dao in daos:
+            try:
+                scheduled += self.load(daos_collection, dao)
+            except Exception as e:
+                logger.warning("Could not load the proposals of %s: %s", dao, e)
+        return scheduled
+
+    def stats(self):
+        with self._lock:
+            stages = {}
+            for entry in self._entries.values():
+                stages[entry.stage] = stages.get(entry.stage, 0) + 1
+            return {"open": len(self._entries), "stages": stages, "block": self.block,
+                    "transitions": self.transitions, "written": self.written, "pending": len(self._updates),
+                    "unscheduled": self.unscheduled}
+
+
+proposal_lifecycle = LifecycleScheduler()
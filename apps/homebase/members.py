@@ -0,0 +1,111 @@
+"""Which member documents exist, per DAO, without reading them.
+
+The handlers decide between ``set`` (new member) and ``update`` by checking
+whether ``members/<address>`` exists, which used to be a Firestore read per
+event. ``MemberIndex`` loads the member ids of each DAO once (in bulk at
+hydration, or on first use) and the handlers record the members they create,
+so the check is a set lookup. A DAO whose members do not fit in
+``capacity`` keeps the most recently used ones; only for such a DAO does a
+miss fall back to reading the document.
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class DaoMembers:
+    """Member addresses of one DAO; ``complete`` means absence is authoritative."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.addresses = OrderedDict()
+        self.loaded = False
+        self.complete = False
+
+    def add(self, address):
+        self.addresses[address] = True
+        self.addresses.move_to_end(address)
+        if len(self.addresses) > self.capacity:
+            self.addresses.popitem(last=False)
+            self.complete = False
+
+
+class MemberIndex:
+    def __init__(self, capacity=50000):
+        self.capacity = capacity
+        self._daos = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reads = 0
+
+    def _dao(self, daos_collection, dao):
+        key = (daos_collection.id, dao)
+        with self._lock:
+            members = self._daos.get(key)
+            if members is None:
+                members = self._daos[key] = DaoMembers(self.capacity)
+            return members
+
+    def load(self, daos_collection, dao):
+        """Read the ids of every member document of ``dao``; return how many were loaded."""
+        snapshots = daos_collection.document(dao).collection("members").select([]).stream()
+        addresses = [snapshot.id for snapshot in snapshots]
+        members = self._dao(daos_collection, dao)
+        with self._lock:
+            # Evicting any address while loading clears ``complete`` again.
+            members.complete = True
+            for address in addresses:
+                members.add(address)
+            members.loaded = True
+        return len(addresses)
+
+    def load_all(self, daos_collection, daos, max_workers=8):
+        """Load several DAOs concurrently (at hydration); return the number of members loaded."""
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return sum(pool.map(lambda dao: self.load(daos_collection, dao), daos))
+
+    def add(self, daos_collection, dao, address):
+        """Record that ``members/<address>`` now exists (the handler just wrote it)."""
+        members = self._dao(daos_collection, dao)
+        with self._lock:
+            members.add(address)
+
+    def exists(self, daos_collection, dao, address):
+        """Whether ``members/<address>`` exists in ``dao``; reads Firestore only when the index cannot tell."""
+        members = self._dao(daos_collection, dao)
+        if not members.loaded:
+            try:
+                self.load(daos_collection, dao)
+            except Exception as e:
+                logger.warning("Could not load the members of %s: %s", dao, e)
+        with self._lock:
+            if address in members.addresses:
+                members.addresses.move_to_end(address)
+                self.hits += 1
+                return True
+            if members.loaded and members.complete:
+                self.hits += 1
+                return False
+            self.misses += 1
+        self.reads += 1
+        exists = daos_collection.document(dao).collection("members").document(address).get().exists
+        if exists:
+            self.add(daos_collection, dao, address)
+        return exists
+
+    def invalidate(self):
+        """Forget everything, e.g. after a re-org rollback deleted members; DAOs reload on next use."""
+        with self._lock:
+            self._daos = {}
+
+    def stats(self):
+        return {"daos": len(self._daos), "members": sum(len(m.addresses) for m in self._daos.values()),
+                "hits": self.hits, "misses": self.misses, "reads": self.reads}
+
+
+member_index = MemberIndex()
@@ -1,11 +1,16 @@
-from apps.homebase.abis import wrapperAbi, daoAbiGlobal, tokenAbiGlobal, wrapper_token_abi,  timelock_min_delay_abi# Add wrapper_w_abi if different
 from datetime import datetime, timezone, timedelta # timedelta might be useful
 from apps.homebase.entities import ProposalStatus, Proposal, StateInContract, Txaction, Token, Member, Org, Vote
-import re
 from web3 import Web3
-from google.cloud import firestore
+from apps.generic import storage
+from apps.generic.block_times import block_clock
 import codecs # Not used in current snippet, can remove if not needed elsewhere
 from apps.generic.converting import decode_function_parameters # Ensure this path is correct
+from apps.generic.multicall import BatchCalls
+from apps.homebase.contracts import contract_cache, kind_abi, parsed_abi
+from apps.homebase.decoders import decode_log
+from apps.homebase.lifecycle import proposal_lifecycle
+from apps.homebase.members import member_index
+from apps.homebase.tally import vote_tally
 from apps.homebase.eventSignatures import quorum_function_abi, voting_period_function_abi,proposal_threshold_function_abi, voting_delay_function_abi
 
 
@@ -20,69 +25,43 @@ class Paper:
         self.web3: Web3 = web3
         self.daos_collection = daos_collection
         self.db = db
-        self.abi_string = None # To store the raw ABI string
-
-        # You might need different ABIs for WrapperContract and WrapperContract_W
-        # For now, assuming wrapperAbi can decode events from both if they share names,
-        # but specific contract interaction might need specific ABIs.
-        if kind == "wrapper": # Original Wrapper
-            self.abi_string = wrapperAbi
-        elif kind == "wrapper_w": # New Wrapper for Wrapped Tokens
-            # If WrapperContract_W has a different ABI for its functions (not events), load it here
-            # For event decoding, the event signature in app.py is key.
-            # For now, assume its event can be decoded by a generic approach or by having its ABI.
-            # Let's assume you have a wrapper_w_abi defined similarly to wrapperAbi
-            # from apps.homebase.abis import wrapper_w_abi # You would need to define this
-            # self.abi_string = wrapper_w_abi 
-            # For simplicity, if only used for event decoding via process_log, might not need full ABI here
-            # if the event name is unique and handled in handle_event.
-            # The get_contract().events.YourEventName().process_log(log) needs the contract's ABI.
-            # For now, we'll assume WrapperContract_W ABI is needed for its specific event.
-            # Placeholder: use wrapperAbi if wrapper_w_abi is not defined yet,
-            # but ideally, it should have its own.
-            try:
-                from apps.homebase.abis import wrapper_w_abi
-                self.abi_string = wrapper_w_abi
-            except ImportError:
-                print(f"Warning: wrapper_w_abi not found for Paper kind {kind}. Falling back to generic event processing or ensure event name is unique.")
-                self.abi_string = wrapperAbi # Fallback, might not be ideal
-        elif kind == "token":
-            self.abi_string = tokenAbiGlobal
-        else: # dao
-            self.abi_string = daoAbiGlobal
-        
-        if self.abi_string:
-            self.abi = re.sub(r'\n+', ' ', self.abi_string).strip()
-        else:
-            self.abi = None
+        # ABIs are parsed once per process and contract objects are shared
+        # through contract_cache, so a Paper only keeps references.
+        self.abi_string = kind_abi(kind)
+        self.abi = parsed_abi(self.abi_string)
 
 
     def get_contract(self):
         if self.contract is None and self.address and self.abi:
             try:
-                self.contract = self.web3.eth.contract(
-                    address=Web3.to_checksum_address(self.address), abi=self.abi)
+                self.contract = contract_cache.get(self.web3, self.address, self.abi_string)
             except Exception as e:
                 print(f"Error creating contract object for {self.address} with kind {self.kind}: {e}")
                 return None
         return self.contract
 
+    def chain_time(self, log):
+        """Time of the block ``log`` is from, from block_clock; the current time if it cannot be told."""
+        return block_clock.datetime(self.web3, log["blockNumber"]) or datetime.now(tz=timezone.utc)
+
+    def member_exists(self, address):
+        # Answered from member_index; reads Firestore only for DAOs too large to index fully.
+        return member_index.exists(self.daos_collection, self.dao, address)
+
+    def member_created(self, address):
+        member_index.add(self.daos_collection, self.dao, address)
+
     def get_specific_contract(self, address, abi_str):
-        """Helper to get a contract instance with a specific address and ABI string."""
+        """Helper to get a contract instance with a specific address and ABI (JSON string or entry dict)."""
         try:
-            clean_abi = re.sub(r'\n+', ' ', abi_str).strip()
-            return self.web3.eth.contract(address=Web3.to_checksum_address(address), abi=clean_abi)
+            return contract_cache.get(self.web3, address, abi_str)
         except Exception as e:
             print(f"Error creating specific contract {address}: {e}")
             return None
 
     def add_dao(self, log): # Handles NewDaoCreated from original WrapperContract
-        contract_instance = self.get_contract()
-        if not contract_instance:
-            print(f"Could not get contract instance for {self.address} in add_dao")
-            return None
         try:
-            decoded_event = contract_instance.events.NewDaoCreated().process_log(log)
+            decoded_event = decode_log(log, "NewDaoCreated")
         except Exception as e:
             print(f"Error processing NewDaoCreated log with ABI for {self.address}: {e}")
             # Potentially try a more generic decoding if ABI is mismatched, or re-throw
@@ -93,7 +72,7 @@ class Paper:
         print(f"New DAO (original wrapper): {name} from event")
         
         org = Org(name=name)
-        org.creationDate = datetime.now(timezone.utc) # Use timezone.utc
+        org.creationDate = self.chain_time(log)
         org.govTokenAddress = args['token']
         org.address = args['dao']
         org.symbol = args['symbol']
@@ -103,10 +82,10 @@ class Paper:
         amounts = args['initialAmounts'] # This is the combined array
         org.holders = len(members) if members else 0
 
-        token_contract = self.get_specific_contract(org.govTokenAddress, tokenAbiGlobal)
+        token_contract = self.get_specific_contract(org.govTokenAddress, "tokenAbiGlobal")
         if token_contract:
             try:
-                org.decimals = token_contract.functions.decimals().call()
+                org.decimals = BatchCalls(self.web3).read(token_contract.functions.decimals())
             except Exception as e:
                 print(f"Error fetching decimals for token {org.govTokenAddress}: {e}")
                 org.decimals = 18 # Default or handle error
@@ -153,6 +132,8 @@ class Paper:
         self.daos_collection.document(org.address).set(org.toJson())
         try:
             batch.commit()
+            for i in range(len(members)):
+                member_index.add(self.daos_collection, org.address, Web3.to_checksum_address(members[i]))
             print(f"Successfully added DAO {org.name} / {org.address} to Firestore.")
         except Exception as e:
             print(f"Error committing batch for DAO {org.name}: {e}")
@@ -160,42 +141,19 @@ class Paper:
         return [org.address, org.govTokenAddress]
 
     def add_dao_wrapped(self, log): # Handles DaoWrappedDeploymentInfo from WrapperContract_W
-        # Since the event is specific, we might need a way to get the correct ABI for WrapperContract_W
-        # or ensure the event name + topics are enough if not using contract.events.EventName()
-        # For now, assuming the event_name in app.py correctly routes here.
-        # We'll decode generically or assume self.get_contract() has Wrapper_W ABI if kind='wrapper_w'
-        
-        contract_instance = self.get_contract() # This should be WrapperContract_W instance
-        if not contract_instance:
-            print(f"Could not get contract instance for {self.address} in add_dao_wrapped")
-            return None
+        # The shared decoder table is compiled from the WrapperContract_W ABI as well,
+        # so the event decodes even though this Paper's own contract object is not needed.
         try:
-            # IMPORTANT: The event name here MUST match what's in your WrapperContract_W ABI
-            # and what you mapped in app.py's event_signatures
-            decoded_event = contract_instance.events.DaoWrappedDeploymentInfo().process_log(log)
+            decoded_event = decode_log(log, "DaoWrappedDeploymentInfo")
         except Exception as e:
             print(f"Error processing DaoWrappedDeploymentInfo log with ABI for {self.address}: {e}")
-            # Fallback: try to decode with known types if process_log fails due to ABI mismatch
-            # This is more complex and error-prone. Best to have correct ABI for WrapperContract_W.
-            # For now, we'll assume ABI is correct or process_log works.
-            # If it fails consistently, we need to ensure Wrapper_W's ABI is loaded for kind "wrapper_w".
-            # from eth_abi import decode
-            # event_abi_entry = next((item for item in self.abi if item.get("type") == "event" and item.get("name") == "DaoWrappedDeploymentInfo"), None)
-            # if event_abi_entry:
-            #     types = [inp['type'] for inp in event_abi_entry['inputs'] if not inp['indexed']]
-            #     # topics = [log['topics'][i+1] for i in range(len(event_abi_entry['inputs'])) if event_abi_entry['inputs'][i]['indexed']]
-            #     # decoded_unindexed = decode(types, log['data'])
-            #     # This is a simplified example, proper decoding is more involved.
-            # else:
-            #     print("DaoWrappedDeploymentInfo ABI entry not found for manual decoding.")
-            # return None
             return None
 
         args = decoded_event['args']
         dao_name = args['daoName'] # This is also the wrapped token name
         print(f"New DAO (wrapped wrapper): {dao_name} from event")
         org = Org(name=dao_name)
-        org.creationDate = datetime.now(timezone.utc)
+        org.creationDate = self.chain_time(log)
         org.govTokenAddress = args['wrappedTokenAddress'] # This is the HBEVM_Wrapped_Token
         org.address = args['daoAddress']
         org.symbol = args['wrappedTokenSymbol']
@@ -205,13 +163,31 @@ class Paper:
         
         # For wrapped tokens, initialMembers and initialAmounts are not applicable from event
         org.holders = 0 
-        wrapped_token_contract = self.get_specific_contract(org.govTokenAddress, tokenAbiGlobal) # Assuming wrapped token has ERC20 interface
+        wrapped_token_contract = self.get_specific_contract(org.govTokenAddress, "wrapper_token_abi") # ERC20Wrapper: ERC20 interface plus underlying()
+        dao_contract = self.get_specific_contract(org.address, "daoAbiGlobal")
+
+        # All token and DAO getters go out together; getMinDelay needs the
+        # timelock address, so it is a second wave.
+        reads = BatchCalls(self.web3)
+        if wrapped_token_contract:
+            decimals = reads.add(wrapped_token_contract.functions.decimals())
+            # Total supply of wrapped token starts at 0, users need to wrap
+            total_supply = reads.add(wrapped_token_contract.functions.totalSupply())
+            underlying = reads.add(wrapped_token_contract.functions.underlying())
+        if dao_contract:
+            # votingDelay and votingPeriod from the Governor are in blocks;
+            # proposalThreshold is often a large number, stored as string.
+            threshold = reads.add(dao_contract.functions.proposalThreshold())
+            voting_delay = reads.add(dao_contract.functions.votingDelay())
+            voting_period = reads.add(dao_contract.functions.votingPeriod())
+            timelock = reads.add(dao_contract.functions.timelock())
+        reads.execute()
+
         if wrapped_token_contract:
             try:
-                org.decimals = wrapped_token_contract.functions.decimals().call()
-                # Total supply of wrapped token starts at 0, users need to wrap
-                org.totalSupply = str(wrapped_token_contract.functions.totalSupply().call())
-                org.underlyingToken = str(wrapped_token_contract.functions.underlying().call()) 
+                org.decimals = decimals.result()
+                org.totalSupply = str(total_supply.result())
+                org.underlyingToken = str(underlying.result()) 
             except Exception as e:
                 print(f"Error fetching info for wrapped token {org.govTokenAddress}: {e}")
                 org.decimals = 18 # Default
@@ -221,27 +197,16 @@ class Paper:
             org.decimals = 18 # Default
             org.totalSupply = "0"
 
-        # Fetch other DAO settings and timelock delay by calling the contracts
-        dao_contract = self.get_specific_contract(org.address, daoAbiGlobal)
         if dao_contract:
             try:
-                # Fetch proposalThreshold (ensure ABI for this is in daoAbiGlobal)
-                # It's often a large number, store as string
-                from apps.homebase.abis import governor_proposal_threshold_abi, governor_voting_delay_abi, governor_voting_period_abi, governor_timelock_abi
-                
-                raw_threshold = dao_contract.functions.proposalThreshold().call()
-                org.proposalThreshold = str(raw_threshold)
-                
-                # votingDelay from Governor is in blocks, convert if necessary, or store as blocks
-                # Your original code converted minutes to blocks or vice-versa.
-                # Here, we're fetching what the contract returns.
-                org.votingDelay = dao_contract.functions.votingDelay().call() # in blocks
-                org.votingDuration = dao_contract.functions.votingPeriod().call() # in blocks
-
-                timelock_address = dao_contract.functions.timelock().call()
-                timelock_contract = self.get_specific_contract(timelock_address, timelock_min_delay_abi) # Need Timelock ABI
+                org.proposalThreshold = str(threshold.result())
+                org.votingDelay = voting_delay.result() # in blocks
+                org.votingDuration = voting_period.result() # in blocks
+
+                timelock_contract = self.get_specific_contract(timelock.result(), "timelock_min_delay_abi") # Need Timelock ABI
                 if timelock_contract:
-                    org.executionDelay = timelock_contract.functions.getMinDelay().call() # in seconds
+                    # Second wave: getMinDelay needs the timelock address read above.
+                    org.executionDelay = BatchCalls(self.web3).read(timelock_contract.functions.getMinDelay()) # in seconds
                 else:
                     org.executionDelay = 0 # Default
             except Exception as e:
@@ -274,10 +239,8 @@ class Paper:
             print(f"DAO address not set for token {self.address}, cannot process delegate event.")
             return None
             
-        contract_instance = self.get_contract()
-        if not contract_instance: return None
         try:
-            data = contract_instance.events.DelegateChanged().process_log(log)
+            data = decode_log(log, "DelegateChanged")
         except Exception as e:
             print(f"Error processing DelegateChanged for {self.address} in DAO {self.dao}: {e}")
             return None
@@ -291,8 +254,8 @@ class Paper:
         delegator_member_ref = self.daos_collection.document(self.dao).collection('members').document(delegator)
         
         # Ensure delegator exists as a member, create if not (e.g., if they wrapped tokens but weren't an initial member)
-        delegator_doc = delegator_member_ref.get()
-        if not delegator_doc.exists:
+        created = []
+        if not self.member_exists(delegator):
             print(f"Delegator {delegator} not found as member in DAO {self.dao}. Creating.")
             # Attempt to get their balance from the token contract (self.address is the token)
             try:
@@ -307,6 +270,7 @@ class Paper:
                 # Fallback: create with 0 balance if token interaction fails
                 new_member = Member(address=delegator, personalBalance="0", delegate=to_delegate, votingWeight="0")
                 batch.set(delegator_member_ref, new_member.toJson())
+            created.append(delegator)
 
         else: # Delegator exists, update their delegate
             batch.update(delegator_member_ref, {"delegate": to_delegate})
@@ -315,8 +279,7 @@ class Paper:
         if to_delegate != self.ZERO_ADDRESS and to_delegate != delegator:
             to_delegate_member_ref = self.daos_collection.document(self.dao).collection('members').document(to_delegate)
             # Ensure to_delegate exists as a member, create if not
-            to_delegate_doc = to_delegate_member_ref.get()
-            if not to_delegate_doc.exists:
+            if not self.member_exists(to_delegate):
                 print(f"Delegatee {to_delegate} not found as member in DAO {self.dao}. Creating.")
                 try:
                     token_contract_instance = self.get_contract()
@@ -327,21 +290,24 @@ class Paper:
                     print(f"Error creating new delegatee member {to_delegate}: {e}")
                     new_delegatee_member = Member(address=to_delegate, personalBalance="0", delegate="", votingWeight="0")
                     batch.set(to_delegate_member_ref, new_delegatee_member.toJson())
+                created.append(to_delegate)
 
             # Add delegator to to_delegate's constituents list
             batch.update(to_delegate_member_ref, {
-                "constituents": firestore.ArrayUnion([delegator])
+                "constituents": storage.ArrayUnion([delegator])
             })
 
         if from_delegate != self.ZERO_ADDRESS and from_delegate != delegator and from_delegate != to_delegate:
             from_delegate_member_ref = self.daos_collection.document(self.dao).collection('members').document(from_delegate)
             # Remove delegator from from_delegate's constituents list
             batch.update(from_delegate_member_ref, {
-                "constituents": firestore.ArrayRemove([delegator])
+                "constituents": storage.ArrayRemove([delegator])
             })
         
         try:
             batch.commit()
+            for address in created:
+                self.member_created(address)
         except Exception as e:
             print(f"Error committing batch for delegation in DAO {self.dao}: {e}")
         return None
@@ -351,11 +317,8 @@ class Paper:
             print(f"DAO address not set for contract {self.address}, cannot process propose event.")
             return None
 
-        contract_instance = self.get_contract()
-        if not contract_instance:
-            return None
         try:
-            event = contract_instance.events.ProposalCreated().process_log(log)
+            event = decode_log(log, "ProposalCreated")
         except Exception as e:
             print(f"Error processing ProposalCreated for {self.address} in DAO {self.dao}: {e}")
             return None
@@ -400,22 +363,34 @@ class Paper:
         p.values = values
         p.description = desc
         p.callDatas = calldatas
-        p.createdAt = datetime.now(tz=timezone.utc)
+        p.createdAt = self.chain_time(log)
+        p.statusHistory = {"pending": p.createdAt}
         p.votingStartsBlock = str(vote_start_block)
         p.votingEndsBlock = str(vote_end_block)
+        # Usually blocks not produced yet: estimated from the observed block time.
+        p.votingStarts = block_clock.estimated_datetime(vote_start_block)
+        p.votingEnds = block_clock.estimated_datetime(vote_end_block)
         p.externalResource = link
         
-        # Gracefully fetch the historic total supply for the proposal snapshot
+        # Gracefully fetch the historic total supply for the proposal snapshot.
+        # The fallback totalSupply and the proposer's balance (needed if they
+        # are not a member yet) ride along in the same batch.
         p.totalSupply = "0"  # Default value
+        proposer_balance = None
         if self.token_paper and self.token_paper.address:
-            token_contract_for_dao = self.get_specific_contract(self.token_paper.address, tokenAbiGlobal)
+            token_contract_for_dao = self.get_specific_contract(self.token_paper.address, "tokenAbiGlobal")
             if token_contract_for_dao:
+                reads = BatchCalls(self.web3)
+                past_supply = reads.add(token_contract_for_dao.functions.getPastTotalSupply(vote_start_block))
+                current_supply = reads.add(token_contract_for_dao.functions.totalSupply())
+                proposer_balance = reads.add(token_contract_for_dao.functions.balanceOf(proposer))
+                reads.execute()
                 try:
-                    p.totalSupply = str(token_contract_for_dao.functions.getPastTotalSupply(vote_start_block).call())
+                    p.totalSupply = str(past_supply.result())
                 except Exception as e:
                     print(f"Warning: Could not fetch past total supply for proposal {proposal_id} from token {self.token_paper.address} at block {vote_start_block}. Error: {e}. Attempting to use current total supply.")
                     try:
-                        p.totalSupply = str(token_contract_for_dao.functions.totalSupply().call())
+                        p.totalSupply = str(current_supply.result())
                     except Exception as e2:
                         print(f"Error fetching current total supply for proposal {proposal_id}. Error: {e2}. Defaulting to '0'.")
         else:
@@ -424,23 +399,26 @@ class Paper:
         proposal_doc_ref = self.daos_collection.document(self.dao).collection('proposals').document(proposal_id)
         try:
             proposal_doc_ref.set(p.toJson())
+            # Voting start and end, and what follows, are applied by the lifecycle scheduler.
+            quorum, execution_delay = proposal_lifecycle.dao_settings(self.daos_collection, self.dao)
+            proposal_lifecycle.track(proposal_doc_ref, self.dao, vote_start_block, vote_end_block,
+                                     p.totalSupply, quorum, execution_delay)
 
             member_doc_ref = self.daos_collection.document(self.dao).collection('members').document(proposer)
-            if member_doc_ref.get().exists:
-                 member_doc_ref.update({"proposalsCreated": firestore.ArrayUnion([proposal_id])})
+            if self.member_exists(proposer):
+                 member_doc_ref.update({"proposalsCreated": storage.ArrayUnion([proposal_id])})
             else:
                 print(f"Proposer {proposer} not found. Creating member entry.")
                 balance = "0"
-                if self.token_paper and self.token_paper.address:
-                    token_contract_for_dao = self.get_specific_contract(self.token_paper.address, tokenAbiGlobal)
-                    if token_contract_for_dao:
-                        try:
-                            balance = str(token_contract_for_dao.functions.balanceOf(proposer).call())
-                        except:
-                            pass  # Ignore if balance fetch fails
+                if proposer_balance is not None:
+                    try:
+                        balance = str(proposer_balance.result())
+                    except:
+                        pass  # Ignore if balance fetch fails
                 new_member = Member(address=proposer, personalBalance=balance, delegate="", votingWeight="0")
                 new_member.proposalsCreated = [proposal_id]
                 member_doc_ref.set(new_member.toJson())
+                self.member_created(proposer)
             
             print(f"Successfully saved proposal {proposal_id} to DAO {self.dao}")
 
@@ -453,10 +431,8 @@ class Paper:
         if not self.dao:
             print(f"DAO address not set for contract {self.address}, cannot process vote event.")
             return None
-        contract_instance = self.get_contract()
-        if not contract_instance: return None
         try:
-            event = contract_instance.events.VoteCast().process_log(log)
+            event = decode_log(log, "VoteCast")
         except Exception as e:
             print(f"Error processing VoteCast for {self.address} in DAO {self.dao}: {e}")
             return None
@@ -472,7 +448,8 @@ class Paper:
         weight = event["args"]["weight"]
         reason = event["args"]["reason"]
         
-        vote_obj = Vote(proposalID=proposal_id, votingPower=str(weight), option=support, voter=voter)
+        vote_obj = Vote(proposalID=proposal_id, votingPower=str(weight), option=support, voter=voter,
+                        castAt=self.chain_time(log))
         vote_obj.reason = reason
         vote_obj.hash = tx_hash_hex # Store tx hash
         
@@ -485,13 +462,14 @@ class Paper:
 
         member_doc_ref = self.daos_collection.document(self.dao).collection('members').document(voter)
         # Ensure member exists
-        if member_doc_ref.get().exists:
-            batch.update(member_doc_ref, {"proposalsVoted": firestore.ArrayUnion([proposal_id])})
+        voter_created = not self.member_exists(voter)
+        if not voter_created:
+            batch.update(member_doc_ref, {"proposalsVoted": storage.ArrayUnion([proposal_id])})
         else:
             print(f"Voter {voter} not found. Creating member entry for vote.")
             balance = "0"
             if self.token_paper and self.token_paper.address: # Check if token_paper is set for the DAO
-                token_contract_for_dao = self.get_specific_contract(self.token_paper.address, tokenAbiGlobal)
+                token_contract_for_dao = self.get_specific_contract(self.token_paper.address, "tokenAbiGlobal")
                 if token_contract_for_dao:
                     try:
                         balance = str(token_contract_for_dao.functions.balanceOf(voter).call())
@@ -501,43 +479,14 @@ class Paper:
             batch.set(member_doc_ref, new_member.toJson())
             
         proposal_doc_ref = self.daos_collection.document(self.dao).collection('proposals').document(proposal_id)
-        
-        # Transactional update for proposal vote counts
-        @firestore.transactional
-        def update_proposal_votes(transaction, proposal_ref, weight_val, support_val):
-            proposal_snapshot = proposal_ref.get(transaction=transaction)
-            if not proposal_snapshot.exists:
-                print(f"Proposal {proposal_id} not found during vote update transaction.")
-                return
-
-            prop_data = proposal_snapshot.to_dict()
-            
-            current_in_favor = int(prop_data.get('inFavor', "0"))
-            current_against = int(prop_data.get('against', "0"))
-            # Abstain not explicitly handled by current_in_favor/against in OZ Governor unless extended for it
-            
-            current_votes_for = prop_data.get('votesFor', 0)
-            current_votes_against = prop_data.get('votesAgainst', 0)
-
-            if support_val == 1: # For
-                new_in_favor = current_in_favor + weight_val
-                transaction.update(proposal_ref, {
-                    'inFavor': str(new_in_favor),
-                    'votesFor': current_votes_for + 1
-                })
-            elif support_val == 0: # Against
-                new_against = current_against + weight_val
-                transaction.update(proposal_ref, {
-                    'against': str(new_against),
-                    'votesAgainst': current_votes_against + 1
-                })
-            # Add logic for abstain (support == 2) if your governor supports it and you track it
 
         try:
-            transaction = self.db.transaction()
-            update_proposal_votes(transaction, proposal_doc_ref, int(weight), support)
-            transaction.commit()
+            # Counted in memory (For, Against and Abstain); vote_tally writes the
+            # totals to the proposal document periodically.
+            vote_tally.record(proposal_doc_ref, voter, support, int(weight))
             batch.commit() # Commit the member update and vote document
+            if voter_created:
+                self.member_created(voter)
             print(f"Vote by {voter} on proposal {proposal_id} processed.")
         except Exception as e:
             print(f"Error during vote processing for proposal {proposal_id} by {voter}: {e}")
@@ -548,10 +497,8 @@ class Paper:
         if not self.dao:
             print(f"DAO address not set for contract {self.address}, cannot process queue event.")
             return None
-        contract_instance = self.get_contract()
-        if not contract_instance: return None
         try:
-            event = contract_instance.events.ProposalQueued().process_log(log)
+            event = decode_log(log, "ProposalQueued")
         except Exception as e:
             print(f"Error processing ProposalQueued for {self.address} in DAO {self.dao}: {e}")
             return None
@@ -560,15 +507,17 @@ class Paper:
         
         proposal_doc_ref = self.daos_collection.document(self.dao).collection('proposals').document(proposal_id)
         
-        # Convert ETA (timestamp) to datetime object
-        
-        
+        # The ETA is a timestamp: when the timelock lets the proposal be executed.
+        execution_datetime = datetime.fromtimestamp(event['args']['etaSeconds'], tz=timezone.utc)
+
         try:
             proposal_doc_ref.update({
-                "statusHistory.queued": datetime.now(tz=timezone.utc), # Time of queuing
-                "latestStage": "Queued", # Assuming ProposalStatus enum has Queued
-                
+                "statusHistory.queued": self.chain_time(log), # Time of queuing
+                "latestStage": ProposalStatus.queued.value,
+                "executionStarts": execution_datetime,
             })
+            proposal_lifecycle.queued(proposal_doc_ref, event['args']['etaSeconds'],
+                                      daos_collection=self.daos_collection, dao=self.dao)
             print(f"Proposal {proposal_id} queued in DAO {self.dao}, ETA: {execution_datetime}.")
         except Exception as e:
             print(f"Error updating proposal {proposal_id} on queue event in DAO {self.dao}: {e}")
@@ -636,10 +585,8 @@ class Paper:
         if not self.dao:
             print(f"DAO address not set for contract {self.address}, cannot process execute event.")
             return None
-        contract_instance = self.get_contract()
-        if not contract_instance: return None
         try:
-            event = contract_instance.events.ProposalExecuted().process_log(log)
+            event = decode_log(log, "ProposalExecuted")
         except Exception as e:
             print(f"Error processing ProposalExecuted for {self.address} in DAO {self.dao}: {e}")
             return None
@@ -662,8 +609,8 @@ class Paper:
         # For now, directly updating fields for simplicity:
         
         updates_for_proposal = {
-            "statusHistory.executed": datetime.now(tz=timezone.utc),
-            "latestStage": "Executed", # Assuming ProposalStatus enum has Executed
+            "statusHistory.executed": self.chain_time(log),
+            "latestStage": ProposalStatus.executed.value,
             "executionHash": event['transactionHash'].hex()
         }
 
@@ -746,7 +693,7 @@ class Paper:
             if "mint" in proposal_type.lower() or "burn" in proposal_type.lower() and proposal_calldatas and proposal_targets_db:
                 print(f"Processing mint/burn for proposal {proposal_id} in DAO {self.dao}")
                 token_address_target = Web3.to_checksum_address(proposal_targets_db[0])
-                target_token_contract = self.get_specific_contract(token_address_target, tokenAbiGlobal)
+                target_token_contract = self.get_specific_contract(token_address_target, "tokenAbiGlobal")
 
                 if target_token_contract:
                     # Determine if mint or burn from function selector or a more reliable field in prop_data_from_db
@@ -761,12 +708,13 @@ class Paper:
                             # Update member balance
                             new_balance = target_token_contract.functions.balanceOf(member_address_affected).call()
                             member_doc_ref = self.daos_collection.document(self.dao).collection('members').document(member_address_affected)
-                            if member_doc_ref.get().exists:
+                            if self.member_exists(member_address_affected):
                                 member_doc_ref.update({"personalBalance": str(new_balance)})
                             else: # Create member if they received tokens but weren't listed
                                 print(f"Member {member_address_affected} not found for mint/burn. Creating.")
                                 new_member = Member(address=member_address_affected, personalBalance=str(new_balance), delegate="", votingWeight="0")
                                 member_doc_ref.set(new_member.toJson())
+                                self.member_created(member_address_affected)
                             print(f"Member {member_address_affected} balance updated to {new_balance} after mint/burn.")
 
                             # Update DAO total supply
@@ -781,7 +729,9 @@ class Paper:
             # Commit updates
             if dao_updates:
                 dao_doc_ref.update(dao_updates)
+                proposal_lifecycle.settings_changed(self.daos_collection, self.dao)
             proposal_doc_ref.update(updates_for_proposal)
+            proposal_lifecycle.executed(proposal_doc_ref)
             print(f"Proposal {proposal_id} execution processed for DAO {self.dao}.")
 
         except Exception as e:
@@ -0,0 +1,262 @@
+"""In-process vote tallies, published to the proposal documents.
+
+``Paper.vote`` used to run a Firestore transaction per ``VoteCast`` to
+read-modify-write the proposal's counters, which serialized (and retried)
+every vote on a busy proposal. Votes are now added to an in-memory
+``ProposalTally`` and the totals are written as absolute values by
+``publish()``, so publishing twice is harmless and a single update carries
+any number of votes.
+
+A tally is seeded the first time a proposal is voted on in this process from
+its ``votes`` sub-collection, the same documents the handler writes, so the
+counts are exact after a restart. Each voter is counted once per proposal,
+as the Governor only accepts one vote per account; a ``VoteCast`` replayed
+after a restart or a re-org is therefore not counted twice.
+
+Tallies are dropped once voting has closed (``retire``) and the close is
+below the re-org window (``evict``); a vote that still arrives for the
+proposal, e.g. replayed by a deeper re-org, seeds it again.
+"""
+
+import heapq
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+FOR, AGAINST, ABSTAIN = 1, 0, 2
+
+
+class ProposalTally:
+    """Exact vote totals of one proposal; weights are Python ints."""
+
+    def __init__(self, reference):
+        self.reference = reference
+        self.voters = {}
+        self.in_favor = 0
+        self.against = 0
+        self.abstain = 0
+        self.votes_for = 0
+        self.votes_against = 0
+        self.votes_abstain = 0
+        self.exists = True
+        self.seeded = False
+        self.evicted = False
+        self.lock = threading.Lock()
+
+    def add(self, voter, support, weight):
+        """Count one vote; return ``False`` if ``voter`` was already counted."""
+        if voter in self.voters:
+            return False
+        self.voters[voter] = (support, weight)
+        if support == FOR:
+            self.in_favor += weight
+            self.votes_for += 1
+        elif support == AGAINST:
+            self.against += weight
+            self.votes_against += 1
+        elif support == ABSTAIN:
+            self.abstain += weight
+            self.votes_abstain += 1
+        return True
+
+    def seed(self):
+        """Load the proposal's existing votes; the proposal document must exist to be tallied."""
+        self.voters = {}
+        self.in_favor = self.against = self.abstain = 0
+        self.votes_for = self.votes_against = self.votes_abstain = 0
+        self.exists = self.reference.get().exists
+        if self.exists:
+            for snapshot in self.reference.collection("votes").stream():
+                vote = snapshot.to_dict() or {}
+                self.add(vote.get("voter") or snapshot.id, vote.get("option"), int(vote.get("weight") or 0))
+        self.seeded = True
+
+    def fields(self):
+        return {
+            "inFavor": str(self.in_favor),
+            "against": str(self.against),
+            "abstain": str(self.abstain),
+            "votesFor": self.votes_for,
+            "votesAgainst": self.votes_against,
+            "votesAbstain": self.votes_abstain,
+        }
+
+
+class TallyEngine:
+    """Vote tallies keyed by proposal document path.
+
+    ``publish_interval`` seconds after the first vote a background thread
+    starts publishing changed tallies; ``publish()`` can also be called
+    directly, e.g. before a checkpoint.
+    """
+
+    def __init__(self, publish_interval=1.0):
+        self.publish_interval = publish_interval
+        self._tallies = {}
+        self._dirty = set()
+        # Proposals whose voting closed, by the last block of their voting period, and
+        # the same as a heap of (block, path) to evict from.
+        self._retired = {}
+        self._retired_heap = []
+        self._lock = threading.Lock()
+        # Publishes write absolute values, so they must not interleave.
+        self._publish_lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.votes = 0
+        self.duplicates = 0
+        self.publishes = 0
+        self.evictions = 0
+
+    def _tally(self, reference):
+        path = reference.path
+        with self._lock:
+            tally = self._tallies.get(path)
+            if tally is None:
+                tally = self._tallies[path] = ProposalTally(reference)
+            if self._thread is None and self.publish_interval and self.publish_interval > 0:
+                self._thread = threading.Thread(target=self._run, name="vote-tally", daemon=True)
+                self._thread.start()
+        return tally
+
+    def _locked_tally(self, reference):
+        """The live tally of ``reference`` with its lock held; an evicted one is replaced by a new one."""
+        while True:
+            tally = self._tally(reference)
+            tally.lock.acquire()
+            if not tally.evicted:
+                return tally
+            tally.lock.release()
+
+    def record(self, reference, voter, support, weight):
+        """Count a vote on the proposal document ``reference``; return ``False`` if it was not counted."""
+        tally = self._locked_tally(reference)
+        try:
+            seeded = not tally.seeded
+            if seeded:
+                tally.seed()
+            if not tally.exists:
+                logger.warning("Proposal %s not found; vote by %s is not tallied.", reference.path, voter)
+                return False
+            counted = tally.add(voter, support, weight)
+        finally:
+            tally.lock.release()
+        with self._lock:
+            if counted:
+                self.votes += 1
+            else:
+                self.duplicates += 1
+            # A fresh seed may differ from the counters stored on the document.
+            if counted or seeded:
+                self._dirty.add(reference.path)
+        return counted
+
+    def totals(self, reference):
+        tally = self._tallies.get(reference.path)
+        return tally.fields() if tally else None
+
+    def current(self, reference):
+        """Totals of the proposal ``reference``, seeded from its votes if none was recorded in this process."""
+        tally = self._locked_tally(reference)
+        try:
+            if not tally.seeded:
+                tally.seed()
+            return tally.fields() if tally.exists else None
+        finally:
+            tally.lock.release()
+
+    def retire(self, reference, block):
+        """Voting on ``reference`` closed with ``block``; its tally can go once that block is final."""
+        with self._lock:
+            if reference.path in self._tallies and self._retired.get(reference.path) != block:
+                self._retired[reference.path] = block
+                heapq.heappush(self._retired_heap, (block, reference.path))
+
+    def evict(self, final_block):
+        """Drop the retired tallies whose voting closed at or below ``final_block``; return how many."""
+        evicted = 0
+        kept = []
+        with self._lock:
+            while self._retired_heap and self._retired_heap[0][0] <= final_block:
+                block, path = heapq.heappop(self._retired_heap)
+                if self._retired.get(path) != block:
+                    continue  # retired again since, at another block
+                tally = self._tallies.get(path)
+                if tally is None:
+                    del self._retired[path]
+                    continue
+                if path in self._dirty:
+                    continue  # publish() puts it back once written
+                if not tally.lock.acquire(blocking=False):
+                    kept.append((block, path))  # busy: tried again on the next call
+                    continue
+                tally.evicted = True
+                del self._tallies[path]
+                del self._retired[path]
+                tally.lock.release()
+                evicted += 1
+            for item in kept:
+                heapq.heappush(self._retired_heap, item)
+        self.evictions += evicted
+        return evicted
+
+    def publish(self):
+        """Write every changed tally to its proposal document; return how many were written."""
+        with self._publish_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, set()
+            published = 0
+            for path in dirty:
+                tally = self._tallies.get(path)
+                if tally is None:
+                    continue
+                with tally.lock:
+                    fields = tally.fields()
+                try:
+                    tally.reference.update(fields)
+                    published += 1
+                    with self._lock:
+                        block = self._retired.get(path)
+                        if block is not None:
+                            # May have been passed over by evict() while unpublished.
+                            heapq.heappush(self._retired_heap, (block, path))
+                except Exception as e:
+                    logger.error("Could not publish the tally of %s: %s", path, e)
+                    with self._lock:
+                        self._dirty.add(path)
+            self.publishes += published
+            return published
+
+    def reseed(self):
+        """Re-read every known tally from Firestore (after a re-org rollback) and republish it."""
+        with self._lock:
+            tallies = list(self._tallies.values())
+        for tally in tallies:
+            with tally.lock:
+                tally.seed()
+            if tally.exists:
+                with self._lock:
+                    self._dirty.add(tally.reference.path)
+        return self.publish()
+
+    def _run(self):
+        while not self._stop.wait(self.publish_interval):
+            try:
+                self.publish()
+            except Exception:
+                logger.exception("Publishing vote tallies failed")
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+        self.publish()
+
+    def stats(self):
+        return {"proposals": len(self._tallies), "votes": self.votes, "duplicates": self.duplicates,
+                "published": self.publishes, "pending": len(self._dirty), "retired": len(self._retired),
+                "evicted": self.evictions}
+
+
+vote_tally = TallyEngine()
@@ -0,0 +1,295 @@
+"""Asyncio indexer: one event loop instead of a thread per worker.
+
+Block numbers and logs are read with ``AsyncWeb3``, every shard of the
+address set at once. The ``Paper`` handlers run unchanged in a small thread
+pool (``asyncio.to_thread``); their contract reads go back through the loop
+via ``LoopProvider``, so all JSON-RPC traffic shares one connection pool and
+one limit. Two semaphores bound the resources:
+
+* ``rpc_concurrency``: JSON-RPC requests in flight, from the poller and the
+  handlers together;
+* ``storage_concurrency``: handlers running at once, each of them writing to
+  Firestore (or the local store) as it goes.
+
+A DAO's events are handled one after the other in chain order, while other
+DAOs' run concurrently. At most ``max_pending`` events wait to be handled;
+past that the poller waits. Events are marked processed once their handler
+returned, as in ``threaded_indexer``, and proposal stages advance with the
+blocks whose events are all handled. An event whose handler raised is
+submitted again on the next polls while no other event is waiting, up to
+``max_retries`` times; until then stages do not advance past its block.
+
+    python async_indexer.py --rpc-concurrency 64 --storage-concurrency 8
+"""
+
+import argparse
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from firebase_admin import firestore
+from web3 import AsyncWeb3, Web3
+
+from apps.generic.async_rpc import LoopProvider, get_logs
+from apps.generic.backfill import log_sort_key
+from apps.generic.block_times import block_clock
+from apps.generic.dedup import LogDeduplicator, log_key
+from apps.generic.local_store import FirestoreExporter
+from apps.generic.log_archive import LogArchive
+from apps.generic.shards import AddressShards
+from apps.generic.topics import event_name_for, topic0_filter
+from apps.generic.write_buffer import BufferedClient
+from apps.homebase.lifecycle import proposal_lifecycle
+from apps.homebase.tally import vote_tally
+from threaded_indexer import RPC_URL, advance_lifecycle, initialize_environment, partition_key, process_event
+
+
+class AsyncIndexer:
+    """Poller and per-DAO handler chains on the running event loop."""
+
+    def __init__(self, async_web3, web3, papers, listening_to_addresses, daos_collection, db, event_signatures,
+                 rpc_semaphore, storage_concurrency=8, max_pending=4000, poll_interval=5, confirmations=2,
+                 max_window=1000, max_retries=5):
+        self.async_web3 = async_web3
+        self.web3 = web3
+        self.papers = papers
+        self.listening_to_addresses = listening_to_addresses
+        self.daos_collection = daos_collection
+        self.db = db
+        self.event_signatures = event_signatures
+        self.rpc = rpc_semaphore
+        self.storage = asyncio.Semaphore(storage_concurrency)
+        self.pending = asyncio.Semaphore(max_pending)
+        self.max_pending = max_pending
+        self.poll_interval = poll_interval
+        self.confirmations = confirmations
+        self.max_window = max_window
+        self.max_retries = max_retries
+        # process_event registers new DAOs under this lock; handlers run in threads.
+        self.lock = threading.Lock()
+        self.processed_tx = LogDeduplicator()
+        self.in_flight = LogDeduplicator()
+        # Events whose handler raised: keys here, (log, event name, attempts) in _retries.
+        self.failed_tx = LogDeduplicator()
+        self._retries = {}
+        self._tails = {}
+        self.queued = 0
+        self.handled = 0
+        self.failed = 0
+        self.retried = 0
+        self.abandoned = 0
+        self.polls = 0
+
+    async def _handle(self, previous, log_entry, event_name):
+        try:
+            if previous is not None:
+                # Only the order matters here, not how the previous event fared.
+                await asyncio.wait([previous])
+            async with self.storage:
+                ok = await asyncio.to_thread(process_event, log_entry, event_name, self.papers,
+                                             self.listening_to_addresses, self.daos_collection, self.db,
+                                             self.web3, self.lock)
+            if ok:
+                self.processed_tx.add(log_entry)
+                self.handled += 1
+                if self._retries.pop(log_key(log_entry), None) is not None:
+                    self.failed_tx.discard(log_entry)
+            else:
+                self.failed += 1
+                self._failed(log_entry, event_name)
+        finally:
+            self.in_flight.discard(log_entry)
+            self.queued -= 1
+            self.pending.release()
+
+    def _failed(self, log_entry, event_name):
+        key = log_key(log_entry)
+        attempts = self._retries[key][2] + 1 if key in self._retries else 1
+        if attempts > self.max_retries:
+            self.abandoned += 1
+            del self._retries[key]
+            self.failed_tx.discard(log_entry)
+            logging.error("Giving up on %s of block %d after %d attempts", event_name, log_entry["blockNumber"],
+                          attempts)
+            return
+        self._retries[key] = (log_entry, event_name, attempts)
+        self.failed_tx.add(log_entry)
+
+    async def retry_failed(self):
+        """Submit the failed events again, oldest first, if no other event is waiting to be handled."""
+        if self.queued:
+            return
+        for log_entry, event_name, _ in sorted(self._retries.values(), key=lambda item: log_sort_key(item[0])):
+            if self.in_flight.add(log_entry):
+                self.retried += 1
+                await self.submit(log_entry, event_name)
+
+    def _forget(self, key, task):
+        if self._tails.get(key) is task:
+            del self._tails[key]
+
+    async def submit(self, log_entry, event_name):
+        """Schedule the event after the DAO's previous one; waits while ``max_pending`` events are queued."""
+        await self.pending.acquire()
+        self.queued += 1
+        key = partition_key(log_entry, self.papers, self.lock).lower()
+        task = asyncio.create_task(self._handle(self._tails.get(key), log_entry, event_name))
+        self._tails[key] = task
+        task.add_done_callback(lambda done, key=key: self._forget(key, done))
+
+    async def poll(self, stop):
+        """Fetch new logs from ``confirmations`` below the head and submit them, until ``stop`` is set."""
+        topics = topic0_filter(self.event_signatures)
+        next_block = None
+        while not stop.is_set():
+            wait = self.poll_interval
+            try:
+                async with self.rpc:
+                    latest = await self.async_web3.eth.block_number - self.confirmations
+                first = latest - 13 if latest > 13 else 0
+                start = first if next_block is None else next_block
+                first = min(first, start)
+                if first <= latest:
+                    # The window counts from the first unfetched block; re-scanned recent blocks come on top.
+                    last = min(latest, start + self.max_window - 1)
+                    logs = await get_logs(self.async_web3, self.listening_to_addresses, first, last, self.rpc,
+                                          topics=topics)
+                    self.polls += 1
+                    # Off the loop: the handlers' web3 sends its requests through it.
+                    await asyncio.to_thread(block_clock.prefetch, self.web3,
+                                            {log_entry["blockNumber"] for log_entry in logs})
+                    for log_entry in logs:
+                        if log_entry in self.processed_tx or not self.in_flight.add(log_entry):
+                            continue
+                        event_name = event_name_for(log_entry, self.event_signatures)
+                        if event_name:
+                            await self.submit(log_entry, event_name)
+                        else:
+                            self.in_flight.discard(log_entry)
+                    next_block = max(next_block or 0, last + 1)
+                    self.processed_tx.prune(first - 1)
+                    if last < latest:
+                        wait = 0
+                await self.retry_failed()
+                if next_block is not None:
+                    # Tallies are read and stage changes written off the loop.
+                    await asyncio.to_thread(advance_lifecycle, self.web3, self.db, self.in_flight, next_block - 1,
+                                            self.failed_tx)
+            except Exception as exc:
+                logging.exception("Poller error: %s", exc)
+            try:
+                await asyncio.wait_for(stop.wait(), wait)
+            except asyncio.TimeoutError:
+                pass
+
+    async def drain(self):
+        """Wait for every submitted event to be handled."""
+        await asyncio.gather(*list(self._tails.values()), return_exceptions=True)
+
+    def stats(self):
+        return {
+            "handled": self.handled,
+            "failed": self.failed,
+            "retried": self.retried,
+            "abandoned": self.abandoned,
+            "queued": self.queued,
+            "daos_busy": len(self._tails),
+            "polls": self.polls,
+            "handler_rpc_requests": self.web3.provider.requests,
+        }
+
+    async def report(self, stop, interval=10):
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), interval)
+            except asyncio.TimeoutError:
+                logging.info("Indexer: %s", self.stats())
+
+
+async def run(rpc_concurrency=64, storage_concurrency=8, max_pending=4000, poll_interval=5, shard_size=200,
+              confirmations=2, max_window=1000, flush_interval=1.0, store=None, export=True, archive_dir=None,
+              block_times_file=None):
+    loop = asyncio.get_running_loop()
+    # Handlers and the blocking set-up calls run here; storage_concurrency bounds the handlers.
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=storage_concurrency + 1, thread_name_prefix="handler"))
+    rpc_semaphore = asyncio.Semaphore(rpc_concurrency)
+    async_web3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(RPC_URL))
+    web3 = Web3(LoopProvider(async_web3.provider, loop, rpc_semaphore))
+
+    web3, papers, daos_collection, db, event_signatures, listening_to_addresses = await asyncio.to_thread(
+        initialize_environment, flush_interval, store=store, web3=web3)
+    exporter = None
+    if store and export:
+        exporter = FirestoreExporter(db.store, firestore.client(), interval=flush_interval or 1.0)
+    log_archive = LogArchive(archive_dir) if archive_dir else None
+    listening_to_addresses = AddressShards(listening_to_addresses, shard_size=shard_size, archive=log_archive)
+    if block_times_file:
+        block_clock.open(block_times_file)
+
+    indexer = AsyncIndexer(async_web3, web3, papers, listening_to_addresses, daos_collection, db, event_signatures,
+                           rpc_semaphore, storage_concurrency=storage_concurrency, max_pending=max_pending,
+                           poll_interval=poll_interval, confirmations=confirmations, max_window=max_window)
+    stop = asyncio.Event()
+    try:
+        await asyncio.gather(indexer.poll(stop), indexer.report(stop))
+    finally:
+        logging.info("Shutting down.")
+        stop.set()
+        await indexer.drain()
+        logging.info("Indexer: %s", indexer.stats())
+        logging.info("Proposal lifecycle: %s", proposal_lifecycle.stats())
+        vote_tally.close()
+        if isinstance(db, BufferedClient):
+            db.buffer.close()
+            logging.info("Write buffer: %s", db.buffer.stats())
+        if exporter:
+            exporter.close()
+            logging.info("Firestore export: %s", exporter.stats())
+        if log_archive:
+            logging.info("Log archive: %s", log_archive.stats())
+            log_archive.close()
+        logging.info("Block clock: %s", block_clock.stats())
+        block_clock.close()
+        await async_web3.provider.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the asyncio indexer")
+    parser.add_argument("--rpc-concurrency", type=int, default=64,
+                        help="Most JSON-RPC requests in flight, from the poller and the handlers together")
+    parser.add_argument("--storage-concurrency", type=int, default=8,
+                        help="Most handlers writing to the store at once")
+    parser.add_argument("--max-pending", type=int, default=4000,
+                        help="Events waiting to be handled before the poller waits")
+    parser.add_argument("--poll", type=int, default=5, help="Polling interval in seconds")
+    parser.add_argument("--confirmations", type=int, default=2,
+                        help="Only index blocks at least this many blocks below the chain head")
+    parser.add_argument("--max-window", type=int, default=1000, help="Most blocks fetched per poll")
+    parser.add_argument("--shard-size", type=int, default=200,
+                        help="Maximum number of contract addresses per get_logs request")
+    parser.add_argument("--flush-interval", type=float, default=1.0,
+                        help="Seconds Firestore writes are buffered and merged before being committed (0 disables)")
+    parser.add_argument("--store", default=None,
+                        help="SQLite file holding the indexed state; changes are exported to Firestore")
+    parser.add_argument("--no-export", action="store_true",
+                        help="With --store, do not export to Firestore (offline re-indexing)")
+    parser.add_argument("--archive-dir", default=None,
+                        help="Archive fetched logs in this directory for offline replay")
+    parser.add_argument("--block-times-file", default=None,
+                        help="SQLite file keeping the block timestamps used to stamp chain times across runs")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    try:
+        asyncio.run(run(rpc_concurrency=args.rpc_concurrency, storage_concurrency=args.storage_concurrency,
+                        max_pending=args.max_pending, poll_interval=args.poll, shard_size=args.shard_size,
+                        confirmations=args.confirmations, max_window=args.max_window,
+                        flush_interval=args.flush_interval, store=args.store, export=not args.no_export,
+                        archive_dir=args.archive_dir, block_times_file=args.block_times_file))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
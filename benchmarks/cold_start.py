@@ -0,0 +1,85 @@
+"""Cold-start time from interpreter start to the first ``get_logs`` call.
+
+Each run is a fresh interpreter that goes through the indexer's start-up
+path offline: import ``Paper``, compile the event decoders, hydrate
+``--daos`` DAO/token Paper pairs and issue one ``get_logs`` against an
+in-process provider. ``--tree`` runs the same steps against another checkout
+(e.g. a ``git worktree`` of the commit before a change) for a before/after
+comparison; ``--no-pyc`` points ``PYTHONPYCACHEPREFIX`` at an empty directory
+so every module is compiled from source, as on a fresh container.
+
+    git worktree add /tmp/indexer-before <commit>
+    python -m benchmarks.cold_start --tree /tmp/indexer-before --tree .
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CHILD = r"""
+import time
+started = time.perf_counter()
+from web3 import Web3
+from web3.providers.base import JSONBaseProvider
+from apps.homebase.paper import Paper
+try:
+    from apps.homebase.decoders import shared_registry
+except ImportError:
+    shared_registry = None
+
+class Provider(JSONBaseProvider):
+    def make_request(self, method, params):
+        return {"jsonrpc": "2.0", "id": 1, "result": []}
+    def is_connected(self, show_traceback=False):
+        return True
+
+web3 = Web3(Provider())
+if shared_registry:
+    shared_registry()
+papers = {}
+for index in range(DAOS):
+    address = Web3.to_checksum_address("0x%040x" % (index + 1))
+    token = Paper(address=address, kind="token", web3=web3, daos_collection=None, db=None, dao=address)
+    papers[address] = Paper(address=address, kind="dao", token=token, web3=web3, daos_collection=None, db=None, dao=address)
+ready = time.perf_counter()
+web3.eth.get_logs({"fromBlock": 0, "toBlock": 1, "address": list(papers)[:10]})
+print((ready - started) * 1000)
+"""
+
+
+def run_once(tree, daos, no_pyc):
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.path.abspath(tree)
+    with tempfile.TemporaryDirectory() as cache:
+        if no_pyc:
+            env["PYTHONPYCACHEPREFIX"] = cache
+        started = time.perf_counter()
+        output = subprocess.run([sys.executable, "-c", CHILD.replace("DAOS", str(daos))],
+                                cwd=tree, env=env, check=True, capture_output=True, text=True).stdout
+        wall = (time.perf_counter() - started) * 1000
+    return float(output.strip().splitlines()[-1]), wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tree", action="append", help="Checkout to measure (repeatable, default: .)")
+    parser.add_argument("--daos", type=int, default=2000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--no-pyc", action="store_true")
+    args = parser.parse_args()
+
+    print(f"{args.daos} DAOs, median of {args.runs} runs{', no bytecode cache' if args.no_pyc else ''}")
+    print(f"{'tree':<40}{'imports->first get_logs ms':>28}{'process wall ms':>18}")
+    for tree in args.tree or ["."]:
+        samples = [run_once(tree, args.daos, args.no_pyc) for _ in range(args.runs)]
+        in_process = statistics.median(sample[0] for sample in samples)
+        wall = statistics.median(sample[1] for sample in samples)
+        print(f"{tree:<40}{in_process:>28.1f}{wall:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""Round trips and wall time to hydrate a wrapped DAO from its deployment log.
+
+Replays ``DaoWrappedDeploymentInfo`` logs through ``Paper.add_dao_wrapped``
+against an in-process node that answers the token, governor and timelock
+getters and sleeps ``--rtt`` milliseconds per HTTP request. The modes are:
+``call`` issues the eight getters as plain ``.call()``s as the handler used
+to; ``sequential`` is a node that rejects batches; ``batch`` and
+``multicall`` are JSON-RPC batches and Multicall3 ``aggregate3``.
+
+    python -m benchmarks.dao_hydration --daos 20 --rtt 40
+"""
+
+import argparse
+import json
+import time
+
+from eth_abi import decode, encode
+from web3 import Web3
+from web3.providers.base import JSONBaseProvider
+
+from apps.generic import multicall
+from apps.homebase import abi_store
+from apps.homebase.decoders import decode_log, shared_registry
+from apps.homebase.paper import Paper
+
+TOKEN = "0x" + "11" * 20
+TIMELOCK = "0x" + "22" * 20
+REGISTRY = "0x" + "33" * 20
+UNDERLYING = "0x" + "44" * 20
+
+GETTERS = {
+    "decimals()": ("uint8", 18),
+    "totalSupply()": ("uint256", 10**24),
+    "underlying()": ("address", UNDERLYING),
+    "proposalThreshold()": ("uint256", 10**18),
+    "votingDelay()": ("uint256", 7200),
+    "votingPeriod()": ("uint256", 50400),
+    "timelock()": ("address", TIMELOCK),
+    "getMinDelay()": ("uint256", 86400),
+}
+SELECTORS = {Web3.keccak(text=signature)[:4]: result for signature, result in GETTERS.items()}
+
+
+class SimulatedNode(JSONBaseProvider):
+    """Answers the hydration getters for any address, one ``rtt`` per HTTP request."""
+
+    def __init__(self, rtt, multicall_deployed, batches):
+        super().__init__()
+        self.rtt = rtt
+        self.multicall_deployed = multicall_deployed
+        self.batches = batches
+        self.requests = 0
+
+    def _answer(self, data):
+        abi_type, value = SELECTORS[bytes(data[:4])]
+        return encode([abi_type], [value])
+
+    def _respond(self, method, params):
+        if method == "eth_chainId":
+            return "0xa729"
+        if method == "eth_getCode":
+            deployed = self.multicall_deployed and params[0].lower() == multicall.MULTICALL3_ADDRESS.lower()
+            return "0x6080" if deployed else "0x"
+        if method == "eth_call":
+            call = params[0]
+            data = bytes.fromhex(call["data"][2:])
+            if call["to"].lower() == multicall.MULTICALL3_ADDRESS.lower():
+                (calls,) = decode(["(address,bool,bytes)[]"], data[4:])
+                results = [(True, self._answer(call_data)) for _, _, call_data in calls]
+                return "0x" + encode(["(bool,bytes)[]"], [results]).hex()
+            return "0x" + self._answer(data).hex()
+        raise NotImplementedError(method)
+
+    def make_request(self, method, params):
+        self.requests += 1
+        time.sleep(self.rtt)
+        params = json.loads(json.dumps(params, default=lambda value: "0x" + bytes(value).hex()))
+        return {"jsonrpc": "2.0", "id": 1, "result": self._respond(method, params)}
+
+    def make_batch_request(self, requests):
+        if not self.batches:
+            return {"jsonrpc": "2.0", "id": None, "error": {"code": -32600, "message": "batch requests disabled"}}
+        self.requests += 1
+        time.sleep(self.rtt)
+        return [{"jsonrpc": "2.0", "id": index, "result": self._respond(method, params)}
+                for index, (method, params) in enumerate(requests)]
+
+
+class Documents:
+    def __init__(self):
+        self.written = []
+
+    def document(self, *args):
+        return self
+
+    def collection(self, *args):
+        return self
+
+    def set(self, data, *args, **kwargs):
+        self.written.append(data)
+
+
+def plain_calls(paper, log):
+    """The getter sequence ``add_dao_wrapped`` made before batching, one ``.call()`` each."""
+    args = decode_log(log, "DaoWrappedDeploymentInfo")["args"]
+    token = paper.get_specific_contract(args["wrappedTokenAddress"], "wrapper_token_abi")
+    dao = paper.get_specific_contract(args["daoAddress"], "daoAbiGlobal")
+    for function in (token.functions.decimals, token.functions.totalSupply, token.functions.underlying,
+                     dao.functions.proposalThreshold, dao.functions.votingDelay, dao.functions.votingPeriod):
+        function().call()
+    timelock = paper.get_specific_contract(dao.functions.timelock().call(), "timelock_min_delay_abi")
+    timelock.functions.getMinDelay().call()
+
+
+def deployment_log(index):
+    event = next(entry for entry in abi_store.abi("wrapper_w_abi") if entry.get("name") == "DaoWrappedDeploymentInfo")
+    types = [item["type"] for item in event["inputs"] if not item["indexed"]]
+    topic0 = Web3.keccak(text=f"DaoWrappedDeploymentInfo({','.join(item['type'] for item in event['inputs'])})")
+    dao = index.to_bytes(32, "big")
+    return {
+        "address": "0x" + "55" * 20,
+        "topics": [topic0, dao, bytes(12) + bytes.fromhex(TOKEN[2:])],
+        "data": encode(types, [REGISTRY, f"DAO {index}", "WDAO", "benchmark", 4]),
+        "blockNumber": 1, "blockHash": bytes(32), "transactionHash": bytes(32), "transactionIndex": 0, "logIndex": 0,
+    }
+
+
+def run(mode, daos, rtt):
+    node = SimulatedNode(rtt, multicall_deployed=mode == "multicall", batches=mode != "sequential")
+    web3 = Web3(node)
+    documents = Documents()
+    paper = Paper(address="0x" + "55" * 20, kind="wrapper_w", web3=web3, daos_collection=documents, db=None)
+    logs = [deployment_log(index + 1) for index in range(daos)]
+    started = time.perf_counter()
+    for log in logs:
+        if mode == "call":
+            plain_calls(paper, log)
+        else:
+            paper.add_dao_wrapped(log)
+    elapsed = time.perf_counter() - started
+    for org in documents.written:
+        assert (org["decimals"], org["executionDelay"], org["votingDuration"]) == (18, 86400, 50400), org
+    return node.requests, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--daos", type=int, default=20)
+    parser.add_argument("--rtt", type=float, default=40, help="Simulated round-trip time in milliseconds.")
+    args = parser.parse_args()
+
+    shared_registry()
+    print(f"{args.daos} wrapped DAOs, {args.rtt:.0f} ms per round trip")
+    print(f"{'mode':<12}{'requests':>10}{'per DAO':>10}{'ms per DAO':>12}")
+    for mode in ("call", "sequential", "batch", "multicall"):
+        requests, elapsed = run(mode, args.daos, args.rtt / 1000)
+        print(f"{mode:<12}{requests:>10}{requests / args.daos:>10.1f}{elapsed * 1000 / args.daos:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
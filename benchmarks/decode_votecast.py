@@ -0,0 +1,79 @@
+"""Micro-benchmark: shared decoder table vs ``contract.events.VoteCast().process_log``.
+
+Encodes synthetic ``VoteCast`` logs, checks both paths decode them to the same
+arguments, then times each path over all logs.
+
+    python -m benchmarks.decode_votecast --logs 5000
+"""
+
+import argparse
+import os
+import random
+import time
+
+from eth_abi import encode
+from hexbytes import HexBytes
+from web3 import Web3
+
+from apps.homebase import abi_store
+from apps.homebase.decoders import decode_log, shared_registry
+
+VOTE_CAST = "VoteCast(address,uint256,uint8,uint256,string)"
+
+
+def synthetic_votes(count, dao_address):
+    topic0 = HexBytes(Web3.keccak(text=VOTE_CAST))
+    logs = []
+    for index in range(count):
+        voter = os.urandom(20)
+        data = encode(["uint256", "uint8", "uint256", "string"],
+                      [random.getrandbits(256), random.randint(0, 2), random.getrandbits(96), "reason " * random.randint(0, 8)])
+        logs.append({
+            "address": dao_address,
+            "topics": [topic0, HexBytes(b"\x00" * 12 + voter)],
+            "data": HexBytes(data),
+            "blockNumber": 1000 + index // 10,
+            "blockHash": HexBytes(os.urandom(32)),
+            "transactionHash": HexBytes(os.urandom(32)),
+            "transactionIndex": index % 10,
+            "logIndex": index % 10,
+            "removed": False,
+        })
+    return logs
+
+
+def timed(label, fn, logs, baseline=None):
+    started = time.perf_counter()
+    for log in logs:
+        fn(log)
+    elapsed = time.perf_counter() - started
+    speedup = f"  ({baseline / elapsed:.1f}x)" if baseline else ""
+    print(f"{label:<34}{elapsed:>8.3f}s  {len(logs) / elapsed:>10,.0f} logs/s{speedup}")
+    return elapsed
+
+
+def run(count):
+    random.seed(3)
+    web3 = Web3()
+    dao_address = Web3.to_checksum_address("0x" + os.urandom(20).hex())
+    logs = synthetic_votes(count, dao_address)
+
+    started = time.perf_counter()
+    shared_registry()
+    print(f"decoder table compiled in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+    abi = abi_store.abi("daoAbiGlobal")
+    contract = web3.eth.contract(address=dao_address, abi=abi)
+    for log in logs[:200]:
+        expected = dict(contract.events.VoteCast().process_log(log)["args"])
+        assert decode_log(log, "VoteCast")["args"] == expected, "decoders disagree"
+
+    print(f"{count} VoteCast logs")
+    baseline = timed("contract.events.VoteCast().process_log", lambda log: contract.events.VoteCast().process_log(log), logs)
+    timed("decode_log (shared table)", lambda log: decode_log(log, "VoteCast"), logs, baseline)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logs", type=int, default=5000)
+    run(parser.parse_args().logs)
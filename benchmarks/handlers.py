@@ -0,0 +1,144 @@
+"""Paper handler throughput against an offline storage backend.
+
+Runs synthetic ``ProposalCreated``, ``VoteCast`` and ``DelegateChanged`` logs
+for one DAO through ``Paper.handle_event`` with the ``memory`` or ``sqlite``
+backend of ``apps.generic.storage`` and an in-process node that answers every
+``eth_call`` at once, so the numbers are the handlers' own cost (decoding,
+entity building, storage calls). Handler output is discarded.
+
+    python -m benchmarks.handlers --proposals 200 --votes 5000 --delegations 2000 --backend sqlite
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import time
+
+from eth_abi import encode
+from web3 import Web3
+from web3.providers.base import JSONBaseProvider
+
+from apps.generic.local_store import LocalStore
+from apps.generic.storage import MemoryStore
+from apps.homebase.decoders import shared_registry
+from apps.homebase.paper import Paper
+from apps.homebase.tally import vote_tally
+
+DAO = Web3.to_checksum_address("0x" + "d0" * 20)
+TOKEN = Web3.to_checksum_address("0x" + "70" * 20)
+
+PROPOSAL_CREATED = "ProposalCreated(uint256,address,address[],uint256[],string[],bytes[],uint256,uint256,string)"
+VOTE_CAST = "VoteCast(address,uint256,uint8,uint256,string)"
+DELEGATE_CHANGED = "DelegateChanged(address,address,address)"
+
+
+class InstantNode(JSONBaseProvider):
+    """Answers ``eth_call`` with ``10**18`` for any uint256 getter; no multicall contract."""
+
+    def __init__(self):
+        super().__init__()
+        self.requests = 0
+
+    def _respond(self, method, params):
+        if method == "eth_chainId":
+            return "0xa729"
+        if method == "eth_getCode":
+            return "0x"
+        if method == "eth_call":
+            return "0x" + encode(["uint256"], [10**18]).hex()
+        raise NotImplementedError(method)
+
+    def make_request(self, method, params):
+        self.requests += 1
+        return {"jsonrpc": "2.0", "id": 1, "result": self._respond(method, params)}
+
+    def make_batch_request(self, requests):
+        self.requests += 1
+        return [{"jsonrpc": "2.0", "id": index, "result": self._respond(method, params)}
+                for index, (method, params) in enumerate(requests)]
+
+
+def _topic(address):
+    return bytes(12) + bytes.fromhex(address[2:])
+
+
+def _log(address, signature, topics, data, index):
+    return {
+        "address": address,
+        "topics": [Web3.keccak(text=signature)] + topics,
+        "data": data,
+        "blockNumber": 1000 + index // 20, "blockHash": os.urandom(32), "transactionHash": os.urandom(32),
+        "transactionIndex": index % 20, "logIndex": index % 20,
+    }
+
+
+def synthetic_logs(proposals, votes, delegations, holders):
+    accounts = [Web3.to_checksum_address("0x" + os.urandom(20).hex()) for _ in range(holders)]
+    logs = {"ProposalCreated": [], "VoteCast": [], "DelegateChanged": []}
+    for proposal_id in range(1, proposals + 1):
+        data = encode(["uint256", "address", "address[]", "uint256[]", "string[]", "bytes[]", "uint256", "uint256",
+                       "string"],
+                      [proposal_id, random.choice(accounts), [TOKEN], [0], [""], [os.urandom(68)], 2000, 9000,
+                       f"Proposal {proposal_id}0|||0transfer0|||0benchmark0|||0https://example.org"])
+        logs["ProposalCreated"].append(_log(DAO, PROPOSAL_CREATED, [], data, proposal_id))
+    for index in range(votes):
+        data = encode(["uint256", "uint8", "uint256", "string"],
+                      [random.randint(1, proposals), random.randint(0, 2), random.getrandbits(80), ""])
+        logs["VoteCast"].append(_log(DAO, VOTE_CAST, [_topic(random.choice(accounts))], data, index))
+    for index in range(delegations):
+        delegator, old, new = random.sample(accounts, 3)
+        logs["DelegateChanged"].append(_log(TOKEN, DELEGATE_CHANGED, [_topic(delegator), _topic(old), _topic(new)],
+                                            b"", index))
+    return logs
+
+
+def run(backend, proposals, votes, delegations, holders):
+    random.seed(11)
+    if backend == "sqlite":
+        store = LocalStore(os.path.join(tempfile.mkdtemp(prefix="handlers-"), "state.db"))
+    else:
+        store = MemoryStore()
+    db = store.client()
+    daos_collection = db.collection("idaos")
+    daos_collection.document(DAO).set({"address": DAO, "token": TOKEN, "name": "Benchmark DAO"})
+
+    web3 = Web3(InstantNode())
+    token = Paper(address=TOKEN, kind="token", web3=web3, daos_collection=daos_collection, db=db, dao=DAO)
+    dao = Paper(address=DAO, kind="dao", web3=web3, daos_collection=daos_collection, db=db, dao=DAO, token=token)
+    papers = {TOKEN: token, DAO: dao}
+
+    logs = synthetic_logs(proposals, votes, delegations, holders)
+    print(f"backend: {backend}, {holders} accounts")
+    print(f"{'event':<18}{'logs':>8}{'logs/s':>12}{'reads':>10}{'writes':>10}")
+    for event_name, entries in logs.items():
+        reads, writes = store.reads, store.writes
+        started = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for log in entries:
+                papers[log["address"]].handle_event(log, func=event_name)
+        elapsed = time.perf_counter() - started
+        print(f"{event_name:<18}{len(entries):>8}{len(entries) / elapsed:>12,.0f}"
+              f"{store.reads - reads:>10}{store.writes - writes:>10}")
+    vote_tally.publish()
+    members = store.count(f"idaos/{DAO}/members")
+    print(f"{members} member documents, {web3.provider.requests} node requests")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", choices=("memory", "sqlite"), default="memory")
+    parser.add_argument("--proposals", type=int, default=200)
+    parser.add_argument("--votes", type=int, default=5000)
+    parser.add_argument("--delegations", type=int, default=2000)
+    parser.add_argument("--holders", type=int, default=1000)
+    args = parser.parse_args()
+
+    shared_registry()
+    run(args.backend, args.proposals, args.votes, args.delegations, args.holders)
+
+
+if __name__ == "__main__":
+    main()
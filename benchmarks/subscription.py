@@ -0,0 +1,229 @@
+"""``LogSubscription`` against a local mock node: latency, gap-fill and new addresses.
+
+The mock node produces a block every ``--block-time`` seconds with one log
+per contract and serves JSON-RPC both over HTTP (``eth_blockNumber``,
+``eth_getLogs``) and over a WebSocket (``eth_subscribe`` for ``logs`` and
+``newHeads``). Halfway through, a factory log announces a new contract,
+which the consumer adds to the listened set as ``add_dao`` would; the node
+also drops the WebSocket ``--drops`` times for ``--outage`` seconds. At the
+end every log the listened contracts emitted must have been received
+exactly once after de-duplication, whether pushed or gap-filled.
+
+    python -m benchmarks.subscription --blocks 200 --block-time 0.02 --drops 2
+"""
+
+import argparse
+import json
+import logging
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from web3 import Web3
+from websockets.sync.server import serve
+
+from apps.generic.dedup import LogDeduplicator
+from apps.generic.subscription import LogSubscription
+
+FACTORY = Web3.to_checksum_address("0x" + "fa" * 20)
+CONTRACTS = [Web3.to_checksum_address("0x" + f"{index:02x}" * 20) for index in range(1, 4)]
+NEW_CONTRACT = Web3.to_checksum_address("0x" + "d0" * 20)
+TOPIC = "0x" + "ab" * 32
+
+
+class MockNode:
+    """A chain of synthetic blocks behind an HTTP and a WebSocket JSON-RPC endpoint."""
+
+    def __init__(self, block_time, new_contract_at):
+        self.block_time = block_time
+        self.new_contract_at = new_contract_at
+        self.head = 0
+        self.logs = {}
+        self.produced_at = {}
+        self.sockets = {}
+        self.accepting = threading.Event()
+        self.accepting.set()
+        self._lock = threading.Lock()
+
+    def _block_logs(self, number):
+        emitters = list(CONTRACTS) + [FACTORY] * (number == self.new_contract_at)
+        if number > self.new_contract_at:
+            emitters.append(NEW_CONTRACT)
+        return [{
+            "address": address.lower(), "topics": [TOPIC], "data": "0x",
+            "blockNumber": hex(number), "blockHash": "0x" + f"{number:064x}",
+            "transactionHash": "0x" + f"{number:032x}{index:032x}", "transactionIndex": hex(index),
+            "logIndex": hex(index), "removed": False,
+        } for index, address in enumerate(emitters)]
+
+    def produce(self, blocks):
+        for number in range(1, blocks + 1):
+            time.sleep(self.block_time)
+            logs = self._block_logs(number)
+            with self._lock:
+                self.head = number
+                self.logs[number] = logs
+                self.produced_at[number] = time.perf_counter()
+                sockets = list(self.sockets.items())
+            for socket, subscriptions in sockets:
+                try:
+                    for subscription, (kind, addresses) in list(subscriptions.items()):
+                        if kind == "logs":
+                            for log_entry in logs:
+                                if log_entry["address"] in addresses:
+                                    self._notify(socket, subscription, log_entry)
+                    for subscription, (kind, _) in list(subscriptions.items()):
+                        if kind == "newHeads":
+                            self._notify(socket, subscription, {"number": hex(number)})
+                except Exception:
+                    pass
+
+    def _notify(self, socket, subscription, result):
+        socket.send(json.dumps({"jsonrpc": "2.0", "method": "eth_subscription",
+                                "params": {"subscription": subscription, "result": result}}))
+
+    def get_logs(self, log_filter):
+        addresses = {address.lower() for address in log_filter["address"]}
+        first, last = int(log_filter["fromBlock"], 16), int(log_filter["toBlock"], 16)
+        with self._lock:
+            return [log_entry for number in range(first, min(last, self.head) + 1)
+                    for log_entry in self.logs.get(number, ()) if log_entry["address"] in addresses]
+
+    def answer(self, request):
+        if request["method"] == "eth_blockNumber":
+            result = hex(self.head)
+        elif request["method"] == "eth_chainId":
+            result = "0xa729"
+        elif request["method"] == "eth_getLogs":
+            result = self.get_logs(request["params"][0])
+        else:
+            return {"jsonrpc": "2.0", "id": request["id"], "error": {"code": -32601, "message": "not found"}}
+        return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+    def serve_socket(self, socket):
+        if not self.accepting.is_set():
+            socket.close()
+            return
+        subscriptions = {}
+        with self._lock:
+            self.sockets[socket] = subscriptions
+        try:
+            for message in socket:
+                request = json.loads(message)
+                if request["method"] != "eth_subscribe":
+                    socket.send(json.dumps(self.answer(request)))
+                    continue
+                subscription = f"0x{len(subscriptions) + 1:x}"
+                params = request["params"]
+                addresses = {address.lower() for address in params[1]["address"]} if params[0] == "logs" else None
+                # Registered before the answer, as a node does: no notification is lost in between.
+                subscriptions[subscription] = (params[0], addresses)
+                socket.send(json.dumps({"jsonrpc": "2.0", "id": request["id"], "result": subscription}))
+        except Exception:
+            pass
+        finally:
+            with self._lock:
+                self.sockets.pop(socket, None)
+
+    def drop_sockets(self, outage):
+        self.accepting.clear()
+        with self._lock:
+            sockets = list(self.sockets)
+        for socket in sockets:
+            socket.close()
+        time.sleep(outage)
+        self.accepting.set()
+
+
+def http_server(node):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+            answer = [node.answer(item) for item in request] if isinstance(request, list) else node.answer(request)
+            body = json.dumps(answer).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(blocks, block_time, drops, outage):
+    node = MockNode(block_time, new_contract_at=blocks // 2)
+    http = http_server(node)
+    ws = serve(node.serve_socket, "127.0.0.1", 0)
+    threading.Thread(target=ws.serve_forever, daemon=True).start()
+    web3 = Web3(Web3.HTTPProvider(f"http://127.0.0.1:{http.server_address[1]}"))
+
+    addresses = list(CONTRACTS) + [FACTORY]
+    seen = LogDeduplicator()
+    received = []
+    latencies = []
+
+    def on_log(log_entry):
+        if not seen.add(log_entry):
+            return
+        received.append(log_entry)
+        produced = node.produced_at.get(log_entry["blockNumber"])
+        if produced is not None:
+            latencies.append(time.perf_counter() - produced)
+        if log_entry["address"] == FACTORY and NEW_CONTRACT not in addresses:
+            # What add_dao returns is appended to the listened set.
+            addresses.append(NEW_CONTRACT)
+
+    subscription = LogSubscription(f"ws://127.0.0.1:{ws.socket.getsockname()[1]}", web3, addresses, on_log,
+                                   from_block=1, reconnect_delay=0.2, new_address_lookback=blocks).start()
+    producer = threading.Thread(target=node.produce, args=(blocks,), daemon=True)
+    started = time.perf_counter()
+    producer.start()
+    for drop in range(drops):
+        time.sleep(blocks * block_time / (drops + 1))
+        node.drop_sockets(outage)
+    producer.join()
+    deadline = time.time() + 10
+    expected = sum(len(logs) for logs in node.logs.values())
+    while len(received) < expected and time.time() < deadline:
+        time.sleep(0.05)
+    elapsed = time.perf_counter() - started
+    subscription.close()
+    ws.shutdown()
+    http.shutdown()
+
+    keys = [(log_entry["blockNumber"], log_entry["logIndex"]) for log_entry in received]
+    latencies.sort()
+    print(f"{blocks} blocks in {elapsed:.1f}s, {drops} connection drops of {outage}s")
+    print(f"logs: {len(received)} of {expected} received, {len(keys) - len(set(keys))} duplicates")
+    print(f"subscription: {subscription.stats()}")
+    if latencies:
+        print(f"delivery latency: p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+              f"p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} ms (gap-filled logs included)")
+    new_contract_logs = sum(1 for log_entry in received if log_entry["address"] == NEW_CONTRACT)
+    print(f"new contract: {new_contract_logs} of {blocks - blocks // 2} logs")
+    return len(set(keys)) == expected
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--blocks", type=int, default=200)
+    parser.add_argument("--block-time", type=float, default=0.02)
+    parser.add_argument("--drops", type=int, default=2)
+    parser.add_argument("--outage", type=float, default=0.3)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format="%(message)s")
+
+    complete = run(args.blocks, args.block_time, args.drops, args.outage)
+    print("complete" if complete else "INCOMPLETE")
+    raise SystemExit(0 if complete else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Bandwidth and decode cost of server-side topic0 filtering on get_logs.
+
+Builds a synthetic log mix dominated by ERC20 ``Transfer``/``Approval`` logs,
+serves it through an in-process JSON-RPC provider that applies the request's
+``topics`` filter like a node would, and compares an unfiltered poll (client
+drops unmonitored logs) against a poll that sends ``topic0_filter``.
+
+    python -m benchmarks.topic_filter --logs 50000
+"""
+
+import argparse
+import json
+import os
+import random
+import time
+
+from web3 import Web3
+from web3.providers.base import JSONBaseProvider
+
+from apps.generic.topics import event_name_for, normalize_signatures, topic0_filter
+
+MONITORED = {
+    "DelegateChanged(address,address,address)": "DelegateChanged",
+    "ProposalCreated(uint256,address,address[],uint256[],string[],bytes[],uint256,uint256,string)": "ProposalCreated",
+    "ProposalQueued(uint256,uint256)": "ProposalQueued",
+    "ProposalExecuted(uint256)": "ProposalExecuted",
+    "VoteCast(address,uint256,uint8,uint256,string)": "VoteCast",
+}
+
+# (event signature, share of the mix, data words, indexed topics after topic0)
+MIX = [
+    ("Transfer(address,address,uint256)", 0.55, 1, 2),
+    ("Approval(address,address,uint256)", 0.25, 1, 2),
+    ("DelegateVotesChanged(address,uint256,uint256)", 0.08, 2, 1),
+    ("DelegateChanged(address,address,address)", 0.06, 0, 3),
+    ("VoteCast(address,uint256,uint8,uint256,string)", 0.05, 6, 1),
+    ("ProposalCreated(uint256,address,address[],uint256[],string[],bytes[],uint256,uint256,string)", 0.01, 40, 0),
+]
+
+
+def word():
+    return os.urandom(32).hex()
+
+
+def synthetic_logs(count, addresses, seed=7):
+    random.seed(seed)
+    signatures = [Web3.to_hex(Web3.keccak(text=text)) for text, _, _, _ in MIX]
+    weights = [share for _, share, _, _ in MIX]
+    logs = []
+    block = 1_000_000
+    for index in range(count):
+        if index % 20 == 0:
+            block += 1
+        kind = random.choices(range(len(MIX)), weights)[0]
+        _, _, data_words, indexed = MIX[kind]
+        logs.append({
+            "address": random.choice(addresses),
+            "topics": [signatures[kind]] + ["0x" + word() for _ in range(indexed)],
+            "data": "0x" + "".join(word() for _ in range(data_words)),
+            "blockNumber": hex(block),
+            "blockHash": "0x" + word(),
+            "transactionHash": "0x" + word(),
+            "transactionIndex": hex(index % 20),
+            "logIndex": hex(index % 20),
+            "removed": False,
+        })
+    return logs
+
+
+class SyntheticLogProvider(JSONBaseProvider):
+    """Answers eth_getLogs from memory, honouring a topic0 OR-filter."""
+
+    def __init__(self, logs):
+        super().__init__()
+        self.logs = logs
+        self.bytes_sent = 0
+
+    def make_request(self, method, params):
+        if method != "eth_getLogs":
+            raise NotImplementedError(method)
+        topics = params[0].get("topics")
+        wanted = set(topics[0]) if topics and topics[0] else None
+        result = [log for log in self.logs if wanted is None or log["topics"][0] in wanted]
+        raw = json.dumps({"jsonrpc": "2.0", "id": 1, "result": result}).encode()
+        self.bytes_sent += len(raw)
+        return self.decode_rpc_response(raw)
+
+    def is_connected(self, show_traceback=False):
+        return True
+
+
+def poll(web3, addresses, event_signatures, topics):
+    log_filter = {"fromBlock": 0, "toBlock": "latest", "address": addresses}
+    if topics:
+        log_filter["topics"] = topics
+    logs = web3.eth.get_logs(log_filter)
+    return [log for log in logs if event_name_for(log, event_signatures)]
+
+
+def run(log_count, repeats):
+    addresses = [Web3.to_checksum_address("0x" + os.urandom(20).hex()) for _ in range(40)]
+    event_signatures = normalize_signatures({Web3.keccak(text=text): name for text, name in MONITORED.items()})
+    logs = synthetic_logs(log_count, addresses)
+
+    results = {}
+    for label, topics in (("unfiltered", None), ("topic0 filter", topic0_filter(event_signatures))):
+        provider = SyntheticLogProvider(logs)
+        web3 = Web3(provider)
+        best = float("inf")
+        for _ in range(repeats):
+            provider.bytes_sent = 0
+            started = time.perf_counter()
+            kept = poll(web3, addresses, event_signatures, topics)
+            best = min(best, time.perf_counter() - started)
+        results[label] = (provider.bytes_sent, best, len(kept))
+
+    print(f"{log_count} synthetic logs on {len(addresses)} contracts, best of {repeats}")
+    print(f"{'mode':<15}{'bytes':>14}{'decode+filter s':>18}{'kept':>8}")
+    for label, (sent, seconds, kept) in results.items():
+        print(f"{label:<15}{sent:>14,}{seconds:>18.3f}{kept:>8}")
+    (full_bytes, full_time, _), (filtered_bytes, filtered_time, _) = results.values()
+    print(f"bandwidth saved: {100 * (1 - filtered_bytes / full_bytes):.1f}%  "
+          f"time saved: {100 * (1 - filtered_time / full_time):.1f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--logs", type=int, default=20000)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    run(args.logs, args.repeats)
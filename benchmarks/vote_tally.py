@@ -0,0 +1,115 @@
+"""VoteCast ingestion rate on one proposal: decoding alone vs decoding plus tallying.
+
+Decodes synthetic ``VoteCast`` logs for a single proposal and adds each one
+to a ``TallyEngine`` backed by an in-memory proposal document, then checks
+the published totals against sums computed directly from the votes. The
+per-vote transaction the tally replaced needs a read and a commit round trip
+per vote, serialized per proposal; its ceiling at ``--rtt`` is printed for
+comparison.
+
+    python -m benchmarks.vote_tally --votes 20000 --rtt 30
+"""
+
+import argparse
+import os
+import random
+import time
+
+from eth_abi import encode
+from hexbytes import HexBytes
+from web3 import Web3
+
+from apps.homebase.decoders import decode_log, shared_registry
+from apps.homebase.tally import TallyEngine
+
+VOTE_CAST = "VoteCast(address,uint256,uint8,uint256,string)"
+
+
+class Snapshot:
+    def __init__(self, data):
+        self._data = data
+        self.exists = data is not None
+
+    def to_dict(self):
+        return dict(self._data) if self._data is not None else None
+
+
+class Votes:
+    def stream(self):
+        return []
+
+
+class ProposalDocument:
+    path = "idaos/0xdao/proposals/1"
+
+    def __init__(self):
+        self.data = {"inFavor": "0", "against": "0", "votesFor": 0, "votesAgainst": 0}
+        self.updates = 0
+
+    def get(self):
+        return Snapshot(self.data)
+
+    def collection(self, name):
+        return Votes()
+
+    def update(self, fields):
+        self.updates += 1
+        self.data.update(fields)
+
+
+def synthetic_votes(count, proposal_id, dao_address):
+    topic0 = HexBytes(Web3.keccak(text=VOTE_CAST))
+    logs = []
+    for index in range(count):
+        data = encode(["uint256", "uint8", "uint256", "string"],
+                      [proposal_id, random.randint(0, 2), random.getrandbits(96), "reason " * random.randint(0, 4)])
+        logs.append({
+            "address": dao_address,
+            "topics": [topic0, HexBytes(b"\x00" * 12 + os.urandom(20))],
+            "data": HexBytes(data),
+            "blockNumber": 1000 + index // 10,
+            "blockHash": HexBytes(os.urandom(32)),
+            "transactionHash": HexBytes(os.urandom(32)),
+            "transactionIndex": index % 10,
+            "logIndex": index % 10,
+        })
+    return logs
+
+
+def run(count, rtt):
+    random.seed(5)
+    shared_registry()
+    logs = synthetic_votes(count, 1, Web3.to_checksum_address("0x" + os.urandom(20).hex()))
+
+    decoded = [decode_log(log, "VoteCast")["args"] for log in logs]  # warm-up
+    started = time.perf_counter()
+    decoded = [decode_log(log, "VoteCast")["args"] for log in logs]
+    decode_only = time.perf_counter() - started
+
+    engine = TallyEngine(publish_interval=0)
+    proposal = ProposalDocument()
+    started = time.perf_counter()
+    for log in logs:
+        args = decode_log(log, "VoteCast")["args"]
+        engine.record(proposal, args["voter"], args["support"], args["weight"])
+    engine.publish()
+    tallied = time.perf_counter() - started
+
+    expected = {support: sum(args["weight"] for args in decoded if args["support"] == support) for support in (0, 1, 2)}
+    assert proposal.data["inFavor"] == str(expected[1])
+    assert proposal.data["against"] == str(expected[0])
+    assert proposal.data["abstain"] == str(expected[2])
+    assert proposal.data["votesFor"] + proposal.data["votesAgainst"] + proposal.data["votesAbstain"] == count
+
+    print(f"{count} votes on one proposal")
+    print(f"{'decode only':<28}{count / decode_only:>12,.0f} votes/s")
+    print(f"{'decode + tally':<28}{count / tallied:>12,.0f} votes/s  ({proposal.updates} proposal update)")
+    print(f"{'transaction per vote':<28}{1000 / (2 * rtt):>12,.0f} votes/s  at most, with {rtt:g} ms round trips")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--votes", type=int, default=20000)
+    parser.add_argument("--rtt", type=float, default=30, help="Firestore round-trip time in milliseconds.")
+    args = parser.parse_args()
+    run(args.votes, args.rtt)
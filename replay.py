@@ -0,0 +1,211 @@
+"""Rebuild a network's collections by replaying archived logs through ``Paper``.
+
+Logs come from the archive ``app.py`` writes (``state/<network>.logs``) and
+are handled in chain order as the indexer would, without fetching anything;
+contract reads are answered from an RPC response cache, filled from the node
+on first use unless ``--offline`` is given. The result goes to a local SQLite
+store by default (export it with ``app.py --store``), or to any other
+storage backend.
+
+    python replay.py testnet --from-block 0 --store state/testnet.replay.db
+"""
+
+import argparse
+import contextlib
+import functools
+import itertools
+import logging
+import os
+import time
+from collections import Counter
+
+from web3 import Web3
+
+from apps.generic.block_times import block_clock
+from apps.generic.log_archive import LogArchive
+from apps.generic.rpc_cache import CachingProvider
+from apps.generic.storage import open_client
+from apps.generic.write_buffer import BufferedClient, WriteBuffer
+from apps.homebase.decoders import shared_registry
+from apps.homebase.paper import Paper
+from apps.homebase.lifecycle import proposal_lifecycle
+from apps.homebase.tally import vote_tally
+
+NETWORKS = {
+    "mainnet": ("https://node.mainnet.etherlink.com", "idaosEtherlink"),
+    "testnet": ("https://node.ghostnet.etherlink.com", "idaosEtherlink-Testnet"),
+}
+WRAPPER_EVENTS = {"NewDaoCreated": "wrapper", "DaoWrappedDeploymentInfo": "wrapper_w"}
+
+
+def hydrate(daos_collection, db, web3):
+    """``Paper`` objects of the DAOs already in the store, keyed by contract address."""
+    papers = {}
+    for doc in daos_collection.stream():
+        obj = doc.to_dict()
+        if not obj.get("token") or not obj.get("address"):
+            continue
+        token = Paper(address=obj["token"], kind="token", daos_collection=daos_collection, db=db, web3=web3,
+                      dao=obj["address"])
+        papers[obj["token"]] = token
+        papers[obj["address"]] = Paper(address=obj["address"], kind="dao", token=token,
+                                       daos_collection=daos_collection, db=db, web3=web3, dao=obj["address"])
+    return papers
+
+
+def replay(archive, papers, daos_collection, db, web3, from_block=0, to_block=None, atomic=None,
+           commit_every=1000, progress_every=10000):
+    """Feed the archived logs in ``[from_block, to_block]`` to their ``Paper``.
+
+    Wrapper contracts are recognized by their deployment events and DAOs
+    they create are registered as ``process_log`` does in ``app.py``. With
+    ``atomic`` (``DocumentStore.atomic``) every ``commit_every`` logs are
+    handled in one transaction.
+
+    Returns
+    -------
+    tuple
+        ``Counter`` of handled events by name, number of logs skipped (no
+        decoder, or no ``Paper`` for the address), elapsed seconds.
+    """
+
+    registry = shared_registry()
+    handled = Counter()
+    skipped = 0
+    # Archived addresses are lower case; checksumming costs a keccak each time.
+    checksum = functools.lru_cache(maxsize=None)(Web3.to_checksum_address)
+
+    def handle(log_entry):
+        decoder = registry.get(log_entry)
+        if decoder is None:
+            return False
+        address = checksum(log_entry["address"])
+        paper = papers.get(address)
+        if paper is None and decoder.name in WRAPPER_EVENTS:
+            paper = papers[address] = Paper(address=address, kind=WRAPPER_EVENTS[decoder.name],
+                                            daos_collection=daos_collection, db=db, web3=web3)
+        if paper is None:
+            return False
+        new_contract_addresses = paper.handle_event(log_entry, func=decoder.name)
+        handled[decoder.name] += 1
+        if new_contract_addresses:
+            dao_address, token_address = new_contract_addresses
+            if dao_address and token_address:
+                token = papers.get(token_address) or Paper(address=token_address, kind="token",
+                                                           daos_collection=daos_collection, db=db,
+                                                           dao=dao_address, web3=web3)
+                papers[token_address] = token
+                papers.setdefault(dao_address, Paper(token=token, address=dao_address, kind="dao",
+                                                     daos_collection=daos_collection, db=db,
+                                                     dao=dao_address, web3=web3))
+        return True
+
+    logs = archive.read(from_block, to_block)
+    started = time.perf_counter()
+    replayed = 0
+    while True:
+        with atomic() if atomic else contextlib.nullcontext():
+            chunk = list(itertools.islice(logs, commit_every))
+            # Chain times of the chunk's blocks, in batches through the RPC cache.
+            block_clock.prefetch(web3, {log_entry["blockNumber"] for log_entry in chunk})
+            for log_entry in chunk:
+                if not handle(log_entry):
+                    skipped += 1
+            if chunk:
+                # Blocks before the chunk's last one are complete.
+                block = chunk[-1]["blockNumber"] - 1
+                proposal_lifecycle.advance(block, block_clock.estimate(block))
+                proposal_lifecycle.flush(db)
+        if not chunk:
+            break
+        before, replayed = replayed, replayed + len(chunk)
+        if progress_every and replayed // progress_every > before // progress_every:
+            elapsed = time.perf_counter() - started
+            logging.info("Replayed %d logs up to block %d (%.0f logs/s)",
+                         replayed, chunk[-1]["blockNumber"], replayed / elapsed)
+    if to_block is not None:
+        proposal_lifecycle.advance(to_block, block_clock.estimate(to_block))
+        proposal_lifecycle.flush(db)
+    return handled, skipped, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("network", choices=sorted(NETWORKS))
+    parser.add_argument("--archive-dir", default=None, help="Log archive (default: state/<network>.logs)")
+    parser.add_argument("--from-block", type=int, default=0)
+    parser.add_argument("--to-block", type=int, default=None)
+    parser.add_argument("--backend", choices=("sqlite", "memory", "emulator", "firestore"), default="sqlite",
+                        help="Where the rebuilt collections are written")
+    parser.add_argument("--store", default=None,
+                        help="SQLite file for --backend sqlite (default: state/<network>.replay.db)")
+    parser.add_argument("--emulator", default=None, metavar="HOST:PORT", help="Emulator for --backend emulator")
+    parser.add_argument("--rpc-cache", default=None,
+                        help="Cache of contract reads (default: state/<network>.rpc-cache.db)")
+    parser.add_argument("--rpc", default=None, help="Node that fills cache misses (default: the network's node)")
+    parser.add_argument("--offline", action="store_true", help="Never contact a node; cache misses fail")
+    parser.add_argument("--verbose", action="store_true", help="Show the handlers' output")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    rpc, dao_collection_name = NETWORKS[args.network]
+    archive_dir = args.archive_dir or os.path.join("state", f"{args.network}.logs")
+    try:
+        archive = LogArchive(archive_dir, readonly=True)
+    except FileNotFoundError:
+        parser.error(f"No log archive in {archive_dir}")
+    if not len(archive):
+        parser.error(f"Log archive {archive_dir} is empty")
+    to_block = archive.last_block() if args.to_block is None else args.to_block
+    for first, last in archive.gaps(max(args.from_block, archive.first_block()), to_block):
+        logging.warning("Blocks %d-%d are not in the archive", first, last)
+
+    os.makedirs("state", exist_ok=True)
+    upstream = None if args.offline else Web3.HTTPProvider(args.rpc or rpc)
+    provider = CachingProvider(args.rpc_cache or os.path.join("state", f"{args.network}.rpc-cache.db"), upstream)
+    web3 = Web3(provider)
+
+    if args.backend == "sqlite":
+        db = open_client("sqlite", path=args.store or os.path.join("state", f"{args.network}.replay.db"))
+    elif args.backend == "emulator":
+        db = open_client("emulator", host=args.emulator)
+    else:
+        db = open_client(args.backend)
+    write_buffer = None
+    atomic = None
+    if args.backend in ("emulator", "firestore"):
+        write_buffer = WriteBuffer(db)
+        db = BufferedClient(db, write_buffer)
+    else:
+        atomic = db.store.atomic
+    daos_collection = db.collection(dao_collection_name)
+
+    logging.info("Compiled %d event decoders", len(shared_registry()))
+    papers = hydrate(daos_collection, db, web3)
+    proposal_lifecycle.load_all(daos_collection, [paper.dao for paper in papers.values() if paper.kind == "dao"])
+    logging.info("Replaying blocks %d to %d of %s into %s (%d DAOs already present)",
+                 args.from_block, to_block, archive.directory, args.backend, len(papers) // 2)
+
+    with contextlib.ExitStack() as output:
+        if not args.verbose:
+            output.enter_context(contextlib.redirect_stdout(output.enter_context(open(os.devnull, "w"))))
+        handled, skipped, elapsed = replay(archive, papers, daos_collection, db, web3, args.from_block, to_block,
+                                           atomic=atomic)
+        vote_tally.close()
+        if write_buffer:
+            write_buffer.close()
+
+    total = sum(handled.values())
+    logging.info("Replayed %d events in %.1fs: %.0f events/s (%d logs skipped)",
+                 total, elapsed, total / elapsed if elapsed else 0.0, skipped)
+    for name, count in handled.most_common():
+        logging.info("  %-26s %d", name, count)
+    logging.info("RPC cache: %s", provider.stats())
+    logging.info("Block clock: %s", block_clock.stats())
+    logging.info("Proposal lifecycle: %s", proposal_lifecycle.stats())
+    provider.close()
+    archive.close()
+
+
+if __name__ == "__main__":
+    main()
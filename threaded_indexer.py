@@ -8,10 +8,44 @@ import time
 from firebase_admin import credentials, firestore, initialize_app
 from web3 import Web3
 
+from apps.generic.backfill import AdaptiveWindow, backfill, fetch_range, find_deployment_block, log_sort_key
+from apps.generic.block_times import block_clock
+from apps.generic.dedup import LogDeduplicator, log_key
+from apps.generic.heads import HeadTracker
+from apps.generic.local_store import FirestoreExporter, LocalStore
+from apps.generic.log_archive import LogArchive
+from apps.generic.partitions import PartitionedQueue
+from apps.generic.shards import AddressShards
+from apps.generic.subscription import LogSubscription
+from apps.generic.topics import event_name_for, normalize_signatures, topic0_filter
+from apps.generic.write_buffer import BufferedClient, WriteBuffer
+from apps.homebase.decoders import shared_registry
 from apps.homebase.paper import Paper
+from apps.homebase.lifecycle import proposal_lifecycle
+from apps.homebase.members import member_index
+from apps.homebase.tally import vote_tally
 
-def initialize_environment():
+RPC_URL = "https://node.ghostnet.etherlink.com"
+# Handled backfill logs remembered before the older ones are pruned.
+BACKFILL_DEDUP_SIZE = 100000
+
+
+def initialize_environment(flush_interval=1.0, store=None, web3=None):
     """Initialize Firebase and Web3 environments.
+
+    Parameters
+    ----------
+    flush_interval : float
+        Seconds Firestore writes are buffered and merged before being
+        committed in batches; ``0`` commits each write immediately.
+    store : str, optional
+        SQLite file to use as the indexed state instead of Firestore; it is
+        seeded from Firestore when empty and the returned database handle is
+        client of that store.
+    web3 : Web3, optional
+        Instance the ``Paper`` objects use for contract reads; by default one
+        over an HTTP provider for ``RPC_URL``.
+
     Returns
     -------
     tuple
@@ -23,14 +57,23 @@ def initialize_environment():
     cred = credentials.Certificate("homebase.json")
     initialize_app(cred)
     db = firestore.client()
+    if flush_interval > 0 and not store:
+        db = BufferedClient(db, WriteBuffer(db, flush_interval=flush_interval))
 
     networks = db.collection("contracts")
     ceva = networks.document("Etherlink-Testnet").get()
-    rpc = "https://node.ghostnet.etherlink.com"
     wrapper_address = ceva.to_dict()['wrapper']
     wrapper_w_address = ceva.to_dict()['wrapper_w']
 
-    web3 = Web3(Web3.HTTPProvider(rpc))
+    if store:
+        local_store = LocalStore(store)
+        if not local_store.count('idaosEtherlink-Testnet'):
+            logging.info("Seeding local store %s from Firestore", store)
+            logging.info("Copied %d documents", local_store.import_collection(db.collection('idaosEtherlink-Testnet')))
+        db = local_store.client()
+
+    if web3 is None:
+        web3 = Web3(Web3.HTTPProvider(RPC_URL))
     if web3.is_connected():
         logging.info("node connected")
     else:
@@ -53,6 +96,12 @@ def initialize_environment():
         papers[obj['token']] = p
         papers[obj['address']] = dao
 
+    hydrated_daos = [paper_obj.dao for paper_obj in papers.values() if paper_obj.kind == "dao"]
+    logging.info("Indexed %d members of %d DAOs", member_index.load_all(daos_collection, hydrated_daos),
+                 len(hydrated_daos))
+    # Open proposals are loaded once; the listener then moves them on block and ETA deadlines.
+    logging.info("Scheduled %d open proposals", proposal_lifecycle.load_all(daos_collection, hydrated_daos))
+
     event_text_wrapped_dao = "DaoWrappedDeploymentInfo(address,address,address,string,string,string,uint8)"
     keccak_hash_wrapped_dao = web3.keccak(text=event_text_wrapped_dao).hex()
 
@@ -65,6 +114,8 @@ def initialize_environment():
         "0x712ae1383f79ac853f8d882153778e0260ef8f03b504e2866e0593e04d2b291f": "ProposalExecuted",
         "0xb8e138887d0aa13bab447e82de9d5c1777041ecd21ca36ba824ff1e6c07ddda4": "VoteCast",
     }
+    event_signatures = normalize_signatures(event_signatures)
+    logging.info("Compiled %d event decoders", len(shared_registry()))
 
     papers[wrapper_address] = Paper(address=wrapper_address, kind="wrapper",
                                     daos_collection=daos_collection, db=db, web3=web3)
@@ -89,6 +140,99 @@ def initialize_environment():
     return web3, papers, daos_collection, db, event_signatures, listening_to_addresses
 
 
+def partition_key(log_entry, papers, lock):
+    """The DAO a log belongs to, which decides the worker that handles it.
+
+    Logs of a DAO and of its token share the DAO's address; wrapper logs are
+    keyed by the wrapper, so DAO creations stay in deployment order.
+    """
+
+    with lock:
+        paper = papers.get(log_entry["address"])
+    if paper is not None and paper.kind in ("dao", "token") and paper.dao:
+        return paper.dao
+    return log_entry["address"]
+
+
+def enqueue(event_queue, key, item, stop_event):
+    """Put ``item`` on its partition, waiting while that partition is full; ``False`` if stopped first."""
+
+    while not stop_event.is_set():
+        try:
+            event_queue.put(key, item, timeout=1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def queue_log(log_entry, event_queue, event_signatures, processed_tx, in_flight, papers, lock, stop_event):
+    """Queue a fetched log for its DAO's worker unless it is handled or queued already.
+
+    Returns ``False`` if ``stop_event`` was set while waiting for room.
+    """
+
+    if log_entry in processed_tx or not in_flight.add(log_entry):
+        return True
+    event_name = event_name_for(log_entry, event_signatures)
+    if not event_name:
+        in_flight.discard(log_entry)
+        return True
+    if not enqueue(event_queue, partition_key(log_entry, papers, lock), (log_entry, event_name), stop_event):
+        in_flight.discard(log_entry)
+        return False
+    return True
+
+
+def wait_for_block(heads, block, stop_event):
+    """Return once the chain head reaches ``block``, or ``stop_event`` is set."""
+
+    while not stop_event.is_set():
+        head = heads.wait_for_head(block, timeout=1)
+        if head is not None and head >= block:
+            return
+
+
+def advance_lifecycle(web3, db, in_flight, queued_to, failed=None):
+    """Apply the proposal stage changes due once the events queued up to ``queued_to`` are handled.
+
+    Stages are decided on the vote tallies, so the lifecycle only advances
+    to the block before the oldest event still in flight or, given
+    ``failed``, waiting to be retried.
+    """
+
+    oldest = [block for block in (in_flight.first_block(), failed.first_block() if failed else None)
+              if block is not None]
+    block = min([queued_to] + [block - 1 for block in oldest])
+    if proposal_lifecycle.block is not None and block <= proposal_lifecycle.block:
+        return
+    proposal_lifecycle.advance(block, block_clock.timestamp(web3, block))
+    proposal_lifecycle.flush(db)
+
+
+def gap_fill(web3, registered, to_block, event_queue, event_signatures, processed_tx, in_flight, papers, lock,
+             stop_event, window, max_addresses=None):
+    """Queue the logs ``registered`` addresses (``{address: block}``) emitted up to ``to_block``."""
+
+    by_block = {}
+    for address, block in registered.items():
+        if block <= to_block:
+            by_block.setdefault(block, []).append(address)
+    logs = []
+    for block, addresses in by_block.items():
+        logs.extend(fetch_range(web3, block, to_block, addresses, window, topics=topic0_filter(event_signatures),
+                                max_addresses=max_addresses))
+    if not logs:
+        return
+    logs.sort(key=log_sort_key)
+    logging.info("Queueing %d logs of %d newly registered addresses up to block %d", len(logs), len(registered),
+                 to_block)
+    block_clock.prefetch(web3, {log_entry["blockNumber"] for log_entry in logs})
+    for log_entry in logs:
+        if not queue_log(log_entry, event_queue, event_signatures, processed_tx, in_flight, papers, lock, stop_event):
+            return
+
+
 def event_listener(
     event_queue,
     web3,
@@ -97,134 +241,464 @@ def event_listener(
     processed_tx,
     lock,
     stop_event,
+    papers,
+    in_flight,
+    failed,
+    heads,
+    db,
     poll_interval=5,
+    confirmations=2,
+    max_window=1000,
+    start_block=None,
 ):
-    """Poll blockchain logs and enqueue relevant events."""
+    """Fetch the logs of newly sealed blocks and enqueue relevant events.
+
+    Only blocks at least ``confirmations`` below the head are read, so short
+    re-orgs at the tip never reach the workers. ``heads`` (a ``HeadTracker``)
+    wakes the listener when the next block is confirmed; ``get_logs`` is not
+    called while there is none. ``event_queue`` is a ``PartitionedQueue``;
+    events are put on the partition of their DAO, so a DAO's events are
+    handled one at a time in chain order.
+
+    The listener keeps to the workers' pace: the block window it fetches
+    shrinks from ``max_window`` as the fullest partition fills up, it stops
+    fetching while one is full, and a put into a full partition waits for
+    room. Blocks left behind are fetched on the next passes, without
+    waiting for a new head. Logs are tracked in ``in_flight`` while queued;
+    workers move them to ``processed_tx`` once handled, or to ``failed`` if
+    the handler raised, and the blocks of those are fetched again with the
+    next new block while they are within the last 14.
+
+    A DAO or token the workers register may have emitted logs in blocks
+    already fetched without it: before each pass, the logs of the new
+    addresses from the block they were registered at up to the last fetched
+    block are queued first. Proposal stages due by the blocks whose events
+    are all handled are applied at each pass (``advance_lifecycle``).
+
+    ``start_block`` is the first block to fetch (the one after a backfill);
+    by default the listener starts with the last 14 confirmed blocks.
+    """
 
+    next_block = start_block
+    window = AdaptiveWindow()
+    registered = {}
     while not stop_event.is_set():
         try:
-            latest = web3.eth.block_number
-            first = latest - 13 if latest > 13 else 0
-            with lock:
-                addresses = list(listening_to_addresses)
-            logs = web3.eth.get_logs({
-                "fromBlock": first,
-                "toBlock": latest,
-                "address": addresses,
-            })
-            for log_entry in logs:
-                tx_hash = log_entry["transactionHash"].hex()
-                with lock:
-                    if tx_hash in processed_tx:
-                        continue
-                    processed_tx.add(tx_hash)
-                if not log_entry["topics"]:
+            for address, block in listening_to_addresses.take_registered().items():
+                registered[address] = min(block, registered.get(address, block))
+            if next_block is None:
+                # Registered before the first pass: nothing was fetched without them.
+                registered = {}
+            elif registered:
+                gap_fill(web3, registered, next_block - 1, event_queue, event_signatures, processed_tx, in_flight,
+                         papers, lock, stop_event, window, listening_to_addresses.shard_size)
+                registered = {}
+            if next_block is not None:
+                advance_lifecycle(web3, db, in_flight, next_block - 1, failed)
+            fill = event_queue.fill()
+            if fill >= 1.0:
+                logging.info("Workers behind (%d events queued), holding the listener", event_queue.qsize())
+                stop_event.wait(min(poll_interval, 1))
+                continue
+            span = max(1, int(max_window * (1.0 - fill)))
+            latest = heads.block_number() - confirmations
+            recent = latest - 13 if latest > 13 else 0
+            start = recent if next_block is None else next_block
+            # Failed events are retried only while the workers keep up.
+            failed.prune(recent - 1)
+            retry = failed.first_block() if fill == 0 else None
+            first = min(start, retry) if retry is not None else start
+            if first <= latest:
+                failed.forget_from(first)
+                # The window counts from the first unfetched block; retried blocks come on top.
+                last = min(latest, start + span - 1)
+                logs = listening_to_addresses.get_logs(web3, first, last, topics=topic0_filter(event_signatures))
+                # Workers stamp chain times; the headers come in one batch here rather than one per event.
+                block_clock.prefetch(web3, {log_entry["blockNumber"] for log_entry in logs})
+                for log_entry in logs:
+                    if not queue_log(log_entry, event_queue, event_signatures, processed_tx, in_flight, papers,
+                                     lock, stop_event):
+                        return
+                next_block = max(next_block or 0, last + 1)
+                # Later polls start at or after ``first``, so older entries can go.
+                processed_tx.prune(first - 1)
+                if last < latest:
                     continue
-                event_signature_from_log = log_entry["topics"][0].hex()
-                event_name = event_signatures.get(event_signature_from_log)
-                if event_name:
-                    event_queue.put((log_entry, event_name))
         except Exception as exc:
             logging.exception("Listener error: %s", exc)
-        stop_event.wait(poll_interval)
+            stop_event.wait(poll_interval)
+            continue
+        if next_block is not None:
+            wait_for_block(heads, next_block + confirmations, stop_event)
+
+
+def subscription_listener(
+    event_queue,
+    web3,
+    ws_url,
+    event_signatures,
+    listening_to_addresses,
+    processed_tx,
+    lock,
+    stop_event,
+    papers,
+    in_flight,
+    failed,
+    db,
+    confirmations=2,
+    lookback=13,
+    release_interval=0.25,
+    start_block=None,
+):
+    """Enqueue relevant events as the node pushes them over a ``logs`` subscription.
+
+    Replaces ``event_listener`` for the lowest latency: logs arrive as their
+    block is produced and are queued once it is ``confirmations`` blocks
+    below the head, so a log the node withdraws in a shorter re-org is
+    dropped before any worker sees it. New DAOs are subscribed to as the
+    workers register them; after a reconnection the missed blocks are
+    fetched over HTTP. The first connection also fetches the blocks from
+    ``start_block`` (the one after a backfill), by default the last
+    ``lookback`` blocks. As in ``event_listener``, the blocks of events
+    whose handler raised are fetched again while they are within the last
+    14 confirmed blocks and the workers keep up. Proposal stages advance
+    with the confirmed blocks, as in ``event_listener``.
+    """
+
+    topics = topic0_filter(event_signatures)
+    held = {}  # block -> {log key: log}, not confirmed yet
+    held_lock = threading.Lock()
+
+    def on_log(log_entry):
+        with held_lock:
+            held.setdefault(log_entry["blockNumber"], {})[log_key(log_entry)] = log_entry
+
+    def on_removed(log_entry):
+        with held_lock:
+            logs = held.get(log_entry["blockNumber"])
+            if logs is not None and logs.pop(log_key(log_entry), None) is not None:
+                return
+        logging.warning("Log %s of block %d was removed by a re-org after being queued",
+                        log_entry["transactionHash"].hex(), log_entry["blockNumber"])
+
+    subscription = LogSubscription(
+        ws_url, web3, listening_to_addresses, on_log, topics=topics,
+        from_block=start_block if start_block is not None else max(0, web3.eth.block_number - lookback),
+        on_removed=on_removed,
+        get_logs=lambda first, last: listening_to_addresses.get_logs(web3, first, last, topics=topics),
+    ).start()
+    last_report = time.monotonic()
+    while not stop_event.wait(release_interval):
+        if subscription.synced_block is None:
+            continue
+        # synced_block is the block before the last announced head.
+        confirmed = subscription.synced_block + 1 - confirmations
+        try:
+            failed.prune(confirmed - 14)
+            retry = failed.first_block() if event_queue.fill() == 0 else None
+            retried = []
+            if retry is not None and retry <= confirmed:
+                retried = listening_to_addresses.get_logs(web3, retry, confirmed, topics=topics)
+                failed.forget_from(retry)
+            with held_lock:
+                due = [block for block in held if block <= confirmed]
+                logs = [log_entry for block in due for log_entry in held.pop(block).values()]
+            # queue_log skips a log already in flight, so one both held and fetched again goes once.
+            logs = sorted(retried + logs, key=log_sort_key)
+            if logs:
+                block_clock.prefetch(web3, {log_entry["blockNumber"] for log_entry in logs})
+            for log_entry in logs:
+                if not queue_log(log_entry, event_queue, event_signatures, processed_tx, in_flight, papers, lock,
+                                 stop_event):
+                    break
+            advance_lifecycle(web3, db, in_flight, confirmed, failed)
+        except Exception as exc:
+            logging.exception("Subscription listener error: %s", exc)
+        if time.monotonic() - last_report >= 10:
+            last_report = time.monotonic()
+            # The subscription fills the new addresses' past logs itself.
+            listening_to_addresses.take_registered()
+            # Gap-fills of new addresses reach back this far; older logs are not seen again.
+            processed_tx.prune(subscription.synced_block - subscription.new_address_lookback - 1)
+            logging.info("Log subscription: %s", subscription.stats())
+    subscription.close()
 
 
-def worker(event_queue, papers, listening_to_addresses, daos_collection, db, web3, lock, stop_event):
-    """Process events pulled from the queue."""
+def process_event(log_entry, event_name, papers, listening_to_addresses, daos_collection, db, web3, lock):
+    """Run one event through its ``Paper`` and register any DAO it creates.
+
+    Returns ``False`` if the handler raised, ``True`` otherwise.
+    """
+
+    contract_address = log_entry["address"]
+    with lock:
+        paper = papers.get(contract_address)
+    if not paper:
+        logging.warning("Paper object not found for contract address: %s", contract_address)
+        return True
+    try:
+        new_contract_addresses = paper.handle_event(log_entry, func=event_name)
+    except Exception as exc:
+        logging.exception("Error processing event %s for %s: %s", event_name, contract_address, exc)
+        return False
+
+    if new_contract_addresses:
+        dao_address_new, token_address_new = new_contract_addresses
+        block = log_entry["blockNumber"]
+        with lock:
+            if dao_address_new and dao_address_new not in listening_to_addresses:
+                listening_to_addresses.append(dao_address_new, block)
+            if token_address_new and token_address_new not in listening_to_addresses:
+                listening_to_addresses.append(token_address_new, block)
+            if token_address_new and token_address_new not in papers:
+                p_new_token = Paper(address=token_address_new, kind="token",
+                                     daos_collection=daos_collection, db=db, dao=dao_address_new, web3=web3)
+                papers[token_address_new] = p_new_token
+            else:
+                p_new_token = papers.get(token_address_new)
+            if dao_address_new and dao_address_new not in papers:
+                papers[dao_address_new] = Paper(token=p_new_token, address=dao_address_new,
+                                               kind="dao", daos_collection=daos_collection, db=db,
+                                               dao=dao_address_new, web3=web3)
+    return True
+
+
+def worker(event_queue, partition, papers, listening_to_addresses, daos_collection, db, web3, lock, stop_event,
+           processed_tx, in_flight, failed):
+    """Process the events of one partition of the queue, in the order they were put.
+
+    An event is marked processed only once its handler has returned; one
+    whose handler raised goes to ``failed`` instead, so the listener queues
+    it again while its block is still recent.
+    """
 
     while not stop_event.is_set():
         try:
-            log_entry, event_name = event_queue.get(timeout=1)
+            log_entry, event_name = event_queue.get(partition, timeout=1)
         except queue.Empty:
             continue
-        contract_address = log_entry["address"]
-        with lock:
-            paper = papers.get(contract_address)
-        if not paper:
-            logging.warning("Paper object not found for contract address: %s", contract_address)
-            event_queue.task_done()
-            continue
-        try:
-            new_contract_addresses = paper.handle_event(log_entry, func=event_name)
-        except Exception as exc:
-            logging.exception("Error processing event %s for %s: %s", event_name, contract_address, exc)
-            event_queue.task_done()
-            continue
+        if process_event(log_entry, event_name, papers, listening_to_addresses, daos_collection, db, web3, lock):
+            processed_tx.add(log_entry)
+        else:
+            failed.add(log_entry)
+        in_flight.discard(log_entry)
+        event_queue.task_done(partition)
+
+    logging.info("Worker %d exiting", partition)
+
+
+def run_backfill(start, web3, papers, daos_collection, db, event_signatures,
+                 listening_to_addresses, lock, processed_tx, failed, concurrency=4):
+    """Re-index ``[start, head]`` in chain order before the listener starts; return the head.
+
+    ``start`` is a block number or ``"deployment"`` for the wrappers'
+    deployment block. Handled logs go to ``processed_tx`` and those whose
+    handler raised to ``failed``, as the workers' do, so the listener
+    neither handles the former again nor loses the latter.
+    """
 
-        if new_contract_addresses:
-            dao_address_new, token_address_new = new_contract_addresses
-            with lock:
-                if dao_address_new and dao_address_new not in listening_to_addresses:
-                    listening_to_addresses.append(dao_address_new)
-                if token_address_new and token_address_new not in listening_to_addresses:
-                    listening_to_addresses.append(token_address_new)
-                if token_address_new and token_address_new not in papers:
-                    p_new_token = Paper(address=token_address_new, kind="token",
-                                         daos_collection=daos_collection, db=db, dao=dao_address_new, web3=web3)
-                    papers[token_address_new] = p_new_token
-                else:
-                    p_new_token = papers.get(token_address_new)
-                if dao_address_new and dao_address_new not in papers:
-                    papers[dao_address_new] = Paper(token=p_new_token, address=dao_address_new,
-                                                   kind="dao", daos_collection=daos_collection, db=db,
-                                                   dao=dao_address_new, web3=web3)
-        event_queue.task_done()
-
-    logging.info("Worker exiting")
-
-
-def main(worker_count=4, poll_interval=5):
+    end = web3.eth.block_number
+    if start == "deployment":
+        wrappers = [p.address for p in papers.values() if p.kind in ("wrapper", "wrapper_w") and p.address]
+        start = min(find_deployment_block(web3, address, end) for address in wrappers)
+    start = int(start)
+
+    def handle_log(log_entry):
+        event_name = event_name_for(log_entry, event_signatures)
+        if not event_name:
+            return
+        if process_event(log_entry, event_name, papers, listening_to_addresses, daos_collection, db, web3, lock):
+            processed_tx.add(log_entry)
+            if len(processed_tx) > BACKFILL_DEDUP_SIZE:
+                # Only the last blocks can be fetched again by the listener.
+                processed_tx.prune(log_entry["blockNumber"] - 14)
+        else:
+            failed.add(log_entry)
+            logging.warning("Backfilled event %s of block %d failed; it is retried while recent",
+                            event_name, log_entry["blockNumber"])
+
+    logging.info("Backfilling blocks %d to %d", start, end)
+    started = time.time()
+    handled = backfill(web3, start, end, lambda: listening_to_addresses, handle_log,
+                       topics=topic0_filter(event_signatures), max_in_flight=concurrency,
+                       max_addresses=listening_to_addresses.shard_size, archive=listening_to_addresses.archive,
+                       before_window=lambda logs: block_clock.prefetch(web3, {log["blockNumber"] for log in logs}))
+    logging.info("Backfill done: %d logs in %.1fs", handled, time.time() - started)
+    return end
+
+
+def main(worker_count=4, poll_interval=5, backfill_from=None, backfill_concurrency=4, shard_size=200,
+         confirmations=2, flush_interval=1.0, store=None, export=True, archive_dir=None, queue_size=1000,
+         max_window=1000, ws_url=None, head_poll_interval=0.25, linger=0.0, batch_blocks=1, subscribe=False,
+         block_times_file=None):
     """Entry point to start the threaded indexer."""
 
     logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
-    web3, papers, daos_collection, db, event_signatures, listening_to_addresses = initialize_environment()
-    processed_tx = set()
+    web3, papers, daos_collection, db, event_signatures, listening_to_addresses = initialize_environment(
+        flush_interval, store=store)
+    exporter = None
+    if store and export:
+        exporter = FirestoreExporter(db.store, firestore.client(), interval=flush_interval or 1.0)
+    # Split into concurrently queried get_logs shards; new DAOs are appended
+    # to the smallest shard by process_event.
+    # Fetched logs are archived under archive_dir for offline replay.
+    log_archive = LogArchive(archive_dir) if archive_dir else None
+    listening_to_addresses = AddressShards(listening_to_addresses, shard_size=shard_size, archive=log_archive)
+    if block_times_file:
+        block_clock.open(block_times_file)
+    processed_tx = LogDeduplicator()
+    in_flight = LogDeduplicator()
+    failed = LogDeduplicator()
+    heads = None
+    if not subscribe:
+        heads = HeadTracker(web3, poll_interval=head_poll_interval, ws_url=ws_url, linger=linger,
+                            batch_blocks=batch_blocks)
     lock = threading.Lock()
     stop_event = threading.Event()
-    event_queue = queue.Queue()
+    # One bounded queue per worker; each DAO's events always go to the same one.
+    event_queue = PartitionedQueue(worker_count, maxsize=queue_size)
+
+    start_block = None
+    if backfill_from is not None:
+        end = run_backfill(backfill_from, web3, papers, daos_collection, db, event_signatures,
+                           listening_to_addresses, lock, processed_tx, failed, concurrency=backfill_concurrency)
+        # The backfill fetched what DAOs registered during it emitted; the listener takes over after it.
+        listening_to_addresses.take_registered()
+        start_block = end + 1
 
     threads = []
-    for _ in range(worker_count):
+    for partition in range(event_queue.partitions):
         t = threading.Thread(
             target=worker,
-            args=(event_queue, papers, listening_to_addresses, daos_collection, db, web3, lock, stop_event),
+            args=(event_queue, partition, papers, listening_to_addresses, daos_collection, db, web3, lock,
+                  stop_event, processed_tx, in_flight, failed),
+            name=f"worker-{partition}",
             daemon=True,
         )
         t.start()
         threads.append(t)
 
-    listener = threading.Thread(
-        target=event_listener,
-        args=(
-            event_queue,
-            web3,
-            event_signatures,
-            listening_to_addresses,
-            processed_tx,
-            lock,
-            stop_event,
-        ),
-        kwargs={"poll_interval": poll_interval},
-        daemon=True,
-    )
+    if subscribe:
+        listener = threading.Thread(
+            target=subscription_listener,
+            args=(
+                event_queue,
+                web3,
+                ws_url,
+                event_signatures,
+                listening_to_addresses,
+                processed_tx,
+                lock,
+                stop_event,
+                papers,
+                in_flight,
+                failed,
+                db,
+            ),
+            kwargs={"confirmations": confirmations, "start_block": start_block},
+            daemon=True,
+        )
+    else:
+        listener = threading.Thread(
+            target=event_listener,
+            args=(
+                event_queue,
+                web3,
+                event_signatures,
+                listening_to_addresses,
+                processed_tx,
+                lock,
+                stop_event,
+                papers,
+                in_flight,
+                failed,
+                heads,
+                db,
+            ),
+            kwargs={"poll_interval": poll_interval, "confirmations": confirmations, "max_window": max_window,
+                    "start_block": start_block},
+            daemon=True,
+        )
     listener.start()
 
     try:
         while True:
             time.sleep(10)
+            queue_stats = event_queue.stats()
+            if queue_stats["queued"]:
+                logging.info("Queued events per worker: %s of %d (%d DAOs routed)",
+                             queue_stats["depths"], queue_size, queue_stats["keys"])
     except KeyboardInterrupt:
         logging.info("Shutting down.")
         stop_event.set()
         listener.join()
+        if heads:
+            heads.close()
         for t in threads:
             t.join()
+        logging.info("Proposal lifecycle: %s", proposal_lifecycle.stats())
+        vote_tally.close()
+        if isinstance(db, BufferedClient):
+            db.buffer.close()
+            logging.info("Write buffer: %s", db.buffer.stats())
+        if exporter:
+            exporter.close()
+            logging.info("Firestore export: %s", exporter.stats())
+        if log_archive:
+            logging.info("Log archive: %s", log_archive.stats())
+            log_archive.close()
+        logging.info("Block clock: %s", block_clock.stats())
+        block_clock.close()
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run the threaded indexer")
-    parser.add_argument("--workers", type=int, default=4, help="Number of worker threads")
-    parser.add_argument("--poll", type=int, default=5, help="Polling interval in seconds")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Number of worker threads; each DAO's events are handled by one of them, in order")
+    parser.add_argument("--poll", type=int, default=5, help="Seconds to wait before retrying after a listener error")
+    parser.add_argument("--ws", default=None,
+                        help="WebSocket JSON-RPC endpoint to follow new heads with instead of polling eth_blockNumber")
+    parser.add_argument("--subscribe", action="store_true",
+                        help="With --ws, receive logs from an eth_subscribe('logs') subscription instead of polling "
+                             "(lowest latency; logs are still held for --confirmations blocks)")
+    parser.add_argument("--head-poll-interval", type=float, default=0.25,
+                        help="Seconds between eth_blockNumber polls when following the head without --ws")
+    parser.add_argument("--linger", type=float, default=0.0,
+                        help="Seconds to wait after a new block for --batch-blocks blocks before fetching logs "
+                             "(0: lowest latency; more: fewer, larger get_logs calls)")
+    parser.add_argument("--batch-blocks", type=int, default=1,
+                        help="Blocks a lingering wait gathers before fetching logs")
+    parser.add_argument("--queue-size", type=int, default=1000,
+                        help="Events queued per worker before the listener slows down and waits")
+    parser.add_argument("--max-window", type=int, default=1000,
+                        help="Most blocks fetched per poll; fewer while the workers are behind")
+    parser.add_argument("--confirmations", type=int, default=2,
+                        help="Only index blocks at least this many blocks below the chain head")
+    parser.add_argument("--shard-size", type=int, default=200,
+                        help="Maximum number of contract addresses per get_logs request")
+    parser.add_argument("--backfill-from", default=None,
+                        help="Re-index from this block (or 'deployment') up to the head before polling")
+    parser.add_argument("--backfill-concurrency", type=int, default=4,
+                        help="Number of get_logs windows fetched concurrently during a backfill")
+    parser.add_argument("--flush-interval", type=float, default=1.0,
+                        help="Seconds Firestore writes are buffered and merged before being committed (0 disables)")
+    parser.add_argument("--store", default=None,
+                        help="SQLite file holding the indexed state; changes are exported to Firestore")
+    parser.add_argument("--no-export", action="store_true",
+                        help="With --store, do not export to Firestore (offline re-indexing)")
+    parser.add_argument("--archive-dir", default=None,
+                        help="Archive fetched logs in this directory for offline replay")
+    parser.add_argument("--block-times-file", default=None,
+                        help="SQLite file keeping the block timestamps used to stamp chain times across runs")
     args = parser.parse_args()
-
-    main(worker_count=args.workers, poll_interval=args.poll)
+    if args.subscribe and not args.ws:
+        parser.error("--subscribe needs --ws")
+
+    main(worker_count=args.workers, poll_interval=args.poll,
+         backfill_from=args.backfill_from, backfill_concurrency=args.backfill_concurrency,
+         shard_size=args.shard_size, confirmations=args.confirmations, flush_interval=args.flush_interval,
+         store=args.store, export=not args.no_export, archive_dir=args.archive_dir, queue_size=args.queue_size,
+         max_window=args.max_window, ws_url=args.ws, head_poll_interval=args.head_poll_interval,
+         linger=args.linger, batch_blocks=args.batch_blocks, subscribe=args.subscribe,
+         block_times_file=args.block_times_file)